@@ -0,0 +1,249 @@
+# Almacenamiento persistente - Clínica Veterinaria "Pet Market"
+# Registro de escritura anticipada (solo se agrega al final) + instantáneas compactas.
+#
+# Cada operación es una línea "crc32 json\n" con un número de secuencia (lsn).
+# La instantánea guarda el estado completo y el lsn hasta donde llega; al
+# arrancar se carga la instantánea y se reaplica solo la cola del registro.
+#
+# Compactación: al llegar a registros_por_instantanea, el registro se "sella"
+# (se renombra, O(1)) y se sigue escribiendo en uno nuevo; otro proceso funde
+# la instantánea con el tramo sellado leyendo solo los archivos. Así ninguna
+# escritura espera a una instantánea completa ni se frena el proceso principal.
+
+import json
+import os
+import pickle
+import subprocess
+import sys
+import zlib
+
+ARCHIVO_REGISTRO = "registro.wal"
+ARCHIVO_SELLADO = "registro.wal.1"
+ARCHIVO_INSTANTANEA = "instantanea.dat"
+
+OP_MASCOTA = "M"
+OP_DIAGNOSTICO = "D"
+
+# Posición de la lista de diagnósticos dentro de cada fila
+# [id, nombre, raza, alergias, nombre_dueno, celular, historial]; cada
+# diagnóstico es [fecha ordinal, texto, servicio] (o "dd/mm/aaaa - texto" en
+# datos anteriores a los registros estructurados)
+CAMPO_HISTORIAL = 6
+
+
+def compactar(ruta):
+    # Instantánea + registro sellado -> instantánea nueva. Corre en otro proceso
+    # y solo lee archivos: no necesita (ni bloquea) la memoria del sistema.
+    almacen = AlmacenPacientes(ruta)
+    mascotas, lsn_instantanea = almacen._leer_instantanea()
+    almacen.ultimo_lsn = lsn_instantanea
+    almacen._reaplicar_registro(mascotas, lsn_instantanea, almacen._ruta_sellado)
+    almacen._reemplazar_instantanea(almacen.ultimo_lsn, [mascotas[id_mascota] for id_mascota in sorted(mascotas)])
+    # Si hay una caída antes de borrarlo, sus lsn ya están cubiertos y se ignoran
+    os.remove(almacen._ruta_sellado)
+    return almacen.ultimo_lsn
+
+
+class AlmacenPacientes:
+    # registros_por_instantanea: cada cuántas operaciones se compacta el
+    # registro; compactar_aparte=False compacta en el mismo proceso (bloquea la
+    # escritura que llega al límite, como hacía antes)
+    
+    def __init__(self, ruta, sincronizar=True, registros_por_instantanea=10000, compactar_aparte=True):
+        self.ruta = ruta
+        self.sincronizar = sincronizar
+        self.registros_por_instantanea = registros_por_instantanea
+        self.compactar_aparte = compactar_aparte
+        self.ultimo_lsn = 0
+        self.registros_desde_instantanea = 0
+        self._ruta_registro = os.path.join(ruta, ARCHIVO_REGISTRO)
+        self._ruta_sellado = os.path.join(ruta, ARCHIVO_SELLADO)
+        self._ruta_instantanea = os.path.join(ruta, ARCHIVO_INSTANTANEA)
+        self._archivo = None
+        self._compactacion = None
+        os.makedirs(ruta, exist_ok=True)
+    
+    def cargar(self):
+        # Devuelve las filas ordenadas por ID, con el historial en orden de llegada
+        mascotas, lsn_instantanea = self._leer_instantanea()
+        self.ultimo_lsn = lsn_instantanea
+        self.registros_desde_instantanea = 0
+        
+        # Un registro sellado que no llegó a compactarse va antes que el actual
+        for ruta in (self._ruta_sellado, self._ruta_registro):
+            if os.path.exists(ruta):
+                self._reaplicar_registro(mascotas, lsn_instantanea, ruta)
+        
+        self._abrir_registro()
+        return [mascotas[id_mascota] for id_mascota in sorted(mascotas)]
+    
+    def _leer_instantanea(self):
+        if not os.path.exists(self._ruta_instantanea):
+            return {}, 0
+        with open(self._ruta_instantanea, "rb") as archivo:
+            lsn_instantanea, filas = pickle.load(archivo)
+        return {fila[0]: fila for fila in filas}, lsn_instantanea
+    
+    def _reaplicar_registro(self, mascotas, lsn_instantanea, ruta):
+        valido_hasta = 0
+        
+        with open(ruta, "rb") as archivo:
+            for linea in archivo:
+                # Una línea incompleta o con CRC incorrecto es una escritura
+                # interrumpida por una caída: ahí termina el registro válido.
+                if not linea.endswith(b"\n"):
+                    break
+                crc, _, cuerpo = linea[:-1].partition(b" ")
+                try:
+                    if int(crc, 16) != zlib.crc32(cuerpo):
+                        break
+                    operacion = json.loads(cuerpo)
+                except ValueError:
+                    break
+                
+                valido_hasta += len(linea)
+                lsn = operacion[0]
+                if lsn <= lsn_instantanea:
+                    continue
+                
+                self._aplicar(mascotas, operacion)
+                self.ultimo_lsn = lsn
+                self.registros_desde_instantanea += 1
+        
+        if valido_hasta < os.path.getsize(ruta):
+            with open(ruta, "r+b") as archivo:
+                archivo.truncate(valido_hasta)
+                os.fsync(archivo.fileno())
+    
+    def _aplicar(self, mascotas, operacion):
+        tipo = operacion[1]
+        
+        if tipo == OP_MASCOTA:
+            id_mascota = operacion[2]
+            if id_mascota not in mascotas:
+                mascotas[id_mascota] = operacion[2:] + [[]]
+        elif tipo == OP_DIAGNOSTICO:
+            fila = mascotas.get(operacion[2])
+            if fila is not None:
+                fila[CAMPO_HISTORIAL].append(operacion[3])
+    
+    def _abrir_registro(self):
+        if self._archivo is None:
+            self._archivo = open(self._ruta_registro, "ab")
+    
+    def _anexar(self, operacion):
+        self._abrir_registro()
+        lsn = self.ultimo_lsn + 1
+        cuerpo = json.dumps([lsn] + operacion, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._archivo.write(b"%08x %s\n" % (zlib.crc32(cuerpo), cuerpo))
+        self._archivo.flush()
+        if self.sincronizar:
+            os.fsync(self._archivo.fileno())
+        self.ultimo_lsn = lsn
+        self.registros_desde_instantanea += 1
+    
+    def descriptor_para_sincronizar(self):
+        # Para el commit en grupo (sincronizar=False): devuelve el último lsn
+        # escrito y una copia del descriptor, así el fsync puede hacerse en otro
+        # hilo aunque una instantánea cierre y reabra el registro mientras tanto.
+        self._abrir_registro()
+        return self.ultimo_lsn, os.dup(self._archivo.fileno())
+    
+    def registrar_mascota(self, id_mascota, nombre, raza, alergias, nombre_dueno, celular):
+        self._anexar([OP_MASCOTA, id_mascota, nombre, raza, alergias, nombre_dueno, celular])
+    
+    def registrar_diagnostico(self, id_mascota, diagnostico):
+        self._anexar([OP_DIAGNOSTICO, id_mascota, diagnostico])
+    
+    def necesita_instantanea(self):
+        return self.registros_desde_instantanea >= self.registros_por_instantanea
+    
+    def compactar_en_segundo_plano(self):
+        # Sella el registro y lanza la compactación en otro proceso; si todavía
+        # corre la anterior, no hace nada (el registro actual sigue creciendo).
+        # Devuelve True si lanzó una.
+        if self._compactacion is not None:
+            if self._compactacion.poll() is None:
+                return False
+            self._terminar_compactacion()
+        
+        # Si quedó uno sellado (caída o error anterior), se compacta ese primero
+        if not os.path.exists(self._ruta_sellado):
+            self._sellar_registro()
+        # Un intérprete nuevo que corre este archivo: no hereda hilos ni
+        # memoria del proceso principal y no vuelve a importar su __main__
+        self._compactacion = subprocess.Popen([sys.executable, os.path.abspath(__file__), self.ruta])
+        return True
+    
+    def esperar_compactacion(self):
+        if self._compactacion is not None:
+            self._compactacion.wait()
+            self._terminar_compactacion()
+    
+    def _terminar_compactacion(self):
+        codigo = self._compactacion.returncode
+        self._compactacion = None
+        if codigo != 0:
+            # El tramo sellado queda en disco: se reaplica al cargar y se
+            # reintenta en la próxima compactación (el error ya salió por stderr)
+            print(f"Aviso: la compactación del registro terminó con código {codigo}", file=sys.stderr)
+    
+    def _sellar_registro(self):
+        # Sin fsync por operación (commit en grupo) lo ya escrito tiene que
+        # llegar al disco antes de dejar de sincronizar este archivo
+        self._abrir_registro()
+        os.fsync(self._archivo.fileno())
+        self._archivo.close()
+        os.replace(self._ruta_registro, self._ruta_sellado)
+        self._archivo = open(self._ruta_registro, "ab")
+        self._sincronizar_directorio()
+        self.registros_desde_instantanea = 0
+    
+    def escribir_instantanea(self, filas):
+        # Instantánea completa desde memoria (al cerrar o tras una carga masiva).
+        # Se escribe a un temporal y se reemplaza de forma atómica; después se
+        # vacía el registro. Si hay una caída entre ambos pasos, las operaciones
+        # viejas del registro se ignoran al cargar porque su lsn ya está cubierto.
+        self.esperar_compactacion()
+        self._reemplazar_instantanea(self.ultimo_lsn, list(filas))
+        if os.path.exists(self._ruta_sellado):
+            os.remove(self._ruta_sellado)
+        
+        if self._archivo is not None:
+            self._archivo.close()
+        self._archivo = open(self._ruta_registro, "wb")
+        os.fsync(self._archivo.fileno())
+        self.registros_desde_instantanea = 0
+    
+    def _reemplazar_instantanea(self, lsn, filas):
+        temporal = self._ruta_instantanea + ".tmp"
+        with open(temporal, "wb") as archivo:
+            pickle.dump((lsn, filas), archivo, protocol=pickle.HIGHEST_PROTOCOL)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, self._ruta_instantanea)
+        self._sincronizar_directorio()
+    
+    def _sincronizar_directorio(self):
+        try:
+            descriptor = os.open(self.ruta, os.O_RDONLY)
+        except OSError:
+            # Algunos sistemas (Windows) no permiten abrir directorios
+            return
+        try:
+            os.fsync(descriptor)
+        except OSError:
+            pass
+        finally:
+            os.close(descriptor)
+    
+    def cerrar(self):
+        self.esperar_compactacion()
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+
+if __name__ == "__main__":
+    # python almacenamiento.py CARPETA: compacta el registro sellado de CARPETA
+    compactar(sys.argv[1])
@@ -0,0 +1,183 @@
+# Generador de carga - Clínica Veterinaria "Pet Market"
+# Abre N clientes concurrentes (una conexión persistente cada uno) contra el
+# servidor HTTP y reporta la latencia p50/p99 por tipo de solicitud.
+#
+# Uso: python carga_http.py [--clientes 1000] [--solicitudes 20] [--url http://127.0.0.1:8080]
+# Sin --url se levanta un servidor propio en otro proceso (con --datos, persistente).
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+def percentil(ordenados, porcentaje):
+    if not ordenados:
+        return 0.0
+    indice = min(len(ordenados) - 1, max(0, round(porcentaje / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+class ClienteHTTP:
+    def __init__(self, host, puerto):
+        self.host = host
+        self.puerto = puerto
+        self.lector = None
+        self.escritor = None
+    
+    async def conectar(self):
+        self.lector, self.escritor = await asyncio.open_connection(self.host, self.puerto)
+    
+    async def solicitar(self, metodo, ruta, datos=None):
+        cuerpo = json.dumps(datos).encode("utf-8") if datos is not None else b""
+        self.escritor.write(b"%s %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\n"
+                            b"Content-Length: %d\r\n\r\n%s"
+                            % (metodo.encode(), ruta.encode(), self.host.encode(), len(cuerpo), cuerpo))
+        await self.escritor.drain()
+        
+        estado = int((await self.lector.readline()).split()[1])
+        largo = 0
+        while True:
+            linea = await self.lector.readline()
+            if linea in (b"\r\n", b""):
+                break
+            nombre, _, valor = linea.partition(b":")
+            if nombre.strip().lower() == b"content-length":
+                largo = int(valor)
+        respuesta = await self.lector.readexactly(largo)
+        return estado, json.loads(respuesta)
+    
+    async def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            await self.escritor.wait_closed()
+
+
+async def precargar(host, puerto, cantidad_mascotas):
+    cliente = ClienteHTTP(host, puerto)
+    await cliente.conectar()
+    for id_mascota in range(1, cantidad_mascotas + 1):
+        await cliente.solicitar("POST", "/mascotas", {
+            "id": id_mascota, "nombre": f"Mascota {id_mascota}", "raza": "Mestizo",
+            "alergias": "Ninguna", "nombre_dueno": f"Dueño {id_mascota}", "celular": f"09{id_mascota:08d}",
+        })
+    await cliente.cerrar()
+
+
+async def cliente_recepcion(host, puerto, numero, clientes, solicitudes, cantidad_mascotas, latencias,
+                            conectados, largada):
+    # Mezcla de un día: mayoría de lecturas, llegadas y atenciones
+    azar = random.Random(numero)
+    cliente = ClienteHTTP(host, puerto)
+    await cliente.conectar()
+    conectados.append(numero)
+    if len(conectados) == clientes:
+        largada.set()
+    await largada.wait()
+    
+    for _ in range(solicitudes):
+        id_mascota = azar.randint(1, cantidad_mascotas)
+        tirada = azar.random()
+        if tirada < 0.35:
+            tipo, metodo, ruta, datos = "historial", "GET", f"/mascotas/{id_mascota}/historial?tamanio=5", None
+        elif tirada < 0.55:
+            tipo, metodo, ruta, datos = "ficha", "GET", f"/mascotas/{id_mascota}", None
+        elif tirada < 0.70:
+            tipo, metodo, ruta, datos = "posicion", "GET", f"/sala-espera/{id_mascota}", None
+        elif tirada < 0.85:
+            tipo, metodo, ruta = "llegada", "POST", "/sala-espera"
+            datos = {"id": id_mascota, "prioridad": azar.choice((1, 2, 3, 3, 3))}
+        else:
+            tipo, metodo, ruta = "atender", "POST", "/consultorios/atender"
+            datos = {"diagnostico": "Control de rutina", "servicio": "CON"}
+        
+        inicio = time.perf_counter()
+        estado, _ = await cliente.solicitar(metodo, ruta, datos)
+        latencias.setdefault(tipo, []).append(time.perf_counter() - inicio)
+        if estado >= 500:
+            raise RuntimeError(f"Respuesta {estado} en {metodo} {ruta}")
+    
+    await cliente.cerrar()
+
+
+async def generar_carga(host, puerto, clientes, solicitudes, cantidad_mascotas):
+    await precargar(host, puerto, cantidad_mascotas)
+    
+    latencias = {}
+    conectados = []
+    largada = asyncio.Event()
+    tareas = [asyncio.create_task(cliente_recepcion(host, puerto, numero, clientes, solicitudes,
+                                                    cantidad_mascotas, latencias, conectados, largada))
+              for numero in range(clientes)]
+    # Se mide desde que todas las conexiones están abiertas
+    await largada.wait()
+    
+    inicio = time.perf_counter()
+    await asyncio.gather(*tareas)
+    return latencias, time.perf_counter() - inicio
+
+
+def mostrar_reporte(latencias, transcurrido, clientes):
+    todas = sorted(valor for valores in latencias.values() for valor in valores)
+    print(f"\n    {clientes} clientes, {len(todas)} solicitudes en {transcurrido:.2f} s "
+          f"-> {len(todas) / transcurrido:,.0f} sol/s")
+    print(f"    {'Solicitud':<12}{'Cantidad':>10}{'p50 (ms)':>11}{'p99 (ms)':>11}{'máx (ms)':>11}")
+    for tipo, valores in sorted(latencias.items()) + [("total", todas)]:
+        ordenados = sorted(valores)
+        print(f"    {tipo:<12}{len(ordenados):>10}{percentil(ordenados, 50) * 1000:>11.2f}"
+              f"{percentil(ordenados, 99) * 1000:>11.2f}{ordenados[-1] * 1000:>11.2f}")
+
+
+def esperar_puerto(host, puerto, limite=10.0):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            socket.create_connection((host, puerto), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"El servidor no respondió en {host}:{puerto}")
+
+
+def puerto_libre():
+    with socket.socket() as prueba:
+        prueba.bind(("127.0.0.1", 0))
+        return prueba.getsockname()[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor HTTP veterinario")
+    parser.add_argument("--clientes", type=int, default=1000)
+    parser.add_argument("--solicitudes", type=int, default=20, help="solicitudes por cliente")
+    parser.add_argument("--mascotas", type=int, default=2000)
+    parser.add_argument("--url", help="servidor ya levantado (por defecto se levanta uno propio)")
+    parser.add_argument("--datos", help="carpeta de datos para el servidor propio (mide el commit en grupo)")
+    argumentos = parser.parse_args()
+    
+    proceso = None
+    if argumentos.url:
+        partes = urlsplit(argumentos.url)
+        host, puerto = partes.hostname, partes.port or 80
+    else:
+        host, puerto = "127.0.0.1", puerto_libre()
+        servidor = os.path.join(os.path.dirname(os.path.abspath(__file__)), "servidor_http.py")
+        comando = [sys.executable, servidor, "--host", host, "--puerto", str(puerto)]
+        if argumentos.datos:
+            comando += ["--datos", argumentos.datos]
+        proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL)
+        esperar_puerto(host, puerto)
+    
+    try:
+        latencias, transcurrido = asyncio.run(generar_carga(host, puerto, argumentos.clientes,
+                                                            argumentos.solicitudes, argumentos.mascotas))
+        mostrar_reporte(latencias, transcurrido, argumentos.clientes)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
@@ -0,0 +1,555 @@
+# Variantes seguras para hilos - Clínica Veterinaria "Pet Market"
+# Para atender desde varios consultorios a la vez con hilos:
+#   - sala de espera FIFO con dos candados (frente y final por separado)
+#   - un candado por historial: dos mascotas distintas no se bloquean entre sí
+#   - candado de lectores/escritor sobre el árbol: las búsquedas van en paralelo
+#
+# Orden de adquisición (evita interbloqueos): escritura del almacén ->
+# historial de una mascota -> árbol / índices; agenda -> sala de espera ->
+# árbol (encolar_citas pasa citas a la sala con la agenda tomada).
+
+import threading
+from contextlib import contextmanager
+
+from veterinaria_pet_market import (DIAS_LABORABLES, ColaPrioridad, ErrorVeterinaria, HistorialMedico,
+                                    IndiceAlergenos, IndiceDiagnosticos, IndiceSecundario, IndiceUltimaVisita,
+                                    NodoCola, PRIORIDAD_NORMAL, SistemaVeterinaria, cabecera_cuadro, escribir,
+                                    filas_sala_espera, mostrar_paginado, pie_cuadro)
+
+
+class CandadoLectoresEscritor:
+    # Muchos lectores o un escritor. Prefiere al escritor: cuando hay uno
+    # esperando no entran lectores nuevos, así una racha de búsquedas no
+    # posterga indefinidamente un alta.
+    
+    def __init__(self):
+        self._condicion = threading.Condition(threading.Lock())
+        self._lectores = 0
+        self._escribiendo = False
+        self._escritores_esperando = 0
+    
+    def adquirir_lectura(self):
+        with self._condicion:
+            while self._escribiendo or self._escritores_esperando:
+                self._condicion.wait()
+            self._lectores += 1
+    
+    def liberar_lectura(self):
+        with self._condicion:
+            self._lectores -= 1
+            if self._lectores == 0:
+                self._condicion.notify_all()
+    
+    def adquirir_escritura(self):
+        with self._condicion:
+            self._escritores_esperando += 1
+            while self._escribiendo or self._lectores:
+                self._condicion.wait()
+            self._escritores_esperando -= 1
+            self._escribiendo = True
+    
+    def liberar_escritura(self):
+        with self._condicion:
+            self._escribiendo = False
+            self._condicion.notify_all()
+    
+    @contextmanager
+    def lectura(self):
+        self.adquirir_lectura()
+        try:
+            yield
+        finally:
+            self.liberar_lectura()
+    
+    @contextmanager
+    def escritura(self):
+        self.adquirir_escritura()
+        try:
+            yield
+        finally:
+            self.liberar_escritura()
+
+
+class ArbolConcurrente:
+    # Envuelve un ArbolBinario / ArbolAVL. Los recorridos devuelven una copia
+    # tomada con el candado de lectura para no retenerlo mientras se consume.
+    
+    def __init__(self, arbol):
+        self.arbol = arbol
+        self.candado = CandadoLectoresEscritor()
+    
+    @property
+    def cantidad(self):
+        return self.arbol.cantidad
+    
+    @property
+    def rotaciones(self):
+        return self.arbol.rotaciones
+    
+    @property
+    def raiz(self):
+        return self.arbol.raiz
+    
+    def esta_vacio(self):
+        return self.arbol.esta_vacio()
+    
+    def insertar(self, mascota):
+        with self.candado.escritura():
+            return self.arbol.insertar(mascota)
+    
+    def eliminar(self, id_mascota):
+        with self.candado.escritura():
+            return self.arbol.eliminar(id_mascota)
+    
+    def cargar_masivo(self, registros):
+        with self.candado.escritura():
+            return self.arbol.cargar_masivo(registros)
+    
+    def buscar(self, id_mascota):
+        with self.candado.lectura():
+            return self.arbol.buscar(id_mascota)
+    
+    def iter_desde(self, id_min=None, id_max=None):
+        with self.candado.lectura():
+            return iter(list(self.arbol.iter_desde(id_min, id_max)))
+    
+    def __iter__(self):
+        return self.iter_desde()
+    
+    def altura(self):
+        with self.candado.lectura():
+            return self.arbol.altura()
+    
+    def recorrido_inorden(self, tamanio_pagina=None):
+        with self.candado.lectura():
+            self.arbol.recorrido_inorden(tamanio_pagina)
+
+
+class IndiceConcurrente(IndiceSecundario):
+    # Las búsquedas también modifican el índice (ordenan las claves
+    # pendientes), así que todo pasa por un único candado.
+    
+    def __init__(self, campo, normalizador, por_palabras=False):
+        super().__init__(campo, normalizador, por_palabras)
+        self.candado = threading.Lock()
+    
+    def agregar(self, mascota, clave=None):
+        with self.candado:
+            super().agregar(mascota, clave)
+    
+    def quitar(self, mascota):
+        with self.candado:
+            super().quitar(mascota)
+    
+    def reconstruir(self, mascotas):
+        with self.candado:
+            super().reconstruir(mascotas)
+    
+    def buscar_exacto(self, valor):
+        with self.candado:
+            return super().buscar_exacto(valor)
+    
+    def buscar_prefijo(self, prefijo, limite=None):
+        with self.candado:
+            return super().buscar_prefijo(prefijo, limite)
+
+
+class IndiceAlergenosConcurrente(IndiceAlergenos):
+    def __init__(self):
+        super().__init__()
+        self.candado = threading.Lock()
+    
+    def agregar(self, mascota, clave=None):
+        with self.candado:
+            super().agregar(mascota, clave)
+    
+    def quitar(self, mascota):
+        with self.candado:
+            super().quitar(mascota)
+    
+    def reconstruir(self, mascotas):
+        with self.candado:
+            super().reconstruir(mascotas)
+    
+    def buscar(self, alergeno):
+        with self.candado:
+            return super().buscar(alergeno)
+    
+    def conteo(self):
+        with self.candado:
+            return super().conteo()
+
+
+class IndiceDiagnosticosConcurrente(IndiceDiagnosticos):
+    # Una consulta puede renumerar todo el índice: mismo candado para todo
+    
+    def __init__(self):
+        super().__init__()
+        self.candado = threading.RLock()
+    
+    def agregar(self, id_mascota, posicion, fecha, texto):
+        with self.candado:
+            super().agregar(id_mascota, posicion, fecha, texto)
+    
+    def agregar_historial(self, mascota):
+        with self.candado:
+            super().agregar_historial(mascota)
+    
+    def reconstruir(self, mascotas):
+        with self.candado:
+            super().reconstruir(mascotas)
+    
+    def buscar(self, consulta, desde=None, hasta=None):
+        with self.candado:
+            return super().buscar(consulta, desde, hasta)
+    
+    def mascotas(self, consulta, desde=None, hasta=None):
+        with self.candado:
+            return super().mascotas(consulta, desde, hasta)
+    
+    def visitas_entre(self, desde=None, hasta=None):
+        with self.candado:
+            return super().visitas_entre(desde, hasta)
+
+
+class IndiceUltimaVisitaConcurrente(IndiceUltimaVisita):
+    # Consultar también quita días vacíos: un único candado
+    
+    def __init__(self):
+        super().__init__()
+        self.candado = threading.Lock()
+    
+    def registrar_visita(self, id_mascota, fecha):
+        with self.candado:
+            super().registrar_visita(id_mascota, fecha)
+    
+    def registrar_mascota(self, mascota):
+        fecha = mascota.historial_medico.ultima_fecha()
+        with self.candado:
+            if fecha:
+                IndiceUltimaVisita.registrar_visita(self, mascota.id, fecha)
+            elif mascota.id not in self.ultima:
+                self.sin_visitas.add(mascota.id)
+    
+    def reconstruir(self, mascotas):
+        with self.candado:
+            self._vaciar()
+        for mascota in mascotas:
+            self.registrar_mascota(mascota)
+    
+    def sin_visita_desde(self, corte, incluir_sin_visitas=False):
+        with self.candado:
+            return super().sin_visita_desde(corte, incluir_sin_visitas)
+
+
+class HistorialConcurrente(HistorialMedico):
+    __slots__ = ("candado",)
+    
+    def __init__(self):
+        super().__init__()
+        self.candado = threading.RLock()
+    
+    @classmethod
+    def desde(cls, historial):
+        # Reutiliza los arreglos de un historial existente sin copiarlos
+        protegido = cls()
+        protegido._fechas = historial._fechas
+        protegido._textos = historial._textos
+        protegido._servicios = historial._servicios
+        protegido._orden = historial._orden
+        return protegido
+    
+    def agregar(self, fecha, texto, servicio=""):
+        with self.candado:
+            super().agregar(fecha, texto, servicio)
+    
+    def apilar(self, dato):
+        with self.candado:
+            super().apilar(dato)
+    
+    def desapilar(self):
+        with self.candado:
+            return super().desapilar()
+    
+    def ver_tope(self):
+        with self.candado:
+            return super().ver_tope()
+    
+    def obtener(self, posicion):
+        with self.candado:
+            return super().obtener(posicion)
+    
+    def pagina(self, n, tamanio):
+        with self.candado:
+            return super().pagina(n, tamanio)
+    
+    def __iter__(self):
+        with self.candado:
+            return iter(list(super().__iter__()))
+    
+    def entre(self, desde, hasta):
+        # Puede armar el índice de fechas: con candado y devolviendo una copia
+        with self.candado:
+            return list(super().entre(desde, hasta))
+    
+    def ultima_fecha(self):
+        with self.candado:
+            return super().ultima_fecha()
+    
+    def cronologico(self):
+        with self.candado:
+            return iter(list(super().cronologico()))
+    
+    def registros(self):
+        with self.candado:
+            return super().registros()
+
+
+class ColaDosCandados:
+    # Cola de Michael y Scott con dos candados: el frente siempre apunta a un
+    # nodo centinela, así encolar solo toca el final y desencolar solo el
+    # frente, y una recepción que encola no frena a un consultorio que
+    # desencola. El tamaño sale de dos contadores, cada uno bajo su candado.
+    # El diccionario ID -> nodo usa operaciones atómicas (setdefault / pop).
+    
+    def __init__(self):
+        self.frente = self.final = NodoCola(None, -1)
+        self.candado_frente = threading.Lock()
+        self.candado_final = threading.Lock()
+        self.nodos = {}
+        self.siguiente_turno = 0
+        self.encolados = 0
+        self.salidos = 0
+    
+    @property
+    def tamanio(self):
+        return self.encolados - self.salidos
+    
+    def esta_vacia(self):
+        return self.ver_frente() is None
+    
+    def contiene(self, id_mascota):
+        return id_mascota in self.nodos
+    
+    def encolar(self, dato):
+        nuevo_nodo = NodoCola(dato, 0)
+        if self.nodos.setdefault(dato.id, nuevo_nodo) is not nuevo_nodo:
+            return False
+        
+        with self.candado_final:
+            nuevo_nodo.turno = self.siguiente_turno
+            self.siguiente_turno += 1
+            self.final.siguiente = nuevo_nodo
+            self.final = nuevo_nodo
+            self.encolados += 1
+        return True
+    
+    def desencolar(self):
+        # Los nodos cancelados (dato None) se saltean al llegar al frente
+        with self.candado_frente:
+            while True:
+                siguiente = self.frente.siguiente
+                if siguiente is None:
+                    return None
+                self.frente = siguiente
+                dato = siguiente.dato
+                if dato is not None:
+                    siguiente.dato = None
+                    self.salidos += 1
+                    self.nodos.pop(dato.id, None)
+                    return dato
+    
+    def retirar(self, id_mascota):
+        # Cancelación perezosa: el nodo queda en la lista vacío hasta llegar al frente
+        with self.candado_frente:
+            nodo = self.nodos.pop(id_mascota, None)
+            if nodo is None or nodo.dato is None:
+                return None
+            dato = nodo.dato
+            nodo.dato = None
+            self.salidos += 1
+            return dato
+    
+    def posicion(self, id_mascota):
+        # Recorre desde el frente: sin enlace hacia atrás no hay atajo por turnos
+        with self.candado_frente:
+            if id_mascota not in self.nodos:
+                return None
+            posicion = 0
+            actual = self.frente.siguiente
+            while actual is not None:
+                if actual.dato is not None:
+                    posicion += 1
+                    if actual.dato.id == id_mascota:
+                        return posicion
+                actual = actual.siguiente
+        return None
+    
+    def ver_frente(self):
+        with self.candado_frente:
+            actual = self.frente.siguiente
+            while actual is not None and actual.dato is None:
+                actual = actual.siguiente
+            return actual.dato if actual is not None else None
+    
+    def __iter__(self):
+        with self.candado_frente:
+            mascotas = []
+            actual = self.frente.siguiente
+            while actual is not None:
+                if actual.dato is not None:
+                    mascotas.append(actual.dato)
+                actual = actual.siguiente
+        return iter(mascotas)
+    
+    def mostrar_sala_espera(self, tamanio_pagina=None):
+        mascotas = list(self)
+        if not mascotas:
+            escribir("    La sala de espera está vacía.\n")
+            return
+        
+        escribir(cabecera_cuadro("SALA DE ESPERA"))
+        mostrar_paginado(filas_sala_espera(mascotas), tamanio_pagina, total=len(mascotas) + 1)
+        escribir(pie_cuadro(f"Total de pacientes en espera: {len(mascotas)}"))
+
+
+class ColaPrioridadConcurrente(ColaPrioridad):
+    # Un montículo no se puede partir en dos extremos como la cola FIFO:
+    # todas las operaciones pasan por un solo candado.
+    
+    def __init__(self):
+        super().__init__()
+        self.candado = threading.RLock()
+    
+    def encolar(self, dato, prioridad=PRIORIDAD_NORMAL):
+        with self.candado:
+            return super().encolar(dato, prioridad)
+    
+    def desencolar(self):
+        with self.candado:
+            return super().desencolar()
+    
+    def desencolar_con_prioridad(self):
+        # Frente y prioridad en un solo paso: (mascota, prioridad) o None
+        with self.candado:
+            if self.esta_vacia():
+                return None
+            prioridad = self.monticulo[0][0]
+            return super().desencolar(), prioridad
+    
+    def ver_frente(self):
+        with self.candado:
+            return super().ver_frente()
+    
+    def prioridad_de(self, id_mascota):
+        with self.candado:
+            return super().prioridad_de(id_mascota)
+    
+    def cambiar_prioridad(self, id_mascota, prioridad):
+        with self.candado:
+            return super().cambiar_prioridad(id_mascota, prioridad)
+    
+    def retirar(self, id_mascota):
+        with self.candado:
+            return super().retirar(id_mascota)
+    
+    def posicion(self, id_mascota):
+        with self.candado:
+            return super().posicion(id_mascota)
+    
+    def en_orden(self):
+        with self.candado:
+            return super().en_orden()
+    
+    def mostrar_sala_espera(self, tamanio_pagina=None):
+        with self.candado:
+            super().mostrar_sala_espera(tamanio_pagina)
+
+
+class SistemaConcurrente(SistemaVeterinaria):
+    # Misma API sin interacción que SistemaVeterinaria, usable desde varios hilos.
+    # Con almacén en disco, altas y diagnósticos se serializan en el registro
+    # (un único archivo); sin almacén, solo compiten por el árbol y cada historial.
+    
+    def __init__(self, balanceado=True, almacen=None, politica_espera="prioridad"):
+        super().__init__(balanceado, almacen, politica_espera)
+        self.base_datos = ArbolConcurrente(self.base_datos)
+        self.sala_espera = ColaPrioridadConcurrente() if politica_espera == "prioridad" else ColaDosCandados()
+        self.indice_dueno = IndiceConcurrente("nombre_dueno", self.indice_dueno.normalizador, por_palabras=True)
+        self.indice_celular = IndiceConcurrente("celular", self.indice_celular.normalizador)
+        self.indice_raza = IndiceConcurrente("raza", self.indice_raza.normalizador, por_palabras=True)
+        self.indice_alergenos = IndiceAlergenosConcurrente()
+        self.indice_diagnosticos = IndiceDiagnosticosConcurrente()
+        self.ultima_visita = IndiceUltimaVisitaConcurrente()
+        self.candado_almacen = threading.RLock()
+        self.candado_facturacion = threading.Lock()
+        # Máscaras de turnos por veterinario y montículo de próximas citas
+        self.candado_agenda = threading.Lock()
+    
+    def agregar_mascota(self, mascota):
+        if not isinstance(mascota.historial_medico, HistorialConcurrente):
+            mascota.historial_medico = HistorialConcurrente.desde(mascota.historial_medico)
+        if self.almacen is None:
+            return super().agregar_mascota(mascota)
+        # El alta entra al registro antes que cualquier diagnóstico de esa mascota
+        with self.candado_almacen:
+            return super().agregar_mascota(mascota)
+    
+    def registrar_diagnostico(self, mascota, texto, fecha, servicio=""):
+        if self.almacen is None:
+            with mascota.historial_medico.candado:
+                super().registrar_diagnostico(mascota, texto, fecha, servicio)
+            return
+        # Historial y registro en el mismo orden para todas las mascotas
+        with self.candado_almacen, mascota.historial_medico.candado:
+            super().registrar_diagnostico(mascota, texto, fecha, servicio)
+    
+    def facturar(self, mascota, servicios):
+        with self.candado_facturacion:
+            super().facturar(mascota, servicios)
+    
+    def _cargar_en_memoria(self, registros, diferido=False):
+        # Siempre completo: construir un índice diferido en medio de consultas
+        # de varios hilos necesitaría un candado más en cada acceso
+        insertadas = super()._cargar_en_memoria(registros)
+        for mascota in self.base_datos:
+            if not isinstance(mascota.historial_medico, HistorialConcurrente):
+                mascota.historial_medico = HistorialConcurrente.desde(mascota.historial_medico)
+        return insertadas
+    
+    def guardar_instantanea(self):
+        with self.candado_almacen:
+            super().guardar_instantanea()
+    
+    def agregar_veterinario(self, nombre, dias_laborables=DIAS_LABORABLES):
+        with self.candado_agenda:
+            return super().agregar_veterinario(nombre, dias_laborables)
+    
+    def reservar_cita(self, id_mascota, veterinario, inicio, turnos=1, motivo="", prioridad=PRIORIDAD_NORMAL):
+        with self.candado_agenda:
+            return super().reservar_cita(id_mascota, veterinario, inicio, turnos, motivo, prioridad)
+    
+    def cancelar_cita(self, numero):
+        with self.candado_agenda:
+            return super().cancelar_cita(numero)
+    
+    def proximo_turno_libre(self, turnos=1, veterinario=None, desde=None):
+        with self.candado_agenda:
+            return super().proximo_turno_libre(turnos, veterinario, desde)
+    
+    def encolar_citas(self, ahora=None):
+        # Con la agenda tomada hasta que las citas estén en la sala: una cita
+        # cancelada en paralelo no puede llegar a la sala después
+        with self.candado_agenda:
+            return super().encolar_citas(ahora)
+    
+    def llamar_siguiente(self):
+        if isinstance(self.sala_espera, ColaPrioridadConcurrente):
+            siguiente = self.sala_espera.desencolar_con_prioridad()
+        else:
+            mascota = self.sala_espera.desencolar()
+            siguiente = None if mascota is None else (mascota, None)
+        
+        if siguiente is None:
+            raise ErrorVeterinaria("No hay pacientes en la sala de espera.")
+        return siguiente
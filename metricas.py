@@ -0,0 +1,383 @@
+# Métricas de rendimiento - Clínica Veterinaria "Pet Market"
+# Instrumentación que se enciende y apaga en caliente: profundidad del árbol
+# (comparaciones por búsqueda, altura), tiempo de espera en la sala (desde que
+# se encola hasta que se llama) y latencia de cada acción del sistema.
+#
+# Activar reemplaza los métodos de las clases por versiones que miden y
+# desactivar vuelve a poner los originales, así que apagada no cuesta nada:
+# ni siquiera un "if" en el camino de cada operación. El reemplazo es para
+# todo el proceso, así que cubre también las variantes de concurrencia: la
+# sala FIFO con dos candados se instrumenta aparte (no hereda de Cola) y los
+# histogramas y contadores se actualizan con candado, porque varios hilos
+# registran a la vez.
+
+import json
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+from weakref import WeakKeyDictionary
+
+from concurrencia import ColaDosCandados, SistemaConcurrente
+from veterinaria_pet_market import ArbolAVL, ArbolBinario, Cola, ColaPrioridad, Cuadro, SistemaVeterinaria
+
+# Acciones de SistemaVeterinaria que se cronometran. Las opciones del menú que
+# piden datos con input() se miden a través de estas llamadas, sin contar lo
+# que tarda quien escribe.
+ACCIONES = ("alta_mascota", "obtener_mascota", "registrar_llegada", "llamar_siguiente", "registrar_atencion",
+            "facturar", "atender_siguiente", "consultar_historial", "visitas_entre", "pendientes_de_control",
+            "cargar_desde_almacen", "guardar_instantanea", "reservar_cita", "proximo_turno_libre", "encolar_citas")
+
+CUBETAS = 64
+
+
+class Histograma:
+    # Cubetas por potencias de dos (en ns): registrar es O(1) y ocupa lo
+    # mismo con mil o con mil millones de muestras. Los percentiles quedan
+    # acotados por el borde de su cubeta (error menor a 2x), que alcanza para
+    # ver tendencias y colas largas.
+    __slots__ = ("cubetas", "cantidad", "total", "maximo", "candado")
+    
+    def __init__(self):
+        self.cubetas = array("Q", bytes(8 * CUBETAS))
+        self.candado = threading.Lock()
+        self.vaciar()
+    
+    def vaciar(self):
+        # En el lugar: las versiones instrumentadas guardan una referencia
+        with self.candado:
+            self.cubetas[:] = array("Q", bytes(8 * CUBETAS))
+            self.cantidad = 0
+            self.total = 0
+            self.maximo = 0
+    
+    def registrar(self, valor):
+        with self.candado:
+            self.cubetas[valor.bit_length()] += 1
+            self.cantidad += 1
+            self.total += valor
+            if valor > self.maximo:
+                self.maximo = valor
+    
+    def percentil(self, porcentaje):
+        if not self.cantidad:
+            return 0
+        objetivo = porcentaje / 100 * self.cantidad
+        acumulado = 0
+        for cubeta, cantidad in enumerate(self.cubetas):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return min(self.maximo, (1 << cubeta) - 1)
+        return self.maximo
+    
+    def resumen(self, unidad=1000):
+        # Valores en la unidad pedida (1000 = µs, 10**9 = segundos)
+        return {
+            "cantidad": self.cantidad,
+            "promedio": round(self.total / self.cantidad / unidad, 3) if self.cantidad else 0.0,
+            "p50": round(self.percentil(50) / unidad, 3),
+            "p90": round(self.percentil(90) / unidad, 3),
+            "p99": round(self.percentil(99) / unidad, 3),
+            "maximo": round(self.maximo / unidad, 3),
+        }
+
+
+class Metricas:
+    def __init__(self):
+        self.activas = False
+        # Para comparaciones y llegadas; cada histograma tiene el suyo
+        self.candado = threading.Lock()
+        self.comparaciones = Counter()
+        self.inserciones = Histograma()
+        self.espera = Histograma()
+        self.acciones = {nombre: Histograma() for nombre in ACCIONES}
+        # Cola -> {ID: marca de llegada}; débil para no retener colas viejas
+        self.llegadas = WeakKeyDictionary()
+        self.desde = datetime.now()
+    
+    def reiniciar(self):
+        with self.candado:
+            self.comparaciones.clear()
+            self.llegadas.clear()
+        self.inserciones.vaciar()
+        self.espera.vaciar()
+        for histograma in self.acciones.values():
+            histograma.vaciar()
+        self.desde = datetime.now()
+    
+    def marcar_llegada(self, cola, id_mascota, marca):
+        # False si ya tenía una marca (sigue esperando desde antes)
+        with self.candado:
+            marcas = self.llegadas.get(cola)
+            if marcas is None:
+                marcas = self.llegadas[cola] = {}
+            if id_mascota in marcas:
+                return False
+            marcas[id_mascota] = marca
+            return True
+    
+    def quitar_llegada(self, cola, id_mascota):
+        with self.candado:
+            marcas = self.llegadas.get(cola)
+            return None if marcas is None else marcas.pop(id_mascota, None)
+
+
+METRICAS = Metricas()
+_ORIGINALES = {}
+
+
+def _buscar_contando(self, id_mascota):
+    # Mismo recorrido que ArbolBinario.buscar, contando los nodos visitados
+    actual = self.raiz
+    comparaciones = 0
+    
+    while actual is not None:
+        comparaciones += 1
+        if id_mascota < actual.dato.id:
+            actual = actual.izquierdo
+        elif id_mascota > actual.dato.id:
+            actual = actual.derecho
+        else:
+            break
+    
+    with METRICAS.candado:
+        METRICAS.comparaciones[comparaciones] += 1
+    return actual.dato if actual is not None else None
+
+
+# Acciones en curso en cada hilo: SistemaConcurrente envuelve con su candado
+# los métodos de SistemaVeterinaria y llama a super(), así que se cuenta solo
+# la llamada de afuera (con la espera del candado incluida)
+_EN_CURSO = threading.local()
+
+
+def _cronometrado(funcion, histograma):
+    reloj = time.perf_counter_ns
+    
+    @wraps(funcion)
+    def medida(*argumentos, **opciones):
+        inicio = reloj()
+        try:
+            return funcion(*argumentos, **opciones)
+        finally:
+            histograma.registrar(reloj() - inicio)
+    return medida
+
+
+def _accion_cronometrada(funcion, histograma, nombre):
+    reloj = time.perf_counter_ns
+    
+    @wraps(funcion)
+    def accion(*argumentos, **opciones):
+        en_curso = _EN_CURSO.__dict__.setdefault("acciones", set())
+        if nombre in en_curso:
+            return funcion(*argumentos, **opciones)
+        en_curso.add(nombre)
+        inicio = reloj()
+        try:
+            return funcion(*argumentos, **opciones)
+        finally:
+            histograma.registrar(reloj() - inicio)
+            en_curso.discard(nombre)
+    return accion
+
+
+def _encolar_con_marca(encolar):
+    # La espera se mide con el reloj monótono: dura minutos, no nanosegundos.
+    # La marca va antes de encolar: en la sala de dos candados otro hilo puede
+    # llamar a la mascota antes de que encolar termine.
+    @wraps(encolar)
+    def encolar_marcando(self, dato, *argumentos, **opciones):
+        marcada = METRICAS.marcar_llegada(self, dato.id, time.monotonic_ns())
+        agregado = encolar(self, dato, *argumentos, **opciones)
+        if marcada and not agregado:
+            METRICAS.quitar_llegada(self, dato.id)
+        return agregado
+    return encolar_marcando
+
+
+def _desencolar_con_espera(desencolar):
+    @wraps(desencolar)
+    def desencolar_midiendo(self):
+        dato = desencolar(self)
+        if dato is not None:
+            # Sin marca: llegó antes de activar las métricas
+            marca = METRICAS.quitar_llegada(self, dato.id)
+            if marca is not None:
+                METRICAS.espera.registrar(time.monotonic_ns() - marca)
+        return dato
+    return desencolar_midiendo
+
+
+def _retirar_sin_espera(retirar):
+    # Un turno cancelado no es una espera atendida: solo se olvida la marca
+    @wraps(retirar)
+    def retirar_olvidando(self, id_mascota):
+        METRICAS.quitar_llegada(self, id_mascota)
+        return retirar(self, id_mascota)
+    return retirar_olvidando
+
+
+def _reemplazar(clase, nombre, nueva):
+    _ORIGINALES[clase, nombre] = clase.__dict__[nombre]
+    setattr(clase, nombre, nueva)
+
+
+def activar():
+    if METRICAS.activas:
+        return
+    _reemplazar(ArbolBinario, "buscar", _buscar_contando)
+    # ArbolAVL tiene su propio insertar; buscar lo hereda
+    for clase in (ArbolBinario, ArbolAVL):
+        _reemplazar(clase, "insertar", _cronometrado(clase.insertar, METRICAS.inserciones))
+    # ColaPrioridadConcurrente llega a los métodos de ColaPrioridad con super()
+    for clase in (Cola, ColaPrioridad, ColaDosCandados):
+        _reemplazar(clase, "encolar", _encolar_con_marca(clase.encolar))
+        _reemplazar(clase, "desencolar", _desencolar_con_espera(clase.desencolar))
+        _reemplazar(clase, "retirar", _retirar_sin_espera(clase.retirar))
+    for clase in (SistemaVeterinaria, SistemaConcurrente):
+        for nombre in ACCIONES:
+            if nombre in clase.__dict__:
+                _reemplazar(clase, nombre, _accion_cronometrada(clase.__dict__[nombre], METRICAS.acciones[nombre],
+                                                                nombre))
+    METRICAS.activas = True
+
+
+def desactivar():
+    # Las mediciones se conservan hasta reiniciar(); las marcas de llegada
+    # pendientes se descartan porque ya no se verá su salida
+    for (clase, nombre), original in _ORIGINALES.items():
+        setattr(clase, nombre, original)
+    _ORIGINALES.clear()
+    with METRICAS.candado:
+        METRICAS.llegadas.clear()
+    METRICAS.activas = False
+
+
+def reiniciar():
+    METRICAS.reiniciar()
+
+
+def _resumen_comparaciones():
+    with METRICAS.candado:
+        conteo = Counter(METRICAS.comparaciones)
+    busquedas = sum(conteo.values())
+    if not busquedas:
+        return {"busquedas": 0, "promedio": 0.0, "p99": 0, "maximo": 0}
+    
+    objetivo = 0.99 * busquedas
+    acumulado = 0
+    for comparaciones in sorted(conteo):
+        acumulado += conteo[comparaciones]
+        if acumulado >= objetivo:
+            p99 = comparaciones
+            break
+    
+    return {
+        "busquedas": busquedas,
+        "promedio": round(sum(c * veces for c, veces in conteo.items()) / busquedas, 2),
+        "p99": p99,
+        "maximo": max(conteo),
+    }
+
+
+def instantanea(sistema=None):
+    # Diccionario listo para JSON; con el sistema agrega el estado del árbol y
+    # de la sala (la altura de un ArbolBinario sin balancear recorre el árbol)
+    datos = {
+        "activas": METRICAS.activas,
+        "desde": METRICAS.desde.isoformat(timespec="seconds"),
+        "tomada": datetime.now().isoformat(timespec="seconds"),
+        "arbol": {
+            "comparaciones_por_busqueda": _resumen_comparaciones(),
+            "insercion_us": METRICAS.inserciones.resumen(),
+        },
+        "sala_espera": {"espera_s": METRICAS.espera.resumen(10**9)},
+        "acciones_us": {nombre: histograma.resumen()
+                        for nombre, histograma in METRICAS.acciones.items() if histograma.cantidad},
+    }
+    
+    if sistema is not None:
+        arbol = sistema.base_datos
+        datos["arbol"].update({
+            "tipo": type(arbol).__name__,
+            "mascotas": arbol.cantidad,
+            "altura": arbol.altura(),
+            # Altura de un árbol perfectamente balanceado con esa cantidad
+            "altura_minima": arbol.cantidad.bit_length(),
+            "rotaciones": arbol.rotaciones,
+        })
+        datos["sala_espera"]["en_espera"] = sistema.sala_espera.tamanio
+    
+    return datos
+
+
+def _duracion(nanosegundos):
+    if nanosegundos < 10**3:
+        return f"{nanosegundos:.0f} ns"
+    if nanosegundos < 10**6:
+        return f"{nanosegundos / 10**3:.1f} µs"
+    if nanosegundos < 10**9:
+        return f"{nanosegundos / 10**6:.1f} ms"
+    if nanosegundos < 60 * 10**9:
+        return f"{nanosegundos / 10**9:.1f} s"
+    return f"{nanosegundos / (60 * 10**9):.1f} min"
+
+
+def texto(sistema=None):
+    datos = instantanea(sistema)
+    arbol = datos["arbol"]
+    comparaciones = arbol["comparaciones_por_busqueda"]
+    
+    cuadro = Cuadro("MÉTRICAS DE RENDIMIENTO", separado=True)
+    cuadro.campo("Estado:", "activas" if datos["activas"] else "desactivadas")
+    cuadro.campo("Desde:", datos["desde"].replace("T", " "))
+    cuadro.separador()
+    
+    if "tipo" in arbol:
+        cuadro.campo("Árbol:", f"{arbol['tipo']}, {arbol['mascotas']} mascotas")
+        cuadro.campo("Altura:", f"{arbol['altura']} (mínima {arbol['altura_minima']}), "
+                                f"{arbol['rotaciones']} rotaciones")
+    cuadro.campo("Búsquedas:", str(comparaciones["busquedas"]))
+    cuadro.campo("Comparaciones:", f"prom {comparaciones['promedio']}, p99 {comparaciones['p99']}, "
+                                   f"máx {comparaciones['maximo']}")
+    inserciones = METRICAS.inserciones
+    cuadro.campo("Altas en el árbol:", f"{inserciones.cantidad}, p50 {_duracion(inserciones.percentil(50))}, "
+                                       f"p99 {_duracion(inserciones.percentil(99))}")
+    cuadro.separador()
+    
+    espera = METRICAS.espera
+    if "en_espera" in datos["sala_espera"]:
+        cuadro.campo("En la sala:", str(datos["sala_espera"]["en_espera"]))
+    cuadro.campo("Atendidos:", str(espera.cantidad))
+    if espera.cantidad:
+        cuadro.campo("Espera p50 / p90:", f"{_duracion(espera.percentil(50))} / {_duracion(espera.percentil(90))}")
+        cuadro.campo("Espera máxima:", _duracion(espera.maximo))
+        # Histograma: una barra por cubeta con muestras
+        mayor = max(espera.cubetas)
+        for cubeta, cantidad in enumerate(espera.cubetas):
+            if cantidad:
+                barra = "#" * max(1, round(cantidad * 24 / mayor))
+                cuadro.fila(f"  hasta {_duracion((1 << cubeta) - 1):>10} {cantidad:>7} {barra}")
+    cuadro.separador()
+    
+    cuadro.fila(f"{'Acción':<22}{'veces':>6}{'p50':>10}{'p99':>10}{'máx':>10}")
+    if not datos["acciones_us"]:
+        cuadro.fila("Sin acciones medidas.")
+    for nombre, histograma in METRICAS.acciones.items():
+        if histograma.cantidad:
+            cuadro.fila(f"{nombre[:21]:<22}{histograma.cantidad:>6}{_duracion(histograma.percentil(50)):>10}"
+                        f"{_duracion(histograma.percentil(99)):>10}{_duracion(histograma.maximo):>10}")
+    
+    return cuadro.texto("Percentiles acotados por potencias de dos (error < 2x).")
+
+
+def exportar(ruta, sistema=None):
+    # JSON si la ruta termina en .json; si no, el mismo cuadro que en pantalla
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        if ruta.lower().endswith(".json"):
+            json.dump(instantanea(sistema), archivo, ensure_ascii=False, indent=1)
+        else:
+            archivo.write(texto(sistema))
@@ -0,0 +1,409 @@
+# Migración de datos - Clínica Veterinaria "Pet Market"
+# Importa y exporta fichas con su historial médico en JSON-lines o CSV, para
+# traer los pacientes de otro sistema sin cargarlos uno por uno en el menú.
+#
+# Uso: python migracion.py importar ARCHIVO [--datos DIR] [--diagnosticos CSV] [--procesos N]
+#      python migracion.py exportar ARCHIVO --datos DIR [--diagnosticos CSV]
+#
+# Formatos (según la extensión del archivo):
+#   .jsonl  una ficha por línea, con el historial adentro:
+#           {"id": 1, "nombre": "Max", "raza": "...", "alergias": "...", "nombre_dueno": "...",
+#            "celular": "...", "historial": [["31/05/2024", "Control anual", "CON+VAC"], ...]}
+#   .csv    fichas con encabezado id,nombre,raza,alergias,nombre_dueno,celular y los
+#           diagnósticos aparte (por defecto ARCHIVO_diagnosticos.csv) con
+#           id,fecha,diagnostico,servicio, agrupados por mascota
+# Las fechas van como dd/mm/aaaa (también se aceptan aaaa-mm-dd al importar).
+#
+# Todo se procesa en bloques: el archivo nunca está entero en memoria, solo
+# las fichas, que igual van al árbol. Un ID repetido (en el archivo o ya
+# registrado) se rechaza y se informa con su línea; el resto se mezcla de una
+# vez en el árbol balanceado con la carga masiva. Sin --datos no se guarda
+# nada: sirve para validar un archivo antes de migrarlo.
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import groupby, islice
+from operator import attrgetter, itemgetter
+
+from veterinaria_pet_market import (ErrorVeterinaria, Mascota, SistemaVeterinaria, id_valido, ordinal_fecha,
+                                    sin_recolector, texto_fecha)
+
+CAMPOS_MASCOTA = ("id", "nombre", "raza", "alergias", "nombre_dueno", "celular")
+CAMPOS_DIAGNOSTICO = ("id", "fecha", "diagnostico", "servicio")
+
+# Líneas por bloque al leer y fichas por escritura al exportar
+TAMANIO_BLOQUE = 10_000
+
+# Errores que se guardan con su línea; del resto solo se cuentan
+MAXIMO_ERRORES = 100
+
+
+class InformeImportacion:
+    def __init__(self):
+        self.leidas = 0
+        self.importadas = 0
+        self.diagnosticos = 0
+        self.rechazadas = 0
+        self.errores = []
+        # Fichas rechazadas por ID ya registrado: sus diagnósticos del CSV
+        # aparte también se descartan, en vez de sumarse a la ficha existente
+        self.ids_rechazados = set()
+        self.segundos = 0.0
+    
+    def rechazar(self, linea, motivo):
+        self.rechazadas += 1
+        if len(self.errores) < MAXIMO_ERRORES:
+            self.errores.append((linea, motivo))
+    
+    def como_dict(self):
+        return {
+            "leidas": self.leidas,
+            "importadas": self.importadas,
+            "diagnosticos": self.diagnosticos,
+            "rechazadas": self.rechazadas,
+            "errores": [{"linea": linea, "motivo": motivo} for linea, motivo in self.errores],
+            "segundos": round(self.segundos, 3),
+        }
+
+
+def ruta_diagnosticos(ruta):
+    base, _ = os.path.splitext(ruta)
+    return base + "_diagnosticos.csv"
+
+
+def _es_csv(ruta):
+    return ruta.lower().endswith(".csv")
+
+
+def _motivo(error):
+    if isinstance(error, KeyError):
+        return f"falta el campo {error.args[0]}"
+    return str(error) or type(error).__name__
+
+
+def _ordinal(fecha):
+    if type(fecha) is int:
+        return fecha
+    ordinal = ordinal_fecha(fecha)
+    if not ordinal and fecha:
+        try:
+            ordinal = date.fromisoformat(fecha).toordinal()
+        except ValueError:
+            raise ValueError(f"fecha no válida: {fecha!r}")
+    return ordinal
+
+
+def _fila_historial(entrada):
+    # [fecha, texto, servicio] como los guarda el almacén; un texto suelto es
+    # el formato anterior ("dd/mm/aaaa - texto") y se deja tal cual
+    if type(entrada) is str:
+        return entrada
+    fecha, texto, *resto = entrada
+    return [_ordinal(fecha), str(texto), str(resto[0]) if resto else ""]
+
+
+# Lectura: bloques de líneas -> filas validadas. Las funciones de bloque son
+# de nivel de módulo para que un proceso del pool pueda recibirlas.
+
+def _bloques(lineas, tamanio=TAMANIO_BLOQUE):
+    # (número de la primera línea, [líneas])
+    numero = 1
+    while True:
+        bloque = list(islice(lineas, tamanio))
+        if not bloque:
+            return
+        yield numero, bloque
+        numero += len(bloque)
+
+
+def _parsear_jsonl(bloque):
+    # -> ([(id, nombre, raza, alergias, dueño, celular, historial, línea)], [(línea, motivo)])
+    inicio, lineas = bloque
+    filas = []
+    errores = []
+    loads = json.loads
+    
+    for numero, linea in enumerate(lineas, inicio):
+        if not linea.strip():
+            continue
+        try:
+            ficha = loads(linea)
+            historial = ficha.get("historial")
+            filas.append((id_valido(ficha["id"]), str(ficha.get("nombre", "")), str(ficha.get("raza", "")),
+                          str(ficha.get("alergias", "")), str(ficha.get("nombre_dueno", "")),
+                          str(ficha.get("celular", "")),
+                          [_fila_historial(entrada) for entrada in historial] if historial else None, numero))
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            errores.append((numero, _motivo(error)))
+    
+    return filas, errores
+
+
+def _en_paralelo(funcion, bloques, procesos):
+    # Como ProcessPoolExecutor.map, en orden, pero con a lo sumo dos bloques
+    # por proceso en vuelo: map() lee toda la entrada antes de devolver nada
+    with ProcessPoolExecutor(procesos) as ejecutor:
+        pendientes = deque()
+        for bloque in bloques:
+            pendientes.append(ejecutor.submit(funcion, bloque))
+            if len(pendientes) >= 2 * procesos:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+
+def _filas_jsonl(archivo, informe, procesos=0):
+    bloques = _bloques(archivo)
+    resultados = _en_paralelo(_parsear_jsonl, bloques, procesos) if procesos > 1 else map(_parsear_jsonl, bloques)
+    for filas, errores in resultados:
+        informe.leidas += len(filas) + len(errores)
+        for linea, motivo in errores:
+            informe.rechazar(linea, motivo)
+        yield from filas
+
+
+def _lector_csv(archivo, campos):
+    # csv.reader (en C) ya procesa en streaming; el encabezado define el
+    # orden de las columnas y las obligatorias son las de `campos`
+    lector = csv.reader(archivo)
+    encabezado = [columna.strip().lower() for columna in next(lector, [])]
+    faltantes = [campo for campo in campos if campo not in encabezado]
+    if faltantes:
+        raise ErrorVeterinaria(f"Faltan columnas en {archivo.name}: {', '.join(faltantes)}")
+    return lector, itemgetter(*(encabezado.index(campo) for campo in campos))
+
+
+def _filas_csv(archivo, informe):
+    lector, columnas = _lector_csv(archivo, CAMPOS_MASCOTA)
+    for fila in lector:
+        if not fila:
+            continue
+        informe.leidas += 1
+        try:
+            id_mascota, nombre, raza, alergias, nombre_dueno, celular = columnas(fila)
+            id_mascota = id_valido(id_mascota.strip())
+        except (ValueError, IndexError) as error:
+            informe.rechazar(lector.line_num, _motivo(error) if isinstance(error, ValueError) else "faltan columnas")
+            continue
+        yield id_mascota, nombre, raza, alergias, nombre_dueno, celular, None, lector.line_num
+
+
+def _diagnosticos_csv(archivo, informe):
+    # -> (id, [[ordinal, texto, servicio], ...]) por cada grupo de filas seguidas de la misma mascota
+    lector, columnas = _lector_csv(archivo, CAMPOS_DIAGNOSTICO)
+    
+    def filas():
+        for fila in lector:
+            if not fila:
+                continue
+            try:
+                id_mascota, fecha, texto, servicio = columnas(fila)
+                registro = id_valido(id_mascota.strip()), [_ordinal(fecha.strip()), texto, servicio.strip()]
+            except (ValueError, IndexError) as error:
+                informe.rechazar(f"{archivo.name}:{lector.line_num}",
+                                 _motivo(error) if isinstance(error, ValueError) else "faltan columnas")
+                continue
+            yield registro
+    
+    for id_mascota, grupo in groupby(filas(), key=itemgetter(0)):
+        yield id_mascota, [fila for _, fila in grupo]
+
+
+def _fichas_nuevas(sistema, filas, informe):
+    # Mascota por fila, sin IDs repetidos ni ya registrados, ordenadas por ID
+    base_datos = sistema.base_datos
+    hay_registradas = not base_datos.esta_vacio()
+    mascotas = []
+    lineas = {}
+    
+    for id_mascota, nombre, raza, alergias, nombre_dueno, celular, historial, linea in filas:
+        if hay_registradas and base_datos.buscar(id_mascota) is not None:
+            informe.rechazar(linea, f"el ID {id_mascota} ya está registrado")
+            informe.ids_rechazados.add(id_mascota)
+            continue
+        mascota = Mascota(id_mascota, nombre, raza, alergias, nombre_dueno, celular)
+        if historial:
+            mascota.cargar_historial(historial)
+            informe.diagnosticos += len(historial)
+        mascotas.append(mascota)
+    
+    # Los repetidos dentro del archivo quedan juntos al ordenar (sort es
+    # estable: se conserva la primera aparición) y se descartan en una pasada
+    if any(mascotas[i].id >= mascotas[i + 1].id for i in range(len(mascotas) - 1)):
+        mascotas.sort(key=attrgetter("id"))
+    unicas = []
+    for mascota in mascotas:
+        if unicas and unicas[-1].id == mascota.id:
+            informe.rechazar(f"ID {mascota.id}", "ID repetido en el archivo (se conserva la primera ficha)")
+            informe.diagnosticos -= len(mascota.filas_historial())
+            continue
+        unicas.append(mascota)
+    return unicas
+
+
+def _agregar_diagnosticos(sistema, mascotas, grupos, informe):
+    # A las fichas nuevas se les agregan las filas sin abrir el historial; a
+    # las ya registradas, con registrar_diagnostico (índices y registro en disco)
+    registradas = []
+    clave = attrgetter("id")
+    
+    for id_mascota, filas in grupos:
+        posicion = bisect_left(mascotas, id_mascota, key=clave)
+        if posicion < len(mascotas) and mascotas[posicion].id == id_mascota:
+            mascota = mascotas[posicion]
+            actuales = mascota.filas_historial()
+            if actuales:
+                actuales.extend(filas)
+            else:
+                mascota.cargar_historial(filas)
+            informe.diagnosticos += len(filas)
+        elif id_mascota in informe.ids_rechazados:
+            informe.rechazar(f"ID {id_mascota}", f"{len(filas)} diagnóstico(s) de una ficha rechazada")
+        elif sistema.base_datos.buscar(id_mascota) is not None:
+            registradas.append((id_mascota, filas))
+        else:
+            informe.rechazar(f"ID {id_mascota}", f"{len(filas)} diagnóstico(s) de una mascota inexistente")
+    return registradas
+
+
+def importar(sistema, ruta, diagnosticos=None, procesos=0, diferido=False):
+    # Devuelve el InformeImportacion; con almacén, la carga termina en una
+    # instantánea. diferido: los índices se arman recién al usarlos, como en
+    # el inicio rápido (la línea de comandos no los usa nunca)
+    informe = InformeImportacion()
+    inicio = time.perf_counter()
+    
+    with sin_recolector():
+        with open(ruta, encoding="utf-8", newline="") as archivo:
+            filas = _filas_csv(archivo, informe) if _es_csv(ruta) else _filas_jsonl(archivo, informe, procesos)
+            mascotas = _fichas_nuevas(sistema, filas, informe)
+        
+        registradas = []
+        if diagnosticos is None and _es_csv(ruta) and os.path.exists(ruta_diagnosticos(ruta)):
+            diagnosticos = ruta_diagnosticos(ruta)
+        if diagnosticos is not None:
+            with open(diagnosticos, encoding="utf-8", newline="") as archivo:
+                registradas = _agregar_diagnosticos(sistema, mascotas, _diagnosticos_csv(archivo, informe), informe)
+        
+        informe.importadas = sistema.cargar_mascotas(mascotas, diferido)
+        for id_mascota, filas in registradas:
+            mascota = sistema.obtener_mascota(id_mascota)
+            for fecha, texto, servicio in filas:
+                sistema.registrar_diagnostico(mascota, texto, fecha, servicio)
+            informe.diagnosticos += len(filas)
+    
+    informe.segundos = time.perf_counter() - inicio
+    return informe
+
+
+# Escritura: recorrido en orden del árbol, de a TAMANIO_BLOQUE fichas por write()
+
+def _historial_exportable(mascota):
+    # Filas tal cual (sin abrir el historial si todavía no se consultó), con la fecha como texto
+    return [fila if type(fila) is str else [texto_fecha(fila[0]), fila[1], fila[2]]
+            for fila in mascota.filas_historial()]
+
+
+def exportar(sistema, ruta, diagnosticos=None):
+    # Devuelve (mascotas, diagnósticos) escritos
+    fichas = iter(sistema.base_datos)
+    cantidad = registros = 0
+    
+    if not _es_csv(ruta):
+        codificar = json.JSONEncoder(ensure_ascii=False).encode
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            while True:
+                bloque = list(islice(fichas, TAMANIO_BLOQUE))
+                if not bloque:
+                    break
+                lineas = []
+                for mascota in bloque:
+                    historial = _historial_exportable(mascota)
+                    registros += len(historial)
+                    lineas.append(codificar({"id": mascota.id, "nombre": mascota.nombre, "raza": mascota.raza,
+                                             "alergias": mascota.alergias, "nombre_dueno": mascota.nombre_dueno,
+                                             "celular": mascota.celular, "historial": historial}))
+                lineas.append("")
+                archivo.write("\n".join(lineas))
+                cantidad += len(bloque)
+        return cantidad, registros
+    
+    with open(ruta, "w", encoding="utf-8", newline="") as archivo, \
+            open(diagnosticos or ruta_diagnosticos(ruta), "w", encoding="utf-8", newline="") as archivo_diagnosticos:
+        escritor = csv.writer(archivo)
+        escritor_diagnosticos = csv.writer(archivo_diagnosticos)
+        escritor.writerow(CAMPOS_MASCOTA)
+        escritor_diagnosticos.writerow(CAMPOS_DIAGNOSTICO)
+        
+        while True:
+            bloque = list(islice(fichas, TAMANIO_BLOQUE))
+            if not bloque:
+                break
+            escritor.writerows([(m.id, m.nombre, m.raza, m.alergias, m.nombre_dueno, m.celular) for m in bloque])
+            filas = []
+            for mascota in bloque:
+                for fila in _historial_exportable(mascota):
+                    if type(fila) is str:
+                        # Formato anterior: se separa la fecha del texto si la tiene
+                        fecha, _, texto = fila.partition(" - ") if fila[:1].isdigit() else ("", "", fila)
+                        filas.append((mascota.id, fecha, texto, ""))
+                    else:
+                        filas.append((mascota.id, *fila))
+            escritor_diagnosticos.writerows(filas)
+            cantidad += len(bloque)
+            registros += len(filas)
+    
+    return cantidad, registros
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa o exporta fichas y diagnósticos (JSON-lines o CSV)")
+    parser.add_argument("accion", choices=["importar", "exportar"])
+    parser.add_argument("archivo", help=".jsonl o .csv")
+    parser.add_argument("--datos", help="carpeta de la base de datos persistente (importar sin ella solo valida)")
+    parser.add_argument("--diagnosticos", help="CSV de diagnósticos (por defecto: ARCHIVO_diagnosticos.csv)")
+    parser.add_argument("--procesos", type=int, default=0, help="procesos para leer JSON-lines en paralelo")
+    argumentos = parser.parse_args()
+    
+    almacen = None
+    if argumentos.datos:
+        from almacenamiento import AlmacenPacientes
+        # La importación termina con una instantánea: sin fsync por ficha
+        almacen = AlmacenPacientes(argumentos.datos, sincronizar=False)
+    elif argumentos.accion == "exportar":
+        parser.error("exportar necesita --datos")
+    
+    sistema = SistemaVeterinaria(almacen=almacen)
+    try:
+        if almacen is not None:
+            sistema.cargar_desde_almacen()
+        
+        if argumentos.accion == "importar":
+            informe = importar(sistema, argumentos.archivo, argumentos.diagnosticos, argumentos.procesos,
+                               diferido=True)
+            for linea, motivo in informe.errores:
+                donde = f"Línea {linea}" if isinstance(linea, int) else linea
+                print(f"    {donde}: {motivo}", file=sys.stderr)
+            if informe.rechazadas > len(informe.errores):
+                print(f"    ... y {informe.rechazadas - len(informe.errores)} rechazo(s) más", file=sys.stderr)
+            print(f"    {informe.importadas} mascota(s) y {informe.diagnosticos} diagnóstico(s) importados, "
+                  f"{informe.rechazadas} rechazo(s), en {informe.segundos:.1f} s")
+            if almacen is None:
+                print("    (sin --datos: nada se guardó)")
+        else:
+            mascotas, registros = exportar(sistema, argumentos.archivo, argumentos.diagnosticos)
+            print(f"    {mascotas} mascota(s) y {registros} diagnóstico(s) exportados")
+    except (ErrorVeterinaria, OSError) as error:
+        print(f"    Error: {error}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if almacen is not None:
+            almacen.cerrar()
@@ -0,0 +1,335 @@
+# Modo por lotes - Clínica Veterinaria "Pet Market"
+# Ejecuta comandos JSON (uno por línea) sin menú ni input(), para reproducir
+# el tráfico de un día o hacer pruebas de carga.
+#
+# Uso: python modo_lote.py [comandos.jsonl] [-o resultados.jsonl] [--datos DIR]
+#
+# Comandos:
+#   {"op": "registrar", "id": 1, "nombre": "Max", "raza": "...", "alergias": "...",
+#    "nombre_dueno": "...", "celular": "..."}
+#   {"op": "llegada", "id": 1, "prioridad": 3}
+#   {"op": "atender", "diagnostico": "...", "servicio": "CON+VAC"}
+#   {"op": "siguiente"}
+#   {"op": "diagnosticar", "id": 1, "diagnostico": "...", "servicio": "CON"}
+#   {"op": "ficha", "id": 1}
+#   {"op": "diagnosticos", "consulta": "penicilina OR post-operatorio", "desde": "2024-01-01", "hasta": "..."}
+#   {"op": "alergicos", "alergeno": "penicilina"}               (sin alergeno: conteo por alérgeno)
+#   {"op": "revisar_alergias", "id": 1, "servicio": "CIR", "diagnostico": "amoxicilina 7 días"}
+#   {"op": "visitas", "desde": "2024-01-01", "hasta": "2024-12-31"}
+#   {"op": "recordatorios", "meses": 12, "hoy": "2025-06-01", "sin_visitas": false}
+#   {"op": "ingresos", "dia": "2024-05-31"} | {"desde": "...", "hasta": "..."} | {"mes": "2024-05"}
+#                      | {"servicio": "CON"} | {"id": 1}     (sin filtro: total)
+#   {"op": "historial", "id": 1, "pagina": 1, "tamanio": 20}
+#   {"op": "posicion", "id": 1}
+#   {"op": "cancelar", "id": 1}
+#   {"op": "metricas", "activar": true, "reiniciar": false}      (sin opciones: solo la instantánea)
+#   {"op": "veterinario", "nombre": "Dra. Rojas", "dias": [0, 1, 2, 3, 4]}   (sin dias: lunes a sábado)
+#   {"op": "reservar", "id": 1, "inicio": "2025-06-02T09:30", "veterinario": "Dra. Rojas",
+#    "turnos": 2, "motivo": "...", "prioridad": 3}              (sin veterinario: cualquiera libre)
+#   {"op": "cancelar_cita", "cita": 1}
+#   {"op": "turno_libre", "turnos": 1, "veterinario": "...", "desde": "2025-06-02T12:00"}
+#   {"op": "agenda", "dia": "2025-06-02", "veterinario": "..."}
+#   {"op": "encolar_citas", "ahora": "2025-06-02T09:30"}         (sin ahora: la hora actual)
+
+import argparse
+import json
+import sys
+from datetime import date, datetime
+
+import metricas
+from almacenamiento import AlmacenPacientes
+from veterinaria_pet_market import (DIAS_LABORABLES, PRIORIDAD_NORMAL, TAMANIO_PAGINA, ErrorVeterinaria,
+                                    SistemaVeterinaria, id_valido, texto_fecha)
+
+
+def _registrar(sistema, comando):
+    mascota = sistema.alta_mascota(comando["id"], comando.get("nombre", ""), comando.get("raza", ""),
+                                   comando.get("alergias", ""), comando.get("nombre_dueno", ""),
+                                   comando.get("celular", ""))
+    return {"id": mascota.id}
+
+
+def _llegada(sistema, comando):
+    posicion = sistema.registrar_llegada(comando["id"], comando.get("prioridad", PRIORIDAD_NORMAL))
+    return {"id": comando["id"], "posicion": posicion}
+
+
+def _atender(sistema, comando):
+    atencion = sistema.atender_siguiente(comando.get("diagnostico", ""), comando.get("servicio"))
+    return {
+        "id": atencion["mascota"].id,
+        "prioridad": atencion["prioridad"],
+        "registro": atencion["registro"],
+        "servicios": [servicio["codigo"] for servicio in atencion["servicios"]],
+        "total": atencion["total"],
+        "alertas": [{"alergeno": alergeno, "origen": origen} for alergeno, origen in atencion["alertas"]],
+    }
+
+
+def _siguiente(sistema, comando):
+    mascota, prioridad = sistema.llamar_siguiente()
+    return {"id": mascota.id, "nombre": mascota.nombre, "prioridad": prioridad}
+
+
+def _diagnosticar(sistema, comando):
+    # Segunda mitad de "atender" cuando el consultorio ya llamó al paciente
+    mascota = sistema.obtener_mascota(comando["id"])
+    servicios, total = sistema.resolver_servicios(comando.get("servicio"))
+    registro = sistema.registrar_atencion(mascota, comando.get("diagnostico", ""), servicios)
+    sistema.facturar(mascota, servicios)
+    alertas = sistema.alertas_alergia(mascota, servicios, comando.get("diagnostico", ""))
+    return {
+        "id": mascota.id,
+        "registro": registro,
+        "servicios": [servicio["codigo"] for servicio in servicios],
+        "total": total,
+        "alertas": [{"alergeno": alergeno, "origen": origen} for alergeno, origen in alertas],
+    }
+
+
+def _ficha(sistema, comando):
+    mascota = sistema.obtener_mascota(comando["id"])
+    return {
+        "id": mascota.id,
+        "nombre": mascota.nombre,
+        "raza": mascota.raza,
+        "alergias": mascota.alergias,
+        "nombre_dueno": mascota.nombre_dueno,
+        "celular": mascota.celular,
+        "diagnosticos": mascota.historial_medico.tamanio,
+    }
+
+
+def _ingresos(sistema, comando):
+    libro = sistema.facturacion
+    if "dia" in comando:
+        return {"dia": comando["dia"], "total": libro.total_dia(date.fromisoformat(comando["dia"]))}
+    if "desde" in comando or "hasta" in comando:
+        desde = date.fromisoformat(comando.get("desde", date.min.isoformat()))
+        hasta = date.fromisoformat(comando.get("hasta", date.max.isoformat()))
+        return {"desde": desde.isoformat(), "hasta": hasta.isoformat(), "total": libro.total_entre(desde, hasta)}
+    if "mes" in comando:
+        anio, mes = (int(parte) for parte in comando["mes"].split("-"))
+        return {"mes": comando["mes"], "total": libro.total_mes(anio, mes)}
+    if "servicio" in comando:
+        cantidad, total = libro.total_servicio(str(comando["servicio"]).upper())
+        return {"servicio": str(comando["servicio"]).upper(), "cantidad": cantidad, "total": total}
+    if "id" in comando:
+        return {"id": comando["id"], "total": libro.total_mascota(comando["id"])}
+    return {"cobros": len(libro), "total": libro.total()}
+
+
+def _diagnosticos(sistema, comando):
+    desde = date.fromisoformat(comando["desde"]) if comando.get("desde") else None
+    hasta = date.fromisoformat(comando["hasta"]) if comando.get("hasta") else None
+    conteo = sistema.indice_diagnosticos.mascotas(str(comando["consulta"]), desde, hasta)
+    return {"mascotas": sorted(conteo), "registros": sum(conteo.values())}
+
+
+def _alergicos(sistema, comando):
+    # Con "alergeno": IDs de las mascotas alérgicas; sin él, cuántas hay por alérgeno
+    if comando.get("alergeno"):
+        return {"alergeno": comando["alergeno"], "mascotas": sistema.indice_alergenos.buscar(str(comando["alergeno"]))}
+    return {"alergenos": sistema.indice_alergenos.conteo()}
+
+
+def _revisar_alergias(sistema, comando):
+    # Revisión previa a una atención, sin registrar nada
+    mascota = sistema.obtener_mascota(comando["id"])
+    servicios, _ = sistema.resolver_servicios(comando.get("servicio"))
+    alertas = sistema.alertas_alergia(mascota, servicios, comando.get("diagnostico", ""))
+    return {"id": mascota.id, "alertas": [{"alergeno": alergeno, "origen": origen} for alergeno, origen in alertas]}
+
+
+def _visitas(sistema, comando):
+    desde = date.fromisoformat(comando["desde"]) if comando.get("desde") else None
+    hasta = date.fromisoformat(comando["hasta"]) if comando.get("hasta") else None
+    conteo = sistema.visitas_entre(desde, hasta)
+    return {"mascotas": sorted(conteo), "visitas": sum(conteo.values())}
+
+
+def _recordatorios(sistema, comando):
+    hoy = date.fromisoformat(comando["hoy"]) if comando.get("hoy") else None
+    pendientes = sistema.pendientes_de_control(comando.get("meses", 12), hoy, bool(comando.get("sin_visitas")))
+    return {"mascotas": [{"id": mascota.id, "nombre": mascota.nombre, "celular": mascota.celular,
+                          "ultima_visita": texto_fecha(mascota.historial_medico.ultima_fecha())}
+                         for mascota in pendientes]}
+
+
+def _historial(sistema, comando):
+    mascota, registros = sistema.consultar_historial(comando["id"], comando.get("pagina", 1),
+                                                     comando.get("tamanio", TAMANIO_PAGINA))
+    return {"id": mascota.id, "total": mascota.historial_medico.tamanio, "registros": registros}
+
+
+def _posicion(sistema, comando):
+    return {"id": comando["id"], "posicion": sistema.sala_espera.posicion(comando["id"])}
+
+
+def _cancelar(sistema, comando):
+    mascota = sistema.sala_espera.retirar(comando["id"])
+    if mascota is None:
+        raise ErrorVeterinaria("Esa mascota no está en la sala de espera.")
+    return {"id": mascota.id}
+
+
+def _metricas(sistema, comando):
+    if comando.get("activar"):
+        metricas.activar()
+    elif "activar" in comando:
+        metricas.desactivar()
+    if comando.get("reiniciar"):
+        metricas.reiniciar()
+    return {"metricas": metricas.instantanea(sistema)}
+
+
+def _cita_dict(cita):
+    return {
+        "cita": cita.numero,
+        "veterinario": cita.veterinario,
+        "id": cita.mascota.id,
+        "inicio": cita.inicio.isoformat(timespec="minutes"),
+        "turnos": cita.turnos,
+        "motivo": cita.motivo,
+        "estado": cita.estado,
+    }
+
+
+def _veterinario(sistema, comando):
+    agenda = sistema.agregar_veterinario(comando["nombre"], comando.get("dias", DIAS_LABORABLES))
+    return {"nombre": agenda.nombre, "dias": sorted(agenda.dias_laborables)}
+
+
+def _reservar(sistema, comando):
+    cita = sistema.reservar_cita(comando["id"], comando.get("veterinario"), datetime.fromisoformat(comando["inicio"]),
+                                 comando.get("turnos", 1), comando.get("motivo", ""),
+                                 comando.get("prioridad", PRIORIDAD_NORMAL))
+    return _cita_dict(cita)
+
+
+def _cancelar_cita(sistema, comando):
+    return _cita_dict(sistema.cancelar_cita(comando["cita"]))
+
+
+def _turno_libre(sistema, comando):
+    desde = datetime.fromisoformat(comando["desde"]) if comando.get("desde") else None
+    veterinario, inicio = sistema.proximo_turno_libre(comando.get("turnos", 1), comando.get("veterinario"), desde)
+    return {"veterinario": veterinario, "inicio": inicio.isoformat(timespec="minutes")}
+
+
+def _agenda(sistema, comando):
+    dia = date.fromisoformat(comando["dia"]).toordinal() if comando.get("dia") else date.today().toordinal()
+    agendas = ([sistema.agenda.veterinario(comando["veterinario"])] if comando.get("veterinario")
+               else sistema.agenda.veterinarios.values())
+    return {"citas": [_cita_dict(cita) for agenda in agendas for cita in agenda.citas_entre(dia, dia)]}
+
+
+def _encolar_citas(sistema, comando):
+    ahora = datetime.fromisoformat(comando["ahora"]) if comando.get("ahora") else None
+    return {"citas": [_cita_dict(cita) for cita in sistema.encolar_citas(ahora)]}
+
+
+OPERACIONES = {
+    "registrar": _registrar,
+    "llegada": _llegada,
+    "atender": _atender,
+    "siguiente": _siguiente,
+    "diagnosticar": _diagnosticar,
+    "ficha": _ficha,
+    "ingresos": _ingresos,
+    "diagnosticos": _diagnosticos,
+    "alergicos": _alergicos,
+    "revisar_alergias": _revisar_alergias,
+    "visitas": _visitas,
+    "recordatorios": _recordatorios,
+    "historial": _historial,
+    "posicion": _posicion,
+    "cancelar": _cancelar,
+    "metricas": _metricas,
+    "veterinario": _veterinario,
+    "reservar": _reservar,
+    "cancelar_cita": _cancelar_cita,
+    "turno_libre": _turno_libre,
+    "agenda": _agenda,
+    "encolar_citas": _encolar_citas,
+}
+
+
+def ejecutar_comando(sistema, comando):
+    operacion = OPERACIONES.get(comando.get("op"))
+    if operacion is None:
+        raise ErrorVeterinaria(f"Operación desconocida: {comando.get('op')}")
+    # Antes de tocar el árbol: un "id": "7" guardado como texto lo dejaría
+    # inservible para el resto del lote
+    if "id" in comando:
+        comando["id"] = id_valido(comando["id"])
+    return operacion(sistema, comando)
+
+
+def ejecutar_lote(sistema, entrada, salida):
+    # Procesa línea por línea (memoria acotada) y devuelve cuántos comandos se ejecutaron
+    procesados = 0
+    loads = json.loads
+    # Un solo codificador reutilizado: json.dumps con opciones crea uno por llamada
+    codificar = json.JSONEncoder(ensure_ascii=False).encode
+    escribir = salida.write
+    
+    for numero_linea, linea in enumerate(entrada, 1):
+        if not linea.strip():
+            continue
+        
+        try:
+            comando = loads(linea)
+            resultado = {"ok": True, **ejecutar_comando(sistema, comando)}
+        except ErrorVeterinaria as error:
+            resultado = {"ok": False, "error": str(error)}
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            resultado = {"ok": False, "error": f"Comando inválido en la línea {numero_linea}: {error!r}"}
+        except Exception as error:
+            # Un comando que falla por otro motivo no corta el resto del lote
+            resultado = {"ok": False, "error": f"Error interno en la línea {numero_linea}: {error!r}"}
+        
+        escribir(codificar(resultado))
+        escribir("\n")
+        procesados += 1
+    
+    return procesados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecuta comandos JSON-lines contra el sistema veterinario")
+    parser.add_argument("comandos", nargs="?", help="archivo de comandos (por defecto: entrada estándar)")
+    parser.add_argument("-o", "--salida", help="archivo de resultados (por defecto: salida estándar)")
+    parser.add_argument("--datos", help="carpeta de la base de datos persistente")
+    parser.add_argument("--sin-fsync", action="store_true", help="no sincronizar el registro en cada operación")
+    parser.add_argument("--espera", choices=["prioridad", "fifo"], default="prioridad")
+    parser.add_argument("--metricas", action="store_true", help="medir desde el arranque")
+    parser.add_argument("--compactar-cada", type=int, default=10000, metavar="N",
+                        help="operaciones del registro entre compactaciones (en otro proceso)")
+    argumentos = parser.parse_args()
+    
+    if argumentos.metricas:
+        metricas.activar()
+    
+    almacen = None
+    if argumentos.datos:
+        almacen = AlmacenPacientes(argumentos.datos, sincronizar=not argumentos.sin_fsync,
+                                   registros_por_instantanea=argumentos.compactar_cada)
+    
+    sistema = SistemaVeterinaria(almacen=almacen, politica_espera=argumentos.espera)
+    if almacen is not None:
+        sistema.cargar_desde_almacen()
+    
+    entrada = open(argumentos.comandos, encoding="utf-8") if argumentos.comandos else sys.stdin
+    salida = open(argumentos.salida, "w", encoding="utf-8") if argumentos.salida else sys.stdout
+    
+    try:
+        ejecutar_lote(sistema, entrada, salida)
+    finally:
+        if almacen is not None:
+            sistema.guardar_instantanea()
+            almacen.cerrar()
+        if entrada is not sys.stdin:
+            entrada.close()
+        if salida is not sys.stdout:
+            salida.close()
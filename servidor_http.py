@@ -0,0 +1,312 @@
+# Servidor HTTP local - Clínica Veterinaria "Pet Market"
+# Varias recepciones y consultorios comparten una misma base de pacientes a
+# través de una API JSON sobre HTTP/1.1 (conexiones persistentes).
+#
+# Uso: python servidor_http.py [--puerto 8080] [--datos DIR] [--espera fifo]
+#
+# Rutas:
+#   POST   /mascotas                       alta (cuerpo como el comando "registrar")
+#   GET    /mascotas/{id}                  ficha
+#   GET    /mascotas/{id}/historial        ?pagina=1&tamanio=20
+#   POST   /mascotas/{id}/diagnosticos     {"diagnostico": "...", "servicio": "CON"}
+#   POST   /sala-espera                    {"id": 1, "prioridad": 3}
+#   GET    /sala-espera/{id}               posición en la sala
+#   DELETE /sala-espera/{id}               cancela el turno
+#   POST   /consultorios/siguiente         llama al siguiente paciente
+#   POST   /consultorios/atender           siguiente + diagnóstico en un paso
+#   GET    /diagnosticos                   ?consulta=penicilina OR post-operatorio&desde=2024-01-01
+#   GET    /alergias                       ?alergeno=penicilina
+#   POST   /mascotas/{id}/alergias         {"servicio": "CIR", "diagnostico": "..."} (solo revisa)
+#   GET    /visitas                        ?desde=2024-01-01&hasta=2024-12-31
+#   GET    /recordatorios                  ?meses=12&hoy=2025-06-01&sin_visitas=1
+#   GET    /facturacion                    ?dia= | ?desde=&hasta= | ?mes= | ?servicio= | ?id=
+#   GET    /metricas                       instantánea de las métricas de rendimiento
+#   POST   /metricas                       {"activar": true, "reiniciar": false}
+#   POST   /veterinarios                   {"nombre": "Dra. Rojas", "dias": [0, 1, 2, 3, 4]}
+#   POST   /citas                          {"id": 1, "inicio": "2025-06-02T09:30", "veterinario": "...", "turnos": 1}
+#   DELETE /citas/{numero}                 cancela la cita
+#   GET    /citas/libre                    ?turnos=1&veterinario=...&desde=2025-06-02T12:00
+#   GET    /agenda                         ?dia=2025-06-02&veterinario=...
+#   POST   /citas/encolar                  {"ahora": "2025-06-02T09:30"} (también cada 30 s solo)
+#
+# Concurrencia: todo corre en un solo bucle de asyncio y cada operación sobre
+# el árbol, la sala o el historial es síncrona (no hay await en el medio), así
+# que las escrituras quedan serializadas sin candados y las lecturas nunca
+# esperan al disco. Con --datos, el registro se sincroniza en grupo: cada
+# escritura responde recién cuando un fsync (en otro hilo) cubre su lsn, y un
+# solo fsync confirma todas las escrituras que llegaron mientras tanto. La
+# compactación del registro corre en otro proceso (ver almacenamiento): el
+# bucle solo sella el archivo actual, sin escribir la instantánea completa.
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import sys
+import traceback
+from urllib.parse import parse_qsl, urlsplit
+
+import metricas
+from almacenamiento import AlmacenPacientes
+from modo_lote import ejecutar_comando
+from veterinaria_pet_market import ErrorVeterinaria, SistemaVeterinaria
+
+# (método, ruta, operación, escribe)
+RUTAS = [
+    ("POST", re.compile(r"/mascotas"), "registrar", True),
+    ("GET", re.compile(r"/mascotas/(?P<id>\d+)"), "ficha", False),
+    ("GET", re.compile(r"/mascotas/(?P<id>\d+)/historial"), "historial", False),
+    ("POST", re.compile(r"/mascotas/(?P<id>\d+)/diagnosticos"), "diagnosticar", True),
+    ("POST", re.compile(r"/sala-espera"), "llegada", True),
+    ("GET", re.compile(r"/sala-espera/(?P<id>\d+)"), "posicion", False),
+    ("DELETE", re.compile(r"/sala-espera/(?P<id>\d+)"), "cancelar", True),
+    ("POST", re.compile(r"/consultorios/siguiente"), "siguiente", True),
+    ("POST", re.compile(r"/consultorios/atender"), "atender", True),
+    ("GET", re.compile(r"/facturacion"), "ingresos", False),
+    ("GET", re.compile(r"/diagnosticos"), "diagnosticos", False),
+    ("GET", re.compile(r"/alergias"), "alergicos", False),
+    ("POST", re.compile(r"/mascotas/(?P<id>\d+)/alergias"), "revisar_alergias", False),
+    ("GET", re.compile(r"/visitas"), "visitas", False),
+    ("GET", re.compile(r"/recordatorios"), "recordatorios", False),
+    ("GET", re.compile(r"/metricas"), "metricas", False),
+    ("POST", re.compile(r"/metricas"), "metricas", False),
+    ("POST", re.compile(r"/veterinarios"), "veterinario", False),
+    ("POST", re.compile(r"/citas"), "reservar", False),
+    ("DELETE", re.compile(r"/citas/(?P<cita>\d+)"), "cancelar_cita", False),
+    ("GET", re.compile(r"/citas/libre"), "turno_libre", False),
+    ("GET", re.compile(r"/agenda"), "agenda", False),
+    ("POST", re.compile(r"/citas/encolar"), "encolar_citas", True),
+]
+
+# Parámetros de consulta que son números; el resto llega como texto aunque
+# tenga solo dígitos (veterinario=123, servicio=101)
+PARAMETROS_NUMERICOS = frozenset({"id", "pagina", "tamanio", "meses", "sin_visitas", "turnos"})
+
+# Cada cuánto pasan solas a la sala de espera las citas cuya hora llegó
+INTERVALO_CITAS = 30
+
+MOTIVOS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 422: "Unprocessable Entity", 431: "Request Header Fields Too Large",
+           500: "Internal Server Error"}
+
+TAMANIO_MAXIMO_CUERPO = 1 << 20
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+class ServidorVeterinaria:
+    def __init__(self, sistema):
+        self.sistema = sistema
+        self.lsn_en_disco = 0
+        self._tarea_fsync = None
+        self._codificar = json.JSONEncoder(ensure_ascii=False).encode
+    
+    def resolver_ruta(self, metodo, destino):
+        partes = urlsplit(destino)
+        ruta = partes.path.rstrip("/") or "/"
+        metodos_validos = False
+        
+        for metodo_ruta, patron, operacion, escribe in RUTAS:
+            coincidencia = patron.fullmatch(ruta)
+            if coincidencia is None:
+                continue
+            if metodo_ruta != metodo:
+                metodos_validos = True
+                continue
+            parametros = dict(parse_qsl(partes.query))
+            for clave in PARAMETROS_NUMERICOS.intersection(parametros):
+                try:
+                    parametros[clave] = int(parametros[clave])
+                except ValueError:
+                    raise ErrorHTTP(400, f"El parámetro {clave} tiene que ser un número entero.")
+            parametros.update((clave, int(valor)) for clave, valor in coincidencia.groupdict().items())
+            return operacion, escribe, parametros
+        
+        if metodos_validos:
+            raise ErrorHTTP(405, "Método no permitido para esta ruta.")
+        raise ErrorHTTP(404, "Ruta desconocida.")
+    
+    async def procesar(self, metodo, destino, cuerpo):
+        # Devuelve (estado, respuesta); los errores de negocio son 422
+        try:
+            operacion, escribe, parametros = self.resolver_ruta(metodo, destino)
+            comando = json.loads(cuerpo) if cuerpo else {}
+            if not isinstance(comando, dict):
+                raise ErrorHTTP(400, "El cuerpo debe ser un objeto JSON.")
+            comando.update(parametros)
+            comando["op"] = operacion
+            # ejecutar_comando valida "id" del cuerpo (entero, o texto con un
+            # entero) antes de que llegue al árbol
+            resultado = {"ok": True, **ejecutar_comando(self.sistema, comando)}
+        except ErrorHTTP as error:
+            return error.estado, {"ok": False, "error": str(error)}
+        except ErrorVeterinaria as error:
+            return 422, {"ok": False, "error": str(error)}
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            return 400, {"ok": False, "error": f"Solicitud inválida: {error!r}"}
+        except Exception as error:
+            # Un fallo inesperado responde 500 y la conexión sigue abierta
+            traceback.print_exc(file=sys.stderr)
+            return 500, {"ok": False, "error": f"Error interno: {error!r}"}
+        
+        if escribe:
+            await self.esperar_disco()
+        return 200, resultado
+    
+    async def esperar_disco(self):
+        almacen = self.sistema.almacen
+        if almacen is None or almacen.sincronizar:
+            return
+        
+        lsn = almacen.ultimo_lsn
+        while self.lsn_en_disco < lsn:
+            if self._tarea_fsync is None or self._tarea_fsync.done():
+                self._tarea_fsync = asyncio.get_running_loop().create_task(self._sincronizar())
+            # shield: si el cliente se desconecta, el fsync sigue para los demás
+            await asyncio.shield(self._tarea_fsync)
+    
+    async def _sincronizar(self):
+        lsn, descriptor = self.sistema.almacen.descriptor_para_sincronizar()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, descriptor)
+        finally:
+            os.close(descriptor)
+        self.lsn_en_disco = max(self.lsn_en_disco, lsn)
+    
+    async def atender_conexion(self, lector, escritor):
+        try:
+            while True:
+                solicitud = await self._leer_solicitud(lector)
+                if solicitud is None:
+                    break
+                metodo, destino, cuerpo, mantener = solicitud
+                estado, respuesta = await self.procesar(metodo, destino, cuerpo)
+                self._responder(escritor, estado, respuesta, mantener)
+                await escritor.drain()
+                if not mantener:
+                    break
+        except ErrorHTTP as error:
+            self._responder(escritor, error.estado, {"ok": False, "error": str(error)}, False)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except Exception as error:
+            traceback.print_exc(file=sys.stderr)
+            self._responder(escritor, 500, {"ok": False, "error": f"Error interno: {error!r}"}, False)
+        finally:
+            escritor.close()
+    
+    async def _leer_linea(self, lector, estado, mensaje):
+        # Una línea más larga que el límite del lector (64 KiB) no es un
+        # error interno: se responde con estado y se cierra la conexión
+        try:
+            return await lector.readline()
+        except (ValueError, asyncio.LimitOverrunError):
+            raise ErrorHTTP(estado, mensaje)
+    
+    async def _leer_solicitud(self, lector):
+        linea = await self._leer_linea(lector, 400, "Línea de solicitud demasiado larga.")
+        if not linea:
+            return None
+        try:
+            metodo, destino, version = linea.decode("latin-1").split()
+        except ValueError:
+            raise ErrorHTTP(400, "Línea de solicitud inválida.")
+        
+        cabeceras = {}
+        while True:
+            linea = await self._leer_linea(lector, 431, "Cabecera demasiado larga.")
+            if linea in (b"\r\n", b"\n", b""):
+                break
+            nombre, _, valor = linea.decode("latin-1").partition(":")
+            cabeceras[nombre.strip().lower()] = valor.strip()
+        
+        try:
+            largo = int(cabeceras.get("content-length", 0))
+        except ValueError:
+            raise ErrorHTTP(400, "Content-Length inválido.")
+        if largo > TAMANIO_MAXIMO_CUERPO:
+            raise ErrorHTTP(413, "Cuerpo demasiado grande.")
+        cuerpo = await lector.readexactly(largo) if largo else b""
+        
+        conexion = cabeceras.get("connection", "").lower()
+        mantener = conexion != "close" if version == "HTTP/1.1" else conexion == "keep-alive"
+        return metodo.upper(), destino, cuerpo, mantener
+    
+    def _responder(self, escritor, estado, respuesta, mantener):
+        cuerpo = self._codificar(respuesta).encode("utf-8")
+        escritor.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json; charset=utf-8\r\n"
+                       b"Content-Length: %d\r\nConnection: %s\r\n\r\n%s"
+                       % (estado, MOTIVOS[estado].encode("ascii"), len(cuerpo),
+                          b"keep-alive" if mantener else b"close", cuerpo))
+
+
+async def servir(sistema, host="127.0.0.1", puerto=8080, listo=None):
+    servidor_veterinaria = ServidorVeterinaria(sistema)
+    # backlog amplio: la prueba de carga abre ~1000 conexiones de golpe
+    servidor = await asyncio.start_server(servidor_veterinaria.atender_conexion, host, puerto, backlog=4096)
+    if listo is not None:
+        listo(servidor)
+    
+    # SIGTERM termina ordenadamente para que se escriba la instantánea final
+    detener = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, detener.set)
+    except (NotImplementedError, AttributeError):
+        pass
+    citas = asyncio.get_running_loop().create_task(encolar_citas_periodicamente(sistema))
+    try:
+        async with servidor:
+            await detener.wait()
+    finally:
+        citas.cancel()
+
+
+async def encolar_citas_periodicamente(sistema):
+    while True:
+        try:
+            sistema.encolar_citas()
+        except Exception:
+            # Un fallo no detiene la tarea: en la próxima vuelta se reintenta
+            traceback.print_exc(file=sys.stderr)
+        await asyncio.sleep(INTERVALO_CITAS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor HTTP/JSON del sistema veterinario")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--datos", help="carpeta de la base de datos persistente")
+    parser.add_argument("--espera", choices=["prioridad", "fifo"], default="prioridad")
+    parser.add_argument("--metricas", action="store_true", help="medir desde el arranque (GET /metricas)")
+    parser.add_argument("--compactar-cada", type=int, default=10000, metavar="N",
+                        help="operaciones del registro entre compactaciones (en otro proceso)")
+    argumentos = parser.parse_args()
+    
+    if argumentos.metricas:
+        metricas.activar()
+    
+    almacen = None
+    if argumentos.datos:
+        # Sin fsync por operación: el servidor sincroniza en grupo
+        almacen = AlmacenPacientes(argumentos.datos, sincronizar=False,
+                                   registros_por_instantanea=argumentos.compactar_cada)
+    
+    sistema = SistemaVeterinaria(almacen=almacen, politica_espera=argumentos.espera)
+    if almacen is not None:
+        sistema.cargar_desde_almacen()
+    
+    print(f"Escuchando en http://{argumentos.host}:{argumentos.puerto}", flush=True)
+    try:
+        asyncio.run(servir(sistema, argumentos.host, argumentos.puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if almacen is not None:
+            sistema.guardar_instantanea()
+            almacen.cerrar()
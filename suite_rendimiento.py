@@ -0,0 +1,387 @@
+# Suite de rendimiento - Clínica Veterinaria "Pet Market"
+# Escenarios reproducibles (semilla fija) sobre cada estructura y cada flujo
+# del menú, a varias escalas y con IDs secuenciales, aleatorios o sesgados.
+# Por cada fase mide operaciones/s, latencias p50/p90/p99/máx y memoria pico;
+# el resultado se guarda en JSON para compararlo con una corrida anterior.
+#
+# Uso: python suite_rendimiento.py [--escalas 1000,10000,100000,1000000]
+#                                  [--escenarios arbol_avl,visita] [--distribuciones secuencial,aleatoria]
+#                                  [-o resultados.json] [--comparar base.json] [--umbral 0.10]
+#                                  [--perfil carpeta] [--sin-memoria] [--semilla 1]
+#
+# Cada escenario corre una vez para medir tiempos, otra con tracemalloc para
+# la memoria pico (tracemalloc hace todo varias veces más lento, por eso no
+# se mezclan) y, con --perfil, otra más con cProfile que deja un .prof por
+# escenario (ver con: python -m pstats carpeta/arbol_avl-aleatoria-10000.prof).
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+from datetime import datetime
+from itertools import accumulate, islice
+
+from benchmark_veterinaria import generar_diagnosticos
+from carga_http import percentil
+from veterinaria_pet_market import (NOMBRES_PRIORIDAD, ArbolAVL, ArbolBinario, Cola, ColaPrioridad, HistorialMedico,
+                                    Mascota, Pila, SistemaVeterinaria, cotizar, dia_actual)
+
+DISTRIBUCIONES = ("secuencial", "aleatoria", "sesgada")
+ESCALAS = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def generar_ids(distribucion, cantidad, azar):
+    # IDs únicos en el orden en que llegan las altas:
+    #   secuencial: 1, 2, 3...  (el peor caso de un árbol sin balancear)
+    #   aleatoria:  sin orden, tomados de un rango diez veces más grande
+    #   sesgada:    casi ordenados, como una clínica que numera en orden pero
+    #               migra fichas de otra sede: un 20 % fuera de lugar
+    if distribucion == "secuencial":
+        return list(range(1, cantidad + 1))
+    if distribucion == "aleatoria":
+        return azar.sample(range(1, cantidad * 10 + 1), cantidad)
+    
+    ids = list(range(1, cantidad + 1))
+    for posicion in azar.sample(range(cantidad), cantidad // 5):
+        otra = azar.randrange(cantidad)
+        ids[posicion], ids[otra] = ids[otra], ids[posicion]
+    return ids
+
+
+def generar_accesos(distribucion, ids, cantidad, azar):
+    # IDs a consultar: uniformes, o con sesgo (pocas mascotas muy frecuentes,
+    # pesos ~ 1/rango como en una distribución de Zipf)
+    if distribucion != "sesgada":
+        return azar.choices(ids, k=cantidad)
+    pesos = list(accumulate(1 / rango for rango in range(1, len(ids) + 1)))
+    return azar.choices(ids, cum_weights=pesos, k=cantidad)
+
+
+def generar_fichas(ids):
+    return [Mascota(i, f"Mascota {i}", "Mestizo" if i % 3 else "Golden Retriever",
+                    "Alergia a la penicilina" if i % 20 == 0 else "Ninguna", f"Dueño {i % 50_000}",
+                    f"09{i:08d}") for i in ids]
+
+
+class Cronometro:
+    # Toma el tiempo de cada operación de una fase. El costo de leer el reloj
+    # (~50-100 ns) queda incluido en las latencias y en las operaciones/s.
+    
+    def __init__(self):
+        self.fases = {}
+    
+    def medir(self, fase, funcion, argumentos):
+        latencias = array("q")
+        agregar = latencias.append
+        reloj = time.perf_counter_ns
+        inicio = reloj()
+        for argumento in argumentos:
+            antes = reloj()
+            funcion(argumento)
+            agregar(reloj() - antes)
+        self.fases[fase] = (latencias, (reloj() - inicio) / 1e9, len(latencias))
+    
+    def medir_lote(self, fase, funcion, elementos):
+        # Una sola llamada que procesa elementos (carga masiva, listado completo)
+        inicio = time.perf_counter_ns()
+        funcion()
+        transcurrido = time.perf_counter_ns() - inicio
+        self.fases[fase] = (array("q", [transcurrido]), transcurrido / 1e9, elementos)
+
+
+class SinCronometro(Cronometro):
+    # Para las pasadas de memoria y de perfil: ejecuta sin tomar tiempos
+    
+    def medir(self, fase, funcion, argumentos):
+        for argumento in argumentos:
+            funcion(argumento)
+    
+    def medir_lote(self, fase, funcion, elementos):
+        funcion()
+
+
+def _en_silencio(funcion):
+    # Los listados escriben en sys.stdout: se descarta la salida
+    def ejecutar():
+        salida_real = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            funcion()
+        finally:
+            sys.stdout = salida_real
+    return ejecutar
+
+
+# Escenarios: reciben (cantidad, distribución, azar, cronómetro) y devuelven
+# las estructuras creadas, para que sigan vivas al medir la memoria pico
+
+def escenario_arbol_avl(cantidad, distribucion, azar, cronometro):
+    ids = generar_ids(distribucion, cantidad, azar)
+    mascotas = generar_fichas(ids)
+    arbol = ArbolAVL()
+    cronometro.medir("insertar", arbol.insertar, mascotas)
+    cronometro.medir("buscar", arbol.buscar, generar_accesos(distribucion, ids, cantidad, azar))
+    cronometro.medir("buscar_ausente", arbol.buscar, [-i for i in range(1, min(cantidad, 100_000) + 1)])
+    cronometro.medir("eliminar", arbol.eliminar, azar.sample(ids, cantidad // 10))
+    return arbol
+
+
+def escenario_arbol_binario(cantidad, distribucion, azar, cronometro):
+    # Sin balancear: con IDs ordenados cada alta recorre todo el árbol
+    ids = generar_ids(distribucion, cantidad, azar)
+    arbol = ArbolBinario()
+    cronometro.medir("insertar", arbol.insertar, generar_fichas(ids))
+    cronometro.medir("buscar", arbol.buscar, generar_accesos(distribucion, ids, cantidad, azar))
+    return arbol
+
+
+def escenario_carga_masiva(cantidad, distribucion, azar, cronometro):
+    mascotas = generar_fichas(generar_ids(distribucion, cantidad, azar))
+    arbol = ArbolAVL()
+    cronometro.medir_lote("cargar_masivo", lambda: arbol.cargar_masivo(mascotas), cantidad)
+    return arbol
+
+
+def escenario_cola_fifo(cantidad, distribucion, azar, cronometro):
+    ids = generar_ids(distribucion, cantidad, azar)
+    cola = Cola()
+    cronometro.medir("encolar", cola.encolar, generar_fichas(ids))
+    cronometro.medir("posicion", cola.posicion, generar_accesos(distribucion, ids, min(cantidad, 100_000), azar))
+    cronometro.medir("desencolar", lambda _: cola.desencolar(), range(cantidad))
+    return cola
+
+
+def escenario_cola_prioridad(cantidad, distribucion, azar, cronometro):
+    ids = generar_ids(distribucion, cantidad, azar)
+    cola = ColaPrioridad()
+    prioridades = azar.choices(sorted(NOMBRES_PRIORIDAD), weights=[1, 3, 16], k=cantidad)
+    llegadas = list(zip(generar_fichas(ids), prioridades))
+    cronometro.medir("encolar", lambda llegada: cola.encolar(*llegada), llegadas)
+    cronometro.medir("posicion", cola.posicion, generar_accesos(distribucion, ids, min(cantidad, 100_000), azar))
+    cronometro.medir("desencolar", lambda _: cola.desencolar(), range(cantidad))
+    return cola
+
+
+def escenario_pila(cantidad, distribucion, azar, cronometro):
+    # La pila enlazada clásica frente al historial respaldado por arreglos
+    textos = generar_diagnosticos(azar, 1000)
+    registros = [f"{i % 28 + 1:02d}/10/2026 - {textos[i % 1000]}" for i in range(cantidad)]
+    pila = Pila()
+    cronometro.medir("apilar", pila.apilar, registros)
+    cronometro.medir("desapilar", lambda _: pila.desapilar(), range(cantidad))
+    
+    historial = HistorialMedico()
+    hoy = dia_actual()
+    cronometro.medir("historial_agregar", lambda texto: historial.agregar(hoy, texto, "CON"), registros)
+    posiciones = [azar.randrange(1, cantidad + 1) for _ in range(min(cantidad, 100_000))]
+    cronometro.medir("historial_obtener", historial.obtener, posiciones)
+    cronometro.medir("historial_pagina", lambda posicion: historial.pagina(posicion // 20 + 1, 20), posiciones)
+    return pila, historial
+
+
+def escenario_listado(cantidad, distribucion, azar, cronometro):
+    arbol = ArbolAVL()
+    arbol.cargar_masivo(generar_fichas(generar_ids(distribucion, cantidad, azar)))
+    cronometro.medir_lote("recorrer", lambda: sum(1 for _ in arbol), cantidad)
+    cronometro.medir_lote("mostrar_base_datos", _en_silencio(arbol.recorrido_inorden), cantidad)
+    
+    cola = ColaPrioridad()
+    for mascota in islice(arbol, 10_000):
+        cola.encolar(mascota, azar.choice(sorted(NOMBRES_PRIORIDAD)))
+    cronometro.medir_lote("mostrar_sala_espera", _en_silencio(cola.mostrar_sala_espera), cola.tamanio)
+    return arbol, cola
+
+
+def escenario_visita(cantidad, distribucion, azar, cronometro):
+    # Flujo completo del menú sobre la API sin interacción: alta, búsquedas,
+    # llegada, posición, atención con diagnóstico y cobro, historial, resumen
+    ids = generar_ids(distribucion, cantidad, azar)
+    sistema = SistemaVeterinaria()
+    mitad = cantidad // 2
+    sistema.cargar_mascotas(generar_fichas(ids[:mitad]))
+    cronometro.medir("alta", lambda mascota: sistema.alta_mascota(mascota.id, mascota.nombre, mascota.raza,
+                                                                  mascota.alergias, mascota.nombre_dueno,
+                                                                  mascota.celular),
+                     generar_fichas(ids[mitad:]))
+    
+    visitas = min(cantidad, 200_000)
+    accesos = generar_accesos(distribucion, ids, visitas, azar)
+    cronometro.medir("buscar_dueno", sistema.indice_dueno.buscar_exacto,
+                     [f"Dueño {i % 50_000}" for i in accesos[:min(visitas, 20_000)]])
+    cronometro.medir("buscar_celular", lambda i: sistema.indice_celular.buscar_prefijo(f"09{i:08d}"[:7], 20),
+                     accesos[:min(visitas, 20_000)])
+    
+    # Hora pico: llegan todos y después se atiende hasta vaciar la sala
+    prioridades = azar.choices(sorted(NOMBRES_PRIORIDAD), weights=[1, 3, 16], k=visitas)
+    selecciones = azar.choices(["CON", "CON+VAC", "VAC", "BAN", "CON+DES", "RAY+CON", ""], k=visitas)
+    textos = generar_diagnosticos(azar, 1000)
+    en_sala = set()
+    llegadas = []
+    for id_mascota, prioridad in zip(accesos, prioridades):
+        if id_mascota not in en_sala:
+            en_sala.add(id_mascota)
+            llegadas.append((id_mascota, prioridad))
+    
+    cronometro.medir("llegada", lambda llegada: sistema.registrar_llegada(*llegada), llegadas)
+    cronometro.medir("posicion", sistema.sala_espera.posicion, [i for i, _ in llegadas[:min(len(llegadas), 20_000)]])
+    atenciones = [(textos[numero % 1000], selecciones[numero]) for numero in range(len(llegadas))]
+    cronometro.medir("atender", lambda atencion: sistema.atender_siguiente(*atencion), atenciones)
+    cronometro.medir("historial", sistema.consultar_historial, accesos[:min(visitas, 20_000)])
+    cronometro.medir("cotizar", cotizar, [seleccion for seleccion in selecciones[:20_000] if seleccion])
+    # El resumen sale de los acumulados del libro: cuenta como una operación
+    cronometro.medir_lote("resumen_facturacion", _en_silencio(sistema.facturacion.mostrar_resumen), 1)
+    return sistema
+
+
+# nombre -> (función, distribuciones, escala máxima por distribución)
+ESCENARIOS = {
+    "arbol_avl": (escenario_arbol_avl, DISTRIBUCIONES, {}),
+    # Altas ordenadas en un árbol sin balancear son cuadráticas: se limita
+    "arbol_binario": (escenario_arbol_binario, DISTRIBUCIONES, {"secuencial": 10_000, "sesgada": 10_000}),
+    "carga_masiva": (escenario_carga_masiva, DISTRIBUCIONES, {}),
+    "cola_fifo": (escenario_cola_fifo, ("secuencial", "aleatoria"), {}),
+    "cola_prioridad": (escenario_cola_prioridad, ("secuencial", "aleatoria"), {}),
+    "pila": (escenario_pila, ("secuencial",), {}),
+    "listado": (escenario_listado, ("aleatoria",), {}),
+    "visita": (escenario_visita, DISTRIBUCIONES, {}),
+}
+
+
+def resumir(escenario, distribucion, cantidad, fase, latencias, transcurrido, elementos):
+    ordenadas = sorted(latencias)
+    return {
+        "escenario": escenario,
+        "distribucion": distribucion,
+        "cantidad": cantidad,
+        "fase": fase,
+        "operaciones": elementos,
+        "segundos": round(transcurrido, 6),
+        "ops_s": round(elementos / transcurrido, 1) if transcurrido else None,
+        "p50_us": round(percentil(ordenadas, 50) / 1000, 3),
+        "p90_us": round(percentil(ordenadas, 90) / 1000, 3),
+        "p99_us": round(percentil(ordenadas, 99) / 1000, 3),
+        "max_us": round(ordenadas[-1] / 1000, 3) if ordenadas else 0.0,
+    }
+
+
+def correr(nombre, cantidad, distribucion, semilla, medir_memoria, carpeta_perfil):
+    funcion = ESCENARIOS[nombre][0]
+    cronometro = Cronometro()
+    funcion(cantidad, distribucion, random.Random(semilla), cronometro)
+    resultados = [resumir(nombre, distribucion, cantidad, fase, *datos) for fase, datos in cronometro.fases.items()]
+    
+    if medir_memoria:
+        tracemalloc.start()
+        try:
+            estructuras = funcion(cantidad, distribucion, random.Random(semilla), SinCronometro())
+            pico = tracemalloc.get_traced_memory()[1]
+            del estructuras
+        finally:
+            tracemalloc.stop()
+        for resultado in resultados:
+            resultado["memoria_pico_mb"] = round(pico / 2**20, 2)
+    
+    if carpeta_perfil:
+        perfil = cProfile.Profile()
+        perfil.runcall(funcion, cantidad, distribucion, random.Random(semilla), SinCronometro())
+        perfil.dump_stats(os.path.join(carpeta_perfil, f"{nombre}-{distribucion}-{cantidad}.prof"))
+    
+    return resultados
+
+
+def clave(resultado):
+    return resultado["escenario"], resultado["distribucion"], resultado["cantidad"], resultado["fase"]
+
+
+def comparar(resultados, base, umbral):
+    # Imprime las fases que cambiaron más que el umbral; devuelve cuántas empeoraron
+    anteriores = {clave(resultado): resultado for resultado in base["resultados"]}
+    regresiones = 0
+    print(f"\n    Comparación con la corrida base (umbral {umbral:.0%})")
+    print(f"    {'Escenario / fase':<44}{'ops/s base':>13}{'ops/s':>13}{'cambio':>9}{'p99 base':>11}{'p99':>11}")
+    
+    for resultado in resultados:
+        anterior = anteriores.get(clave(resultado))
+        if anterior is None or not anterior["ops_s"] or not resultado["ops_s"]:
+            continue
+        cambio = resultado["ops_s"] / anterior["ops_s"] - 1
+        if abs(cambio) < umbral:
+            continue
+        marca = "  <- regresión" if cambio < 0 else ""
+        regresiones += cambio < 0
+        nombre = f"{resultado['escenario']}/{resultado['fase']} {resultado['distribucion']} {resultado['cantidad']:,}"
+        print(f"    {nombre:<44}{anterior['ops_s']:>13,.0f}{resultado['ops_s']:>13,.0f}{cambio:>+9.1%}"
+              f"{anterior['p99_us']:>11.2f}{resultado['p99_us']:>11.2f}{marca}")
+    
+    if not regresiones:
+        print("    Sin regresiones por encima del umbral.")
+    return regresiones
+
+
+def mostrar_resultados(resultados):
+    print(f"\n    {'Escenario / fase':<44}{'ops/s':>13}{'p50 µs':>12}{'p99 µs':>12}{'máx µs':>12}{'MB pico':>9}")
+    for resultado in resultados:
+        nombre = f"{resultado['escenario']}/{resultado['fase']} {resultado['distribucion']} {resultado['cantidad']:,}"
+        memoria = resultado.get("memoria_pico_mb")
+        print(f"    {nombre:<44}{resultado['ops_s'] or 0:>13,.0f}{resultado['p50_us']:>12.2f}{resultado['p99_us']:>12.2f}"
+              f"{resultado['max_us']:>12.1f}{memoria if memoria is not None else '-':>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suite de rendimiento del sistema veterinario")
+    parser.add_argument("--escalas", default=",".join(map(str, ESCALAS)),
+                        help="cantidades separadas por coma (por defecto: 1000 a 1000000)")
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS), help="por defecto: todos")
+    parser.add_argument("--distribuciones", default=",".join(DISTRIBUCIONES))
+    parser.add_argument("-o", "--salida", help="archivo JSON con los resultados")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior; sale con código 1 si hay regresiones")
+    parser.add_argument("--umbral", type=float, default=0.10, help="cambio de ops/s que se informa (0.10 = 10 %%)")
+    parser.add_argument("--perfil", help="carpeta donde dejar un volcado de cProfile por escenario")
+    parser.add_argument("--sin-memoria", action="store_true", help="omite la pasada con tracemalloc")
+    parser.add_argument("--semilla", type=int, default=1)
+    argumentos = parser.parse_args()
+    
+    escalas = [int(escala) for escala in argumentos.escalas.split(",")]
+    pedidas = argumentos.distribuciones.split(",")
+    if argumentos.perfil:
+        os.makedirs(argumentos.perfil, exist_ok=True)
+    
+    resultados = []
+    for nombre in argumentos.escenarios.split(","):
+        if nombre not in ESCENARIOS:
+            parser.error(f"escenario desconocido: {nombre} (disponibles: {', '.join(ESCENARIOS)})")
+        _, distribuciones, maximos = ESCENARIOS[nombre]
+        for distribucion in distribuciones:
+            if distribucion not in pedidas:
+                continue
+            for cantidad in escalas:
+                if cantidad > maximos.get(distribucion, cantidad):
+                    continue
+                print(f"    {nombre} ({distribucion}, {cantidad:,})...", file=sys.stderr, flush=True)
+                resultados.extend(correr(nombre, cantidad, distribucion, argumentos.semilla,
+                                         not argumentos.sin_memoria, argumentos.perfil))
+    
+    mostrar_resultados(resultados)
+    
+    if argumentos.salida:
+        with open(argumentos.salida, "w", encoding="utf-8") as archivo:
+            json.dump({
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "semilla": argumentos.semilla,
+                "resultados": resultados,
+            }, archivo, ensure_ascii=False, indent=1)
+    
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        if comparar(resultados, base, argumentos.umbral):
+            sys.exit(1)
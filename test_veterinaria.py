@@ -0,0 +1,862 @@
+# Pruebas - Clínica Veterinaria "Pet Market"
+# Uso: python -m pytest test_veterinaria.py
+#
+# Cada prueba compara contra una referencia simple (recorrer todo, un modelo
+# ingenuo o una caída simulada); los tiempos quedan en benchmark_veterinaria.py.
+
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import metricas
+import migracion
+import modo_lote
+import servidor_http
+from almacenamiento import ARCHIVO_REGISTRO, ARCHIVO_SELLADO, AlmacenPacientes
+from benchmark_veterinaria import (ALERGIAS_FICHA, crear_almacen, generar_diagnosticos, generar_mascotas,
+                                   llenar_libro, mascotas_con_alergias, sistema_con_historiales)
+from concurrencia import ColaDosCandados, SistemaConcurrente
+from veterinaria_pet_market import (ALERGENOS_SERVICIO, DIAS_BUSQUEDA, DIAS_LABORABLES, TURNOS_POR_DIA, ArbolAVL,
+                                    ArbolBinario, Cola, ColaPrioridad, ErrorVeterinaria, HistorialMedico,
+                                    IndiceDiferido, IndiceSecundario, LibroFacturacion, Mascota, NodoArbol,
+                                    SistemaVeterinaria, cotizar, dia_actual, dia_semana, momento_de,
+                                    normalizar_texto, palabras_clave)
+
+
+def _revisar_avl(nodo, minimo=None, maximo=None):
+    # Devuelve la altura real del subárbol y comprueba orden, balance y la altura guardada
+    if nodo is None:
+        return 0
+    assert (minimo is None or nodo.dato.id > minimo) and (maximo is None or nodo.dato.id < maximo)
+    izquierda = _revisar_avl(nodo.izquierdo, minimo, nodo.dato.id)
+    derecha = _revisar_avl(nodo.derecho, nodo.dato.id, maximo)
+    assert abs(izquierda - derecha) <= 1
+    assert nodo.altura == 1 + max(izquierda, derecha)
+    return nodo.altura
+
+
+def test_arbol_avl():
+    # IDs secuenciales: el árbol simple degenera y el AVL queda perfecto
+    simple = ArbolBinario()
+    avl = ArbolAVL()
+    for mascota in generar_mascotas(range(1, 8)):
+        simple.insertar(mascota)
+        avl.insertar(mascota)
+    assert (simple.altura(), simple.rotaciones) == (7, 0)
+    assert (avl.altura(), avl.rotaciones, avl.raiz.dato.id) == (3, 4, 4)
+    assert not avl.insertar(generar_mascotas([4])[0]) and avl.cantidad == 7
+    
+    # Altas y bajas al azar contra un conjunto de referencia
+    azar = random.Random(1)
+    avl = ArbolAVL()
+    ids = set()
+    for paso in range(5000):
+        id_mascota = azar.randint(1, 1500)
+        if azar.random() < 0.6:
+            assert avl.insertar(generar_mascotas([id_mascota])[0]) == (id_mascota not in ids)
+            ids.add(id_mascota)
+        else:
+            eliminada = avl.eliminar(id_mascota)
+            assert (eliminada.id if eliminada else None) == (id_mascota if id_mascota in ids else None)
+            ids.discard(id_mascota)
+        if paso % 500 == 0:
+            _revisar_avl(avl.raiz)
+    
+    assert _revisar_avl(avl.raiz) == avl.altura() <= 1.45 * math.log2(len(ids) + 2)
+    assert [mascota.id for mascota in avl] == sorted(ids) and avl.cantidad == len(ids)
+    assert all(avl.buscar(i) is not None for i in ids) and avl.buscar(0) is None
+
+def test_cargar_masivo():
+    # Árbol vacío: altura mínima en los dos tipos de árbol, también con tuplas
+    for clase in (ArbolBinario, ArbolAVL):
+        arbol = clase()
+        registros = [(i, f"Mascota {i}", "Mestizo", "Ninguna", "Dueño", "0900") for i in range(1, 1001)]
+        assert arbol.cargar_masivo(registros) == 1000
+        assert arbol.altura() == math.ceil(math.log2(1001)) and arbol.cantidad == 1000
+        assert [mascota.id for mascota in arbol] == list(range(1, 1001))
+    _revisar_avl(arbol.raiz)
+    assert arbol.rotaciones == 0 and arbol.cargar_masivo([]) == 0 and arbol.cantidad == 1000
+    
+    # Árbol con datos, lote desordenado y con repetidos: se conserva el registro existente
+    arbol = ArbolAVL()
+    for mascota in generar_mascotas(range(2, 200, 2)):
+        arbol.insertar(mascota)
+    original = arbol.buscar(10)
+    nuevas = generar_mascotas(range(1, 300, 3))
+    random.Random(2).shuffle(nuevas)
+    nuevas += generar_mascotas([7, 7])
+    esperados = set(range(2, 200, 2)) | set(range(1, 300, 3)) | {7}
+    assert arbol.cargar_masivo(nuevas) == len(esperados) - len(range(2, 200, 2))
+    assert [mascota.id for mascota in arbol] == sorted(esperados) and arbol.cantidad == len(esperados)
+    assert arbol.buscar(10) is original
+    assert _revisar_avl(arbol.raiz) == math.ceil(math.log2(len(esperados) + 1))
+    
+    # Después de la carga, insertar y eliminar siguen balanceando
+    arbol.insertar(generar_mascotas([1000])[0])
+    arbol.eliminar(4)
+    _revisar_avl(arbol.raiz)
+
+def test_iter_desde_y_listado_paginado(monkeypatch, capsys):
+    arbol = ArbolAVL()
+    assert list(ArbolAVL().iter_desde(1, 5)) == []
+    arbol.cargar_masivo(generar_mascotas(range(10, 101, 10)))
+    rango = lambda id_min=None, id_max=None: [mascota.id for mascota in arbol.iter_desde(id_min, id_max)]
+    assert rango() == list(range(10, 101, 10))
+    assert rango(30, 60) == [30, 40, 50, 60]
+    assert rango(31, 59) == [40, 50]
+    assert rango(None, 10) == [10] and rango(100) == [100]
+    assert rango(101) == [] and rango(None, 9) == [] and rango(60, 30) == []
+    assert rango(-5, 1000) == rango()
+    
+    # Sin recursión: un árbol degenerado de 50.000 nodos se recorre igual
+    profundo = ArbolBinario()
+    for mascota in reversed(generar_mascotas(range(1, 50001))):
+        nodo = NodoArbol(mascota)
+        nodo.derecho = profundo.raiz
+        profundo.raiz = nodo
+    assert sum(1 for _ in profundo) == 50000 and next(profundo.iter_desde(49999)).id == 49999
+    
+    # Paginado: pregunta entre páginas, no después de la última, y 'q' corta
+    respuestas = iter(["", "q"])
+    monkeypatch.setattr("builtins.input", lambda mensaje: next(respuestas))
+    arbol.recorrido_inorden(tamanio_pagina=3)
+    salida = capsys.readouterr().out
+    assert "ID: 60" in salida and "ID: 70" not in salida
+    
+    respuestas = iter([""])
+    arbol.cargar_masivo(generar_mascotas([110, 120]))
+    arbol.recorrido_inorden(tamanio_pagina=6)
+    assert "ID: 120" in capsys.readouterr().out
+
+def test_indices_secundarios():
+    sistema = SistemaVeterinaria()
+    sistema.alta_mascota(1, "Max", "Golden Retriever", "Ninguna", "José Pérez", "0998-123-456")
+    sistema.alta_mascota(2, "Luna", "Pastor Alemán", "Ninguna", "MARÍA  peña", "0998 777 000")
+    sistema.alta_mascota(3, "Toby", "golden", "Ninguna", "Josefina Ruiz", "0911")
+    ids = lambda mascotas: sorted(mascota.id for mascota in mascotas)
+    
+    # Sin tildes ni mayúsculas, por el inicio de cualquier palabra del nombre
+    assert ids(sistema.indice_dueno.buscar_prefijo("jose")) == [1, 3]
+    assert ids(sistema.indice_dueno.buscar_prefijo("PÉR")) == [1]
+    assert ids(sistema.indice_dueno.buscar_prefijo("pena")) == [2]
+    assert ids(sistema.indice_dueno.buscar_exacto("maria peña")) == [2]
+    assert ids(sistema.indice_raza.buscar_prefijo("alem")) == [2]
+    assert ids(sistema.indice_raza.buscar_exacto("Golden")) == [3]
+    assert ids(sistema.indice_celular.buscar_prefijo("0998")) == [1, 2]
+    assert ids(sistema.indice_celular.buscar_exacto("0998123456")) == [1]
+    assert sistema.indice_dueno.buscar_prefijo("") == [] and sistema.indice_dueno.buscar_prefijo("zz") == []
+    assert len(sistema.indice_raza.buscar_prefijo("g", limite=1)) == 1
+    
+    # Las altas en ráfaga (claves pendientes) y las bajas coinciden con una reconstrucción
+    azar = random.Random(4)
+    nombres = ["Ana", "Ángel", "Andrés", "Núñez", "Nuño", "Óscar", "Oscarito", "Zoe"]
+    for i in range(4, 400):
+        sistema.alta_mascota(i, f"Mascota {i}", "Mestizo", "Ninguna",
+                             f"{azar.choice(nombres)} {azar.choice(nombres)}", f"09{i:08d}")
+    for i in range(4, 400, 7):
+        mascota = sistema.obtener_mascota(i)
+        sistema.base_datos.eliminar(i)
+        sistema.indice_dueno.quitar(mascota)
+    for prefijo in ("an", "ang", "nun", "osc", "oscarito", "zoe", "jos"):
+        esperado = [mascota.id for mascota in sistema.base_datos
+                    if any(palabra.startswith(prefijo)
+                           for palabra in normalizar_texto(mascota.nombre_dueno).split())]
+        assert ids(sistema.indice_dueno.buscar_prefijo(prefijo)) == esperado, prefijo
+    copia = IndiceSecundario("nombre_dueno", normalizar_texto, por_palabras=True)
+    copia.reconstruir(sistema.base_datos)
+    assert ids(copia.buscar_prefijo("a")) == ids(sistema.indice_dueno.buscar_prefijo("a"))
+
+def test_recuperacion(tmp_path):
+    # Simula caídas en los puntos delicados y comprueba que el estado recuperado es el esperado
+    carpeta = str(tmp_path)
+    ruta_registro = os.path.join(carpeta, ARCHIVO_REGISTRO)
+    
+    almacen = AlmacenPacientes(carpeta)
+    almacen.cargar()
+    almacen.registrar_mascota(1, "Max", "Golden", "Ninguna", "Carlos", "0998")
+    almacen.registrar_diagnostico(1, "01/01/2025 - Vacuna")
+    almacen.cerrar()
+    
+    # 1. Escritura cortada a la mitad de una línea
+    with open(ruta_registro, "ab") as archivo:
+        archivo.write(b'1a2b3c4d [3,"D",1,"01/02/2025 - inco')
+    filas = AlmacenPacientes(carpeta).cargar()
+    assert filas == [[1, "Max", "Golden", "Ninguna", "Carlos", "0998", ["01/01/2025 - Vacuna"]]]
+    
+    # 2. Línea completa pero corrupta (CRC no coincide)
+    almacen = AlmacenPacientes(carpeta)
+    almacen.cargar()
+    almacen.registrar_diagnostico(1, "01/03/2025 - Control")
+    almacen.cerrar()
+    with open(ruta_registro, "r+b") as archivo:
+        contenido = archivo.read()
+        archivo.seek(len(contenido) - 5)
+        archivo.write(b"XXXX\n")
+    filas = AlmacenPacientes(carpeta).cargar()
+    assert filas[0][6] == ["01/01/2025 - Vacuna"]
+    
+    # 3. Caída entre el reemplazo de la instantánea y el vaciado del registro
+    almacen = AlmacenPacientes(carpeta)
+    filas = almacen.cargar()
+    almacen.registrar_diagnostico(1, "01/04/2025 - Alta")
+    with open(ruta_registro, "rb") as archivo:
+        registro_previo = archivo.read()
+    almacen.escribir_instantanea([[1, "Max", "Golden", "Ninguna", "Carlos", "0998",
+                                   ["01/01/2025 - Vacuna", "01/04/2025 - Alta"]]])
+    almacen.cerrar()
+    with open(ruta_registro, "wb") as archivo:
+        archivo.write(registro_previo)
+    almacen = AlmacenPacientes(carpeta)
+    filas = almacen.cargar()
+    assert filas[0][6] == ["01/01/2025 - Vacuna", "01/04/2025 - Alta"]
+    
+    # 4. Las operaciones siguientes continúan la secuencia
+    almacen.registrar_diagnostico(1, "01/05/2025 - Seguimiento")
+    almacen.cerrar()
+    filas = AlmacenPacientes(carpeta).cargar()
+    assert filas[0][6][-1] == "01/05/2025 - Seguimiento" and len(filas[0][6]) == 3
+
+
+def test_compactacion_en_otro_proceso(tmp_path):
+    # Las escrituras que llegan al límite solo sellan el registro; la
+    # instantánea la arma otro proceso y el resultado es el mismo
+    carpeta = str(tmp_path)
+    sistema = SistemaVeterinaria(almacen=AlmacenPacientes(carpeta, sincronizar=False, registros_por_instantanea=300))
+    sistema.cargar_desde_almacen()
+    for i in range(1, 1001):
+        mascota = sistema.alta_mascota(i, f"Mascota {i}", "Mestizo", "Ninguna", f"Dueño {i}", "0900")
+        sistema.registrar_diagnostico(mascota, f"Control {i}", date(2025, 1, 1).toordinal() + i % 90, "CON")
+    sistema.almacen.esperar_compactacion()
+    assert not os.path.exists(os.path.join(carpeta, ARCHIVO_SELLADO))
+    
+    # Caída con un registro sellado sin compactar: se reaplica antes que el actual
+    sistema.almacen._sellar_registro()
+    sistema.registrar_diagnostico(sistema.obtener_mascota(1), "Después del sello", date(2025, 6, 1).toordinal())
+    filas = AlmacenPacientes(carpeta).cargar()
+    assert len(filas) == 1000 and all(len(fila[6]) == 1 for fila in filas[1:])
+    assert [texto for _, texto, _ in filas[0][6]] == ["Control 1", "Después del sello"]
+    
+    # Una instantánea completa espera la compactación y deja todo consistente
+    sistema.almacen.compactar_en_segundo_plano()
+    sistema.guardar_instantanea()
+    sistema.almacen.cerrar()
+    assert AlmacenPacientes(carpeta).cargar() == filas
+
+
+def test_historial_paginas_y_limites():
+    historial = HistorialMedico()
+    assert historial.pagina(1, 5) == [] and historial.obtener(1) is None and historial.total_paginas(5) == 1
+    assert historial.ver_tope() is None and historial.desapilar() is None
+    
+    # Referencia: lista del más reciente al más antiguo
+    registros = []
+    for i in range(1, 24):
+        registro = f"{i:02d}/01/2025 - Control {i}"
+        historial.apilar(registro)
+        registros.insert(0, registro)
+    assert historial.ver_tope() == registros[0] and list(historial) == registros
+    assert [historial.obtener(posicion) for posicion in range(1, 24)] == registros
+    assert historial.obtener(0) is None and historial.obtener(24) is None and historial.obtener(-1) is None
+    
+    assert historial.total_paginas(5) == 5 and historial.total_paginas(23) == 1
+    assert historial.pagina(1, 5) == list(zip(range(1, 6), registros[:5]))
+    assert historial.pagina(5, 5) == list(zip(range(21, 24), registros[20:]))
+    assert historial.pagina(6, 5) == [] and historial.pagina(0, 5) == [] and historial.pagina(1, 0) == []
+    assert historial.pagina(-1, 5) == [] and historial.pagina(1, 100) == list(zip(range(1, 24), registros))
+    
+    assert historial.desapilar() == registros.pop(0) and historial.tamanio == 22
+    assert historial.pagina(5, 5) == list(zip(range(21, 23), registros[20:]))
+    
+    # La API valida la página antes de buscar la mascota
+    sistema = SistemaVeterinaria()
+    mascota = sistema.alta_mascota(1, "Max", "Golden", "Ninguna", "Carlos", "0998")
+    mascota.historial_medico = historial
+    assert sistema.consultar_historial(1, 2, 10)[1] == list(zip(range(11, 21), registros[10:20]))
+    for pagina, tamanio in ((0, 10), (1, 0), ("1", 10), (1, 2.5)):
+        with pytest.raises(ErrorVeterinaria):
+            sistema.consultar_historial(1, pagina, tamanio)
+
+def test_cola_prioridad():
+    # Urgencia primero y, dentro de cada nivel, orden de llegada
+    cola = ColaPrioridad()
+    mascotas = generar_mascotas(range(1, 8))
+    for mascota, prioridad in zip(mascotas, (3, 1, 3, 2, 1, 3, 2)):
+        assert cola.encolar(mascota, prioridad)
+    assert not cola.encolar(mascotas[0], 1) and cola.prioridad_de(1) == 3
+    assert [mascota.id for mascota in cola.en_orden()] == [2, 5, 4, 7, 1, 3, 6]
+    assert [cola.posicion(i) for i in range(1, 8)] == [5, 1, 6, 3, 2, 7, 4] and cola.posicion(99) is None
+    assert cola.retirar(4).id == 4 and cola.retirar(4) is None and cola.posicion(7) == 3
+    assert [cola.desencolar().id for _ in range(6)] == [2, 5, 7, 1, 3, 6]
+    assert cola.esta_vacia() and cola.desencolar() is None
+    
+    # Altas, bajas y cambios de prioridad al azar contra un modelo ordenado
+    azar = random.Random(8)
+    cola = ColaPrioridad()
+    modelo = {}
+    llegada = 0
+    for _ in range(3000):
+        tirada = azar.random()
+        id_mascota = azar.randint(1, 80)
+        if tirada < 0.45:
+            prioridad = azar.randint(1, 3)
+            assert cola.encolar(generar_mascotas([id_mascota])[0], prioridad) == (id_mascota not in modelo)
+            if id_mascota not in modelo:
+                modelo[id_mascota] = (prioridad, llegada)
+                llegada += 1
+        elif tirada < 0.65 and modelo:
+            primero = min(modelo, key=modelo.get)
+            assert cola.ver_frente().id == primero and cola.desencolar().id == primero
+            del modelo[primero]
+        elif tirada < 0.85:
+            retirada = cola.retirar(id_mascota)
+            assert (retirada.id if retirada else None) == (id_mascota if modelo.pop(id_mascota, None) else None)
+        elif id_mascota in modelo:
+            prioridad = azar.randint(1, 3)
+            assert cola.cambiar_prioridad(id_mascota, prioridad)
+            modelo[id_mascota] = (prioridad, modelo[id_mascota][1])
+        orden = sorted(modelo, key=modelo.get)
+        assert [mascota.id for mascota in cola.en_orden()] == orden
+        assert all(cola.posicion(i) == posicion for posicion, i in enumerate(orden, 1))
+
+def test_cola_posiciones_y_cancelaciones():
+    cola = Cola()
+    mascotas = generar_mascotas(range(1, 7))
+    assert all(cola.encolar(mascota) for mascota in mascotas)
+    assert not cola.encolar(mascotas[2]) and cola.tamanio == 6 and cola.contiene(3)
+    assert cola.retirar(3).id == 3 and cola.retirar(3) is None and not cola.contiene(3)
+    assert cola.retirar(1).id == 1 and cola.retirar(5).id == 5
+    assert [cola.posicion(i) for i in range(1, 7)] == [None, 1, None, 2, None, 3]
+    assert cola.encolar(mascotas[2]) and cola.posicion(3) == 4
+    assert cola.desencolar().id == 2 and [cola.posicion(i) for i in (4, 6, 3)] == [1, 2, 3]
+    
+    # Llegadas, atenciones y cancelaciones al azar contra una lista
+    azar = random.Random(9)
+    cola = Cola()
+    modelo = []
+    for _ in range(4000):
+        tirada = azar.random()
+        id_mascota = azar.randint(1, 60)
+        if tirada < 0.45:
+            assert cola.encolar(generar_mascotas([id_mascota])[0]) == (id_mascota not in modelo)
+            if id_mascota not in modelo:
+                modelo.append(id_mascota)
+        elif tirada < 0.7:
+            atendida = cola.desencolar()
+            assert (atendida.id if atendida else None) == (modelo.pop(0) if modelo else None)
+        else:
+            retirada = cola.retirar(id_mascota)
+            assert (retirada.id if retirada else None) == (id_mascota if id_mascota in modelo else None)
+            if id_mascota in modelo:
+                modelo.remove(id_mascota)
+        assert [mascota.id for mascota in cola] == modelo and cola.tamanio == len(modelo)
+        assert all(cola.posicion(i) == posicion for posicion, i in enumerate(modelo, 1))
+        assert all(cola.posicion(i) is None for i in range(1, 61) if i not in modelo)
+
+def _coincide(texto, consulta):
+    palabras = set(palabras_clave(texto))
+    grupos = [[p for p in palabras_clave(parte) if p != "and"] for parte in consulta.split(" OR ")]
+    return any(grupo and all(palabra in palabras for palabra in grupo) for grupo in grupos)
+
+
+def test_facturacion():
+    # Compara cada total con un recorrido completo de las columnas, incluidos
+    # cobros anotados fuera de orden
+    filas = 20000
+    azar = random.Random(8)
+    libro = LibroFacturacion()
+    inicio = int(datetime(2023, 1, 1).timestamp())
+    llenar_libro(libro, filas, inicio, 1800, azar)
+    for _ in range(200):
+        libro.registrar(azar.randint(1, 50), "CON", 30.0, inicio + azar.randrange(filas * 1800))
+    
+    dias = [datetime.fromtimestamp(marca).date() for marca in libro.marcas]
+    for _ in range(50):
+        desde = dias[azar.randrange(len(dias))]
+        hasta = desde + timedelta(days=azar.randint(0, 90))
+        esperado = sum(p for d, p in zip(dias, libro.precios) if desde <= d <= hasta)
+        assert round(libro.total_entre(desde, hasta) * 100) == esperado, "total_entre"
+        assert round(libro.total_dia(desde) * 100) == sum(p for d, p in zip(dias, libro.precios) if d == desde)
+        mes = sum(p for d, p in zip(dias, libro.precios) if (d.year, d.month) == (desde.year, desde.month))
+        assert round(libro.total_mes(desde.year, desde.month) * 100) == mes, "total_mes"
+    
+    indice_con = libro.codigos.index("CON")
+    assert libro.total_servicio("CON")[0] == libro.servicios.count(indice_con), "total_servicio"
+    assert round(libro.total_mascota(7) * 100) == sum(p for i, p in zip(libro.ids, libro.precios) if i == 7)
+    assert round(libro.total() * 100) == sum(libro.precios), "total"
+
+
+def test_busqueda_diagnosticos():
+    # Contra un recorrido de todos los historiales, con fechas desordenadas
+    # (obliga a renumerar) y diagnósticos agregados después de la carga
+    cantidad = 5000
+    azar = random.Random(16)
+    inicio = date(2023, 1, 1).toordinal()
+    mascotas = generar_mascotas(range(1, 301))
+    textos = generar_diagnosticos(azar, cantidad)
+    for texto in textos[:cantidad // 2]:
+        fecha = date.fromordinal(inicio + azar.randrange(700)).strftime("%d/%m/%Y")
+        azar.choice(mascotas).agregar_diagnostico(f"{fecha} - {texto}")
+    
+    sistema = SistemaVeterinaria()
+    sistema.cargar_mascotas(mascotas)
+    for texto in textos[cantidad // 2:]:
+        sistema.registrar_diagnostico(azar.choice(mascotas), texto, inicio + azar.randrange(730))
+    
+    consultas = ["penicilina OR post-operatorio", "vacuna AND antirrábica", "control", "fractura OR otitis OR dieta",
+                 "inexistente", "vacunas refuerzo"]
+    for consulta in consultas:
+        for _ in range(5):
+            desde = date.fromordinal(inicio + azar.randrange(730))
+            hasta = desde + timedelta(days=azar.randint(0, 365))
+            esperado = {}
+            for mascota in mascotas:
+                for fecha, texto in mascota.historial_medico.cronologico():
+                    if desde.toordinal() <= fecha <= hasta.toordinal() and _coincide(texto, consulta):
+                        esperado[mascota.id] = esperado.get(mascota.id, 0) + 1
+            assert sistema.indice_diagnosticos.mascotas(consulta, desde, hasta) == esperado, consulta
+
+
+def test_fechas():
+    # Visitas entre fechas y mascotas sin visitas contra recorrer todos los
+    # historiales; fechas desordenadas para forzar el índice por mascota
+    cantidad = 5000
+    azar = random.Random(18)
+    inicio = date(2023, 1, 1).toordinal()
+    mascotas = generar_mascotas(range(1, 401))
+    for _ in range(cantidad // 2):
+        azar.choice(mascotas).agregar_diagnostico(
+            f"{date.fromordinal(inicio + azar.randrange(900)).strftime('%d/%m/%Y')} - Control")
+    
+    sistema = SistemaVeterinaria()
+    sistema.cargar_mascotas(mascotas)
+    for _ in range(cantidad // 2):
+        sistema.registrar_diagnostico(azar.choice(mascotas), "Vacuna", inicio + azar.randrange(1000), "VAC")
+    
+    for _ in range(30):
+        desde = date.fromordinal(inicio + azar.randrange(1000))
+        hasta = desde + timedelta(days=azar.randint(0, 200))
+        esperado = {}
+        for mascota in mascotas:
+            historial = mascota.historial_medico
+            for fecha, _ in historial.cronologico():
+                if desde.toordinal() <= fecha <= hasta.toordinal():
+                    esperado[mascota.id] = esperado.get(mascota.id, 0) + 1
+            dentro = [historial.registro(indice)[0] for indice in historial.entre(desde.toordinal(), hasta.toordinal())]
+            assert dentro == sorted(dentro) and len(dentro) == esperado.get(mascota.id, 0)
+        assert sistema.visitas_entre(desde, hasta) == esperado
+        
+        hoy = date.fromordinal(inicio + azar.randrange(1000))
+        meses = azar.choice((1, 6, 12))
+        pendientes = [mascota.id for mascota in sistema.pendientes_de_control(meses, hoy)]
+        corte = hoy.replace(year=hoy.year - 1) if meses == 12 and (hoy.month, hoy.day) != (2, 29) else None
+        ultimas = {mascota.id: max(fecha for fecha, _ in mascota.historial_medico.cronologico())
+                   for mascota in mascotas if not mascota.historial_medico.esta_vacia()}
+        if corte is not None:
+            assert sorted(pendientes) == sorted(i for i, fecha in ultimas.items() if fecha < corte.toordinal())
+        assert [ultimas[i] for i in pendientes] == sorted(ultimas[i] for i in pendientes)
+
+
+def test_alergias():
+    # Índice y alertas contra revisar cada ficha a mano
+    cantidad = 3000
+    azar = random.Random(20)
+    sistema = SistemaVeterinaria()
+    mascotas = mascotas_con_alergias(azar, cantidad)
+    sistema.cargar_mascotas(mascotas[:cantidad // 2])
+    for mascota in mascotas[cantidad // 2:]:
+        sistema.agregar_mascota(mascota)
+    
+    for mascota in mascotas:
+        assert mascota.alergenos == ALERGIAS_FICHA[mascota.alergias], mascota.alergias
+    # Por sinónimo ("amoxicilina" es una penicilina) o en otra forma ("Látex")
+    for consulta, alergeno in (("penicilina", "penicilina"), ("amoxicilina", "penicilina"), ("Látex", "latex"),
+                               ("vacunas", "vacuna"), ("pulgas", "pulgas"), ("ninguna", None)):
+        esperado = [m.id for m in mascotas if alergeno in ALERGIAS_FICHA[m.alergias]]
+        assert sistema.indice_alergenos.buscar(consulta) == esperado, consulta
+    
+    selecciones = ["CON", "CIR", "VAC+BAN", "RAY+HOS", "DES", "CIR+VAC+RAY"]
+    diagnosticos = ["Control de rutina", "Otitis, se indica amoxicilina", "Sutura con látex", ""]
+    for mascota in azar.sample(mascotas, 300):
+        seleccion = azar.choice(selecciones)
+        diagnostico = azar.choice(diagnosticos)
+        servicios, _ = cotizar(seleccion)
+        alergenos = ALERGIAS_FICHA[mascota.alergias]
+        esperado = [(alergeno, servicio["codigo"]) for servicio in servicios
+                    for alergeno in sorted(alergenos & ALERGENOS_SERVICIO.get(servicio["codigo"], set()))]
+        mencionados = {"Otitis, se indica amoxicilina": {"penicilina"}, "Sutura con látex": {"latex"}}
+        esperado += [(alergeno, "diagnostico") for alergeno in sorted(alergenos & mencionados.get(diagnostico, set()))]
+        assert sistema.alertas_alergia(mascota, servicios, diagnostico) == esperado
+    
+    # Con una ficha alérgica a la penicilina, una cirugía siempre avisa
+    luna = sistema.alta_mascota(cantidad + 1, "Luna", "Siamés", "Alergia a la penicilina", "María", "0987")
+    assert ("penicilina", "CIR") in sistema.alertas_alergia(luna, cotizar("CIR")[0])
+
+
+def test_inicio_rapido(tmp_path):
+    # Carga diferida contra carga completa, con altas y diagnósticos nuevos
+    # antes de que se construya ningún índice
+    cantidad = 2000
+    carpeta = str(tmp_path)
+    crear_almacen(carpeta, cantidad, 3)
+    completo = SistemaVeterinaria(almacen=AlmacenPacientes(carpeta, sincronizar=False))
+    completo.cargar_desde_almacen()
+    completo.almacen.cerrar()
+    
+    rapido = SistemaVeterinaria(almacen=AlmacenPacientes(carpeta, sincronizar=False))
+    rapido.cargar_desde_almacen(diferido=True)
+    assert all(type(mascota._historial) is list for mascota in rapido.base_datos)
+    
+    for sistema in (completo, rapido):
+        sistema.almacen = None
+        sistema.alta_mascota(cantidad + 1, "Nueva", "Mestizo", "Alergia a la penicilina", "Dueño nuevo", "0911")
+        sistema.registrar_diagnostico(sistema.obtener_mascota(7), "Fractura de pata", date(2025, 6, 1).toordinal())
+        sistema.registrar_diagnostico(sistema.obtener_mascota(cantidad + 1), "Otitis", date(2025, 6, 2).toordinal())
+    
+    # Consultar un historial no construye nada más
+    assert rapido.consultar_historial(7)[1] == completo.consultar_historial(7)[1]
+    assert type(rapido.base_datos.buscar(8)._historial) is list
+    
+    assert [m.id for m in rapido.indice_dueno.buscar_prefijo("dueño 1", 50)] == \
+           [m.id for m in completo.indice_dueno.buscar_prefijo("dueño 1", 50)]
+    assert rapido.indice_alergenos.buscar("penicilina") == completo.indice_alergenos.buscar("penicilina")
+    for consulta in ("control", "fractura OR otitis", "vacuna antirrábica"):
+        assert rapido.indice_diagnosticos.mascotas(consulta) == completo.indice_diagnosticos.mascotas(consulta)
+    desde, hasta = date(2023, 6, 1), date(2024, 6, 1)
+    assert rapido.visitas_entre(desde, hasta) == completo.visitas_entre(desde, hasta)
+    hoy = date(2025, 3, 1)
+    assert [m.id for m in rapido.pendientes_de_control(12, hoy)] == \
+           [m.id for m in completo.pendientes_de_control(12, hoy)]
+    assert not isinstance(rapido.indice_diagnosticos, IndiceDiferido)
+    assert [m.filas_historial() for m in rapido.base_datos] == [m.filas_historial() for m in completo.base_datos]
+
+
+def test_metricas():
+    # Apagadas, las clases vuelven a tener exactamente sus métodos originales
+    cantidad = 2000
+    originales = (ArbolBinario.buscar, ArbolAVL.insertar, Cola.encolar, ColaPrioridad.desencolar,
+                  SistemaVeterinaria.atender_siguiente)
+    metricas.reiniciar()
+    metricas.activar()
+    try:
+        sistema = SistemaVeterinaria(balanceado=False)
+        # Altas una por una: la carga masiva lo dejaría balanceado
+        for mascota in generar_mascotas(range(1, cantidad + 1)):
+            sistema.agregar_mascota(mascota)
+        metricas.METRICAS.comparaciones.clear()
+        for id_mascota in (1, cantidad // 2, cantidad, cantidad + 1):
+            sistema.base_datos.buscar(id_mascota)
+        # Árbol degenerado: buscar el ID n recorre n nodos; el ausente, todos
+        assert metricas.METRICAS.comparaciones == {1: 1, cantidad // 2: 1, cantidad: 2}
+        
+        for id_mascota in range(1, 11):
+            sistema.registrar_llegada(id_mascota)
+        sistema.sala_espera.retirar(5)
+        for _ in range(9):
+            sistema.atender_siguiente("Control", "CON")
+        datos = metricas.instantanea(sistema)
+    finally:
+        metricas.desactivar()
+    
+    assert datos["sala_espera"]["espera_s"]["cantidad"] == 9
+    assert datos["acciones_us"]["atender_siguiente"]["cantidad"] == 9
+    assert datos["acciones_us"]["llamar_siguiente"]["cantidad"] == 9
+    assert datos["acciones_us"]["registrar_llegada"]["cantidad"] == 10
+    assert datos["arbol"]["altura"] == cantidad and datos["arbol"]["altura_minima"] == cantidad.bit_length()
+    assert (ArbolBinario.buscar, ArbolAVL.insertar, Cola.encolar, ColaPrioridad.desencolar,
+            SistemaVeterinaria.atender_siguiente) == originales
+    json.dumps(datos)
+    assert "MÉTRICAS DE RENDIMIENTO" in metricas.texto(sistema)
+    metricas.reiniciar()
+
+
+def test_metricas_con_hilos():
+    # Sala FIFO de dos candados y acciones de SistemaConcurrente: ninguna
+    # medición se pierde con varios hilos y ninguna se cuenta dos veces
+    originales = (ColaDosCandados.encolar, SistemaConcurrente.llamar_siguiente, SistemaConcurrente.reservar_cita)
+    sistema = SistemaConcurrente(politica_espera="fifo")
+    sistema.cargar_mascotas(generar_mascotas(range(1, 8001)))
+    sistema.agregar_veterinario("A")
+    hoy = date(2025, 6, 2).toordinal()
+    metricas.reiniciar()
+    metricas.activar()
+    
+    def consultorio(numero):
+        for id_mascota in range(numero * 1000 + 1, numero * 1000 + 1001):
+            sistema.registrar_llegada(id_mascota)
+            sistema.obtener_mascota(id_mascota)
+            sistema.llamar_siguiente()
+        sistema.reservar_cita(numero + 1, "A", momento_de(hoy, numero))
+    
+    try:
+        hilos = [threading.Thread(target=consultorio, args=(numero,)) for numero in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        datos = metricas.instantanea(sistema)
+    finally:
+        metricas.desactivar()
+        metricas.reiniciar()
+    
+    acciones = datos["acciones_us"]
+    assert acciones["registrar_llegada"]["cantidad"] == acciones["llamar_siguiente"]["cantidad"] == 8000
+    # reservar_cita también busca la mascota
+    assert acciones["obtener_mascota"]["cantidad"] == 16008 and acciones["reservar_cita"]["cantidad"] == 8
+    assert datos["sala_espera"]["espera_s"]["cantidad"] == 8000
+    assert datos["arbol"]["comparaciones_por_busqueda"]["busquedas"] == 16008
+    assert (ColaDosCandados.encolar, SistemaConcurrente.llamar_siguiente,
+            SistemaConcurrente.reservar_cita) == originales
+
+def _fichas(sistema):
+    return [(m.id, m.nombre, m.raza, m.alergias, m.nombre_dueno, m.celular, m.historial_medico.registros())
+            for m in sistema.base_datos]
+
+
+def test_migracion(tmp_path):
+    cantidad = 3000
+    azar = random.Random(23)
+    sistema = sistema_con_historiales(cantidad, azar)
+    # Un historial ya abierto y uno en el formato anterior
+    sistema.registrar_diagnostico(sistema.obtener_mascota(1), "Texto con \"comillas\", comas y\nsalto", dia_actual())
+    sistema.obtener_mascota(2).cargar_historial(["15/09/2023 - Vacuna antirrábica"])
+    esperado = _fichas(sistema)
+    
+    carpeta = str(tmp_path)
+    for nombre, procesos in (("fichas.jsonl", 0), ("fichas.jsonl", 2), ("fichas.csv", 0)):
+        ruta = os.path.join(carpeta, nombre)
+        migracion.exportar(sistema, ruta)
+        copia = SistemaVeterinaria()
+        informe = migracion.importar(copia, ruta, procesos=procesos)
+        assert informe.rechazadas == 0 and informe.importadas == cantidad, informe.como_dict()
+        assert _fichas(copia) == esperado, nombre
+        assert copia.indice_diagnosticos.mascotas("comillas") == {1: 1}
+        
+        # Reimportar: todo repetido, nada se duplica (tampoco los diagnósticos del CSV aparte)
+        informe = migracion.importar(copia, ruta)
+        assert informe.importadas == 0 and informe.diagnosticos == 0
+        assert _fichas(copia) == esperado
+    
+    ruta = os.path.join(carpeta, "errores.jsonl")
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        archivo.write('{"id": 5, "nombre": "A"}\n{"id": 5, "nombre": "B"}\n{"nombre": "C"}\n'
+                      'no es json\n{"id": 6, "historial": [["31/02/2024", "x"]]}\n{"id": "7", "nombre": "D"}\n')
+    copia = SistemaVeterinaria()
+    informe = migracion.importar(copia, ruta)
+    assert informe.importadas == 2 and informe.rechazadas == 4, informe.como_dict()
+    assert copia.obtener_mascota(5).nombre == "A" and copia.obtener_mascota(7).nombre == "D"
+    assert sorted(linea for linea, _ in informe.errores if isinstance(linea, int)) == [3, 4, 5]
+
+
+def _primer_libre_ingenuo(ocupados, nombres, turnos, dia, desde_turno):
+    # Recorre turno por turno: referencia para comparar con Agenda.primer_libre
+    for d in range(dia, dia + DIAS_BUSQUEDA + 1):
+        for turno in range(desde_turno if d == dia else 0, TURNOS_POR_DIA - turnos + 1):
+            for nombre, dias_laborables in nombres:
+                if dia_semana(d) in dias_laborables and not any(
+                        t in ocupados.get((nombre, d), ()) for t in range(turno, turno + turnos)):
+                    return nombre, d, turno
+    return None
+
+
+def test_agenda():
+    cantidad = 3000
+    azar = random.Random(25)
+    sistema = SistemaVeterinaria()
+    sistema.cargar_mascotas(generar_mascotas(range(1, 101)))
+    nombres = [("Dra. Rojas", DIAS_LABORABLES), ("Dr. Salas", range(5)), ("Dra. Vega", (5, 6))]
+    for nombre, dias in nombres:
+        sistema.agregar_veterinario(nombre, dias)
+    
+    # Modelo de referencia: (veterinario, día) -> turnos ocupados
+    ocupados = {}
+    reservadas = {}
+    hoy = date(2025, 6, 2).toordinal()
+    for _ in range(cantidad):
+        nombre, dias = azar.choice(nombres)
+        dia = hoy + azar.randrange(20)
+        turnos = azar.randint(1, 4)
+        turno = azar.randrange(TURNOS_POR_DIA - turnos + 1)
+        pedidos = set(range(turno, turno + turnos))
+        libre = dia_semana(dia) in dias and not pedidos & ocupados.get((nombre, dia), set())
+        try:
+            cita = sistema.reservar_cita(azar.randint(1, 100), nombre, momento_de(dia, turno), turnos)
+        except ErrorVeterinaria:
+            assert not libre
+        else:
+            assert libre
+            ocupados.setdefault((nombre, dia), set()).update(pedidos)
+            reservadas[cita.numero] = cita
+        
+        # Cancelar libera exactamente sus turnos
+        if reservadas and azar.random() < 0.2:
+            cita = reservadas.pop(azar.choice(list(reservadas)))
+            sistema.cancelar_cita(cita.numero)
+            ocupados[(cita.veterinario, cita.dia)] -= set(range(cita.turno, cita.turno + cita.turnos))
+    
+    for _ in range(300):
+        turnos = azar.randint(1, 8)
+        dia = hoy + azar.randrange(-2, 22)
+        desde_turno = azar.randrange(TURNOS_POR_DIA)
+        elegidos = [azar.choice(nombres)] if azar.random() < 0.3 else nombres
+        esperado = _primer_libre_ingenuo(ocupados, elegidos, turnos, dia, desde_turno)
+        nombre = elegidos[0][0] if len(elegidos) == 1 else None
+        assert sistema.agenda.primer_libre(turnos, dia, desde_turno, nombre) == esperado, (turnos, dia, desde_turno)
+    
+    # Al llegar la hora, las citas pasan a la sala de espera una sola vez
+    ahora = momento_de(hoy + 3, 10)
+    esperadas = sorted(numero for numero, cita in reservadas.items() if (cita.dia, cita.turno) <= (hoy + 3, 10))
+    encoladas = sistema.encolar_citas(ahora)
+    assert sorted(cita.numero for cita in encoladas) == esperadas
+    assert all(cita.estado == "en_sala" and sistema.sala_espera.contiene(cita.mascota.id) for cita in encoladas)
+    assert sistema.encolar_citas(ahora) == []
+
+
+def test_agenda_concurrente():
+    # Reservas desde varios hilos: ningún turno queda tomado dos veces
+    sistema = SistemaConcurrente()
+    sistema.cargar_mascotas(generar_mascotas(range(1, 201)))
+    for nombre in ("A", "B", "C"):
+        sistema.agregar_veterinario(nombre)
+    hoy = date(2025, 6, 2).toordinal()
+    citas = []
+    
+    def reservar(semilla):
+        azar = random.Random(semilla)
+        for _ in range(2000):
+            turnos = azar.randint(1, 2)
+            inicio = momento_de(hoy + azar.randrange(6), azar.randrange(TURNOS_POR_DIA - turnos + 1))
+            try:
+                citas.append(sistema.reservar_cita(azar.randint(1, 200), azar.choice("ABC"), inicio, turnos))
+            except ErrorVeterinaria:
+                pass
+    
+    hilos = [threading.Thread(target=reservar, args=(semilla,)) for semilla in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    ocupados = Counter((cita.veterinario, cita.dia, turno) for cita in citas
+                       for turno in range(cita.turno, cita.turno + cita.turnos))
+    assert max(ocupados.values()) == 1
+    assert len(sistema.encolar_citas(momento_de(hoy + 6, 0))) == len(citas)
+
+
+def test_modo_lote_rechaza_ids_y_sigue(monkeypatch):
+    # Un ID de otro tipo no llega al árbol y un error inesperado no corta el lote
+    monkeypatch.setitem(modo_lote.OPERACIONES, "explotar", lambda sistema, comando: [][0])
+    comandos = ['{"op": "registrar", "id": "7", "nombre": "Max"}', '{"op": "registrar", "id": true}',
+                '{"op": "registrar", "id": 1.5}', '{"op": "historial", "id": 7, "pagina": 0}',
+                '{"op": "explotar"}', '{"op": "registrar", "id": 8}', '{"op": "ficha", "id": 7}']
+    sistema = SistemaVeterinaria()
+    salida = io.StringIO()
+    assert modo_lote.ejecutar_lote(sistema, io.StringIO("\n".join(comandos)), salida) == len(comandos)
+    
+    resultados = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+    assert [resultado["ok"] for resultado in resultados] == [True, False, False, False, False, True, True]
+    assert "IndexError" in resultados[4]["error"]
+    assert [mascota.id for mascota in sistema.base_datos] == [7, 8]
+
+
+def test_modo_lote_no_deja_cambios_a_medias(tmp_path):
+    # Un campo que no es texto se rechaza antes de tocar el árbol, el
+    # historial, la sala o el registro: reintentar con datos buenos funciona
+    carpeta = str(tmp_path)
+    sistema = SistemaVeterinaria(almacen=AlmacenPacientes(carpeta))
+    sistema.cargar_desde_almacen()
+    comandos = ['{"op": "registrar", "id": 9, "nombre_dueno": 5}', '{"op": "registrar", "id": 9, "celular": 123}',
+                '{"op": "registrar", "id": 9, "nombre": "Max", "nombre_dueno": "Ana", "celular": "0991"}',
+                '{"op": "diagnosticar", "id": 9, "diagnostico": 5}', '{"op": "llegada", "id": 9, "prioridad": true}',
+                '{"op": "llegada", "id": 9}', '{"op": "atender", "diagnostico": 5}', '{"op": "ficha", "id": 9}']
+    salida = io.StringIO()
+    modo_lote.ejecutar_lote(sistema, io.StringIO("\n".join(comandos)), salida)
+    
+    resultados = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+    assert [resultado["ok"] for resultado in resultados] == [False, False, True, False, False, True, False, True]
+    assert resultados[-1]["diagnosticos"] == 0 and len(sistema.facturacion) == 0
+    assert sistema.sala_espera.posicion(9) == 1
+    assert [m.id for m in sistema.indice_dueno.buscar_prefijo("an")] == [9]
+    assert [m.id for m in sistema.indice_celular.buscar_exacto("0991")] == [9]
+    
+    # Sin pasar por la validación del lote, el alta tampoco deja la mascota en el árbol
+    with pytest.raises((AttributeError, TypeError)):
+        sistema.agregar_mascota(Mascota(10, "Luna", "Siamés", "Ninguna", "María", 123))
+    assert sistema.base_datos.buscar(10) is None
+    sistema.almacen.cerrar()
+    assert [fila[0] for fila in AlmacenPacientes(carpeta).cargar()] == [9]
+
+def test_servidor_responde_500(monkeypatch):
+    servidor = servidor_http.ServidorVeterinaria(SistemaVeterinaria())
+    monkeypatch.setitem(modo_lote.OPERACIONES, "ficha", lambda sistema, comando: [][0])
+    
+    async def consultar():
+        return (await servidor.procesar("POST", "/mascotas", b'{"id": "3"}'),
+                await servidor.procesar("GET", "/mascotas/3/historial?pagina=0", b""),
+                await servidor.procesar("GET", "/mascotas/3", b""))
+    
+    alta, pagina, ficha = asyncio.run(consultar())
+    assert alta == (200, {"ok": True, "id": 3})
+    assert pagina[0] == 422 and ficha[0] == 500
+
+
+class _EscritorFalso:
+    def __init__(self):
+        self.datos = b""
+    
+    def write(self, datos):
+        self.datos += datos
+    
+    async def drain(self):
+        pass
+    
+    def close(self):
+        pass
+
+
+def test_servidor_rechaza_lineas_largas():
+    # Una línea de solicitud o una cabecera más larga que el límite del
+    # lector responde 400 / 431 en lugar de un 500
+    servidor = servidor_http.ServidorVeterinaria(SistemaVeterinaria())
+    
+    async def enviar(datos):
+        lector = asyncio.StreamReader()
+        lector.feed_data(datos)
+        lector.feed_eof()
+        escritor = _EscritorFalso()
+        await servidor.atender_conexion(lector, escritor)
+        return escritor.datos.split(b"\r\n", 1)[0]
+    
+    largo = b"a" * (1 << 17)
+    assert asyncio.run(enviar(b"GET /" + largo + b" HTTP/1.1\r\n\r\n")) == b"HTTP/1.1 400 Bad Request"
+    assert (asyncio.run(enviar(b"GET /metricas HTTP/1.1\r\nX-Largo: " + largo + b"\r\n\r\n"))
+            == b"HTTP/1.1 431 Request Header Fields Too Large")
+    assert asyncio.run(enviar(b"GET /metricas HTTP/1.1\r\nConnection: close\r\n\r\n")) == b"HTTP/1.1 200 OK"
+
+def test_servidor_valida_parametros_y_cuerpo():
+    # Los parámetros de texto quedan como texto aunque sean dígitos, y un
+    # cuerpo con un campo inválido no deja la mascota a medias
+    sistema = SistemaVeterinaria()
+    servidor = servidor_http.ServidorVeterinaria(sistema)
+    
+    async def consultar(*solicitudes):
+        return [await servidor.procesar(metodo, destino, cuerpo) for metodo, destino, cuerpo in solicitudes]
+    
+    respuestas = asyncio.run(consultar(
+        ("POST", "/veterinarios", b'{"nombre": "123"}'),
+        ("GET", "/citas/libre?turnos=2&veterinario=123&desde=2025-06-02T09:00", b""),
+        ("GET", "/mascotas/1/historial?pagina=uno", b""),
+        ("POST", "/mascotas", b'{"id": 9, "nombre_dueno": 5}'),
+        ("POST", "/mascotas", b'{"id": 9, "nombre": "Max"}'),
+        ("POST", "/mascotas/9/diagnosticos", b'{"diagnostico": 5}'),
+        ("GET", "/mascotas/9", b""),
+    ))
+    assert [estado for estado, _ in respuestas] == [200, 200, 400, 400, 200, 400, 200]
+    assert respuestas[1][1]["veterinario"] == "123" and respuestas[1][1]["inicio"] == "2025-06-02T09:00"
+    assert respuestas[-1][1]["diagnosticos"] == 0
@@ -1,19 +1,154 @@
 # Sistema de Gestión - Clínica Veterinaria "Pet Market"
 # Proyecto Final - Estructuras de Datos
 
+import gc
+import re
+import sys
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from heapq import heappop, heappush
+from itertools import islice
+
 # Ancho fijo para todos los cuadros
 ANCHO = 60
 
+# Filas por página en los listados largos
+TAMANIO_PAGINA = 20
+
+# Bordes precalculados: cada pantalla se arma en memoria y se escribe de una vez
+MARGEN = " " * 4
+BORDE_SUPERIOR = f"{MARGEN}╔{'═' * ANCHO}╗"
+BORDE_SEPARADOR = f"{MARGEN}╠{'═' * ANCHO}╣"
+BORDE_INFERIOR = f"{MARGEN}╚{'═' * ANCHO}╝"
+LINEA_VACIA = f"{MARGEN}║{' ' * ANCHO}║"
+LINEA_DOBLE = MARGEN + "═" * ANCHO
+FORMATO_FILA = MARGEN + "║ {:<%d} ║" % (ANCHO - 2)
+
+# Sin paginación, los listados se escriben en bloques de este tamaño
+LINEAS_POR_ESCRITURA = 1000
+
+
+def escribir(texto):
+    sys.stdout.write(texto)
+    sys.stdout.flush()
+
+
+def fila_cuadro(texto):
+    return FORMATO_FILA.format(texto)
+
+
+def cabecera_cuadro(titulo):
+    return f"{BORDE_SUPERIOR}\n{MARGEN}║{titulo.center(ANCHO)}║\n{BORDE_SEPARADOR}\n"
+
+
+def pie_cuadro(*notas):
+    return BORDE_INFERIOR + "\n" + "".join(f"{MARGEN}{nota}\n" for nota in notas)
+
+
+def mostrar_encabezado(titulo):
+    escribir(f"\n{LINEA_DOBLE}\n{titulo.center(ANCHO + 4)}\n{LINEA_DOBLE}\n")
+
+
+class Cuadro:
+    # Acumula las líneas de un cuadro y las escribe con una sola llamada
+    
+    def __init__(self, titulo=None, separado=False):
+        self.lineas = ["", BORDE_SUPERIOR] if separado else [BORDE_SUPERIOR]
+        if titulo is not None:
+            self.centrado(titulo)
+            self.lineas.append(BORDE_SEPARADOR)
+    
+    def centrado(self, texto):
+        self.lineas.append(f"{MARGEN}║{texto.center(ANCHO)}║")
+    
+    def vacia(self):
+        self.lineas.append(LINEA_VACIA)
+    
+    def separador(self):
+        self.lineas.append(BORDE_SEPARADOR)
+    
+    def fila(self, texto):
+        self.lineas.append(FORMATO_FILA.format(texto))
+    
+    def campo(self, etiqueta, valor, ancho_etiqueta=18):
+        self.lineas.append(f"{MARGEN}║ {etiqueta:<{ancho_etiqueta}} {valor:<{ANCHO - ancho_etiqueta - 3}} ║")
+    
+    def texto(self, *notas):
+        return "\n".join(self.lineas) + "\n" + pie_cuadro(*notas)
+    
+    def mostrar(self, *notas):
+        escribir(self.texto(*notas))
+
+
+def mostrar_paginado(lineas, tamanio_pagina=None, total=None):
+    # Escribe un bloque por página; con tamanio_pagina pregunta antes de seguir.
+    # Devuelve cuántas líneas se mostraron.
+    lineas = iter(lineas)
+    bloque = tamanio_pagina or LINEAS_POR_ESCRITURA
+    mostradas = 0
+    
+    while True:
+        pagina = list(islice(lineas, bloque))
+        if not pagina:
+            return mostradas
+        
+        escribir("\n".join(pagina) + "\n")
+        mostradas += len(pagina)
+        
+        if tamanio_pagina and len(pagina) == bloque and (total is None or mostradas < total):
+            progreso = f"{mostradas}/{total}" if total is not None else str(mostradas)
+            respuesta = input(f"{MARGEN}-- {progreso} -- ENTER para continuar, 'q' para terminar: ")
+            if respuesta.strip().lower() == "q":
+                return mostradas
+
 
-class Nodo:
+# Cada estructura usa su propio tipo de nodo con __slots__: las pilas y colas
+# solo necesitan el enlace "siguiente" y el árbol solo los hijos.
+class NodoLista:
+    __slots__ = ("dato", "siguiente")
+    
     def __init__(self, dato):
         self.dato = dato
         self.siguiente = None
+
+
+class NodoCola(NodoLista):
+    # La sala de espera necesita el enlace hacia atrás para cancelar en O(1)
+    # y el turno de llegada para calcular posiciones sin recorrer la cola.
+    __slots__ = ("anterior", "turno")
+    
+    def __init__(self, dato, turno):
+        super().__init__(dato)
+        self.anterior = None
+        self.turno = turno
+
+
+class NodoArbol:
+    __slots__ = ("dato", "izquierdo", "derecho")
+    
+    def __init__(self, dato):
+        self.dato = dato
         self.izquierdo = None
         self.derecho = None
 
 
+class NodoAVL(NodoArbol):
+    __slots__ = ("altura",)
+    
+    def __init__(self, dato):
+        super().__init__(dato)
+        self.altura = 1
+
+
 class Pila:
+    __slots__ = ("tope", "tamanio")
+    
     def __init__(self):
         self.tope = None
         self.tamanio = 0
@@ -22,7 +157,7 @@ class Pila:
         return self.tope is None
     
     def apilar(self, dato):
-        nuevo_nodo = Nodo(dato)
+        nuevo_nodo = NodoLista(dato)
         nuevo_nodo.siguiente = self.tope
         self.tope = nuevo_nodo
         self.tamanio += 1
@@ -41,112 +176,592 @@ class Pila:
             return None
         return self.tope.dato
     
+    def __iter__(self):
+        # Del más reciente al más antiguo
+        actual = self.tope
+        while actual is not None:
+            yield actual.dato
+            actual = actual.siguiente
+    
     def mostrar_historial(self):
         if self.esta_vacia():
-            print("    No hay registros en el historial.")
+            escribir("    No hay registros en el historial.\n")
             return
         
-        actual = self.tope
-        numero_registro = 1
+        cuadro = Cuadro("HISTORIAL MÉDICO COMPLETO")
         
-        print(f"    ╔{'═' * ANCHO}╗")
-        print(f"    ║{'HISTORIAL MÉDICO COMPLETO'.center(ANCHO)}║")
-        print(f"    ╠{'═' * ANCHO}╣")
+        for numero_registro, registro in enumerate(self, 1):
+            if numero_registro == 1:
+                cuadro.fila(f"> [{numero_registro}] {registro}")
+                cuadro.fila("(Más reciente)")
+            else:
+                cuadro.fila(f"  [{numero_registro}] {registro}")
         
-        while actual is not None:
+        cuadro.mostrar(f"Total de registros: {self.tamanio}")
+
+
+# Cada diagnóstico se guarda estructurado: fecha como ordinal del día
+# (date.toordinal, 4 bytes; 0 = sin fecha), texto y código de servicio
+# opcional. El formato "dd/mm/aaaa - texto" solo se arma para mostrarlo y se
+# sigue aceptando al cargar datos viejos.
+PATRON_FECHA = re.compile(r"\d{2}/\d{2}/\d{4} - ")
+_ORDINALES_FECHA = {"": 0}
+_TEXTOS_FECHA = {0: ""}
+_TABLA_SERVICIOS = [""]
+_CODIGOS_SERVICIO = {"": 0}
+
+
+def ordinal_fecha(fecha):
+    # "dd/mm/aaaa" -> ordinal del día, 0 si no es una fecha válida
+    ordinal = _ORDINALES_FECHA.get(fecha)
+    if ordinal is None:
+        try:
+            ordinal = datetime.strptime(fecha, "%d/%m/%Y").toordinal()
+        except ValueError:
+            ordinal = 0
+        _ORDINALES_FECHA[fecha] = ordinal
+    return ordinal
+
+
+def texto_fecha(ordinal):
+    texto = _TEXTOS_FECHA.get(ordinal)
+    if texto is None:
+        texto = _TEXTOS_FECHA[ordinal] = date.fromordinal(ordinal).strftime("%d/%m/%Y")
+    return texto
+
+
+def separar_fecha(registro):
+    # "15/09/2024 - Vacuna" -> (ordinal, "Vacuna"); sin fecha válida -> (0, registro)
+    if PATRON_FECHA.match(registro):
+        ordinal = ordinal_fecha(registro[:10])
+        if ordinal:
+            return ordinal, registro[13:]
+    return 0, registro
+
+
+# Límites [inicio, fin) del día en curso: pedir la fecha de hoy en cada
+# atención cuesta una comparación en vez de datetime.now() + strftime
+_DIA_VIGENTE = [0.0, 0.0, 0]
+
+
+def dia_actual():
+    ahora = time.time()
+    if not _DIA_VIGENTE[0] <= ahora < _DIA_VIGENTE[1]:
+        hoy = date.fromtimestamp(ahora)
+        _DIA_VIGENTE[0] = datetime.combine(hoy, datetime.min.time()).timestamp()
+        _DIA_VIGENTE[1] = datetime.combine(hoy + timedelta(days=1), datetime.min.time()).timestamp()
+        _DIA_VIGENTE[2] = hoy.toordinal()
+    return _DIA_VIGENTE[2]
+
+
+def _codigo_servicio(servicio):
+    codigo = _CODIGOS_SERVICIO.get(servicio)
+    if codigo is None:
+        codigo = len(_TABLA_SERVICIOS)
+        _TABLA_SERVICIOS.append(servicio)
+        _CODIGOS_SERVICIO[servicio] = codigo
+    return codigo
+
+
+class HistorialMedico:
+    # Pila respaldada por arreglos: mismo apilar/desapilar/ver_tope que Pila,
+    # pero con acceso O(1) por posición (1 = más reciente) y páginas.
+    # Las fechas suelen llegar en orden, así que el arreglo de fechas ya es su
+    # propio índice (bisect); si llega una anterior se arma un índice aparte
+    # con las posiciones ordenadas por fecha, recién cuando se consulta.
+    __slots__ = ("_fechas", "_textos", "_servicios", "_orden")
+    
+    def __init__(self):
+        self._fechas = array("I")
+        self._textos = []
+        # Se crea con el primer código de servicio: la mayoría de las mascotas
+        # cargadas de datos viejos no tiene ninguno
+        self._servicios = None
+        # None = fechas en orden; False = desordenadas sin índice; array = índice
+        self._orden = None
+    
+    @property
+    def tamanio(self):
+        return len(self._textos)
+    
+    def esta_vacia(self):
+        return not self._textos
+    
+    def agregar(self, fecha, texto, servicio=""):
+        if self._orden is not None or (self._fechas and fecha < self._fechas[-1]):
+            self._orden = False
+        self._fechas.append(fecha)
+        self._textos.append(texto)
+        
+        if servicio and self._servicios is None:
+            self._servicios = array("H", [0]) * (len(self._textos) - 1)
+        if self._servicios is not None:
+            self._servicios.append(_codigo_servicio(servicio))
+    
+    def apilar(self, dato):
+        fecha, texto = separar_fecha(dato)
+        self.agregar(fecha, texto)
+    
+    @classmethod
+    def desde_filas(cls, filas):
+        # Filas del almacén: [fecha, texto, servicio] o, en datos anteriores a
+        # los registros estructurados, "dd/mm/aaaa - texto"
+        historial = cls()
+        for fila in filas:
+            if isinstance(fila, str):
+                historial.apilar(fila)
+            else:
+                historial.agregar(*fila)
+        return historial
+    
+    def _registro(self, indice):
+        fecha = self._fechas[indice]
+        texto = self._textos[indice]
+        return f"{texto_fecha(fecha)} - {texto}" if fecha else texto
+    
+    def registro(self, indice):
+        # (fecha, texto, servicio) del registro indice (0 = el más antiguo)
+        servicio = _TABLA_SERVICIOS[self._servicios[indice]] if self._servicios is not None else ""
+        return self._fechas[indice], self._textos[indice], servicio
+    
+    def desapilar(self):
+        if self.esta_vacia():
+            return None
+        
+        dato_eliminado = self._registro(-1)
+        self._fechas.pop()
+        self._textos.pop()
+        if self._servicios is not None:
+            self._servicios.pop()
+        if self._orden is not None:
+            self._orden = False
+        return dato_eliminado
+    
+    def ver_tope(self):
+        if self.esta_vacia():
+            return None
+        return self._registro(-1)
+    
+    def obtener(self, posicion):
+        if 1 <= posicion <= self.tamanio:
+            return self._registro(self.tamanio - posicion)
+        return None
+    
+    def _indice_fechas(self):
+        if self._orden is False:
+            self._orden = array("I", sorted(range(len(self._fechas)), key=self._fechas.__getitem__))
+        return self._orden
+    
+    def entre(self, desde, hasta):
+        # Índices (0 = el más antiguo) de los registros con fecha en
+        # [desde, hasta] (ordinales), ordenados por fecha
+        orden = self._indice_fechas()
+        if orden is None:
+            return range(bisect_left(self._fechas, desde), bisect_right(self._fechas, hasta))
+        clave = self._fechas.__getitem__
+        return orden[bisect_left(orden, desde, key=clave):bisect_right(orden, hasta, key=clave)]
+    
+    def ultima_fecha(self):
+        # Fecha (ordinal) de la visita más reciente, 0 si no hay
+        if self.esta_vacia():
+            return 0
+        orden = self._indice_fechas()
+        return self._fechas[-1] if orden is None else self._fechas[orden[-1]]
+    
+    def total_paginas(self, tamanio):
+        return max(1, -(-self.tamanio // tamanio))
+    
+    def pagina(self, n, tamanio):
+        # Devuelve [(posición, registro), ...] de la página n (desde 1); fuera de rango, []
+        if n < 1 or tamanio < 1:
+            return []
+        primera = (n - 1) * tamanio + 1
+        ultima = min(primera + tamanio - 1, self.tamanio)
+        return [(posicion, self._registro(self.tamanio - posicion)) for posicion in range(primera, ultima + 1)]
+    
+    def __iter__(self):
+        # Del más reciente al más antiguo
+        for indice in range(self.tamanio - 1, -1, -1):
+            yield self._registro(indice)
+    
+    def cronologico(self):
+        # Del más antiguo al más reciente: (fecha, texto)
+        return zip(self._fechas, self._textos)
+    
+    def registros(self):
+        # [fecha, texto, servicio] del más antiguo al más reciente (para guardar)
+        return [list(self.registro(indice)) for indice in range(self.tamanio)]
+    
+    def mostrar_historial(self, pagina=1, tamanio_pagina=TAMANIO_PAGINA):
+        if self.esta_vacia():
+            escribir("    No hay registros en el historial.\n")
+            return
+        
+        total_paginas = self.total_paginas(tamanio_pagina)
+        titulo = "HISTORIAL MÉDICO COMPLETO"
+        if total_paginas > 1:
+            titulo = f"HISTORIAL MÉDICO - PÁGINA {pagina}/{total_paginas}"
+        
+        cuadro = Cuadro(titulo)
+        
+        for numero_registro, registro in self.pagina(pagina, tamanio_pagina):
             if numero_registro == 1:
-                linea = f"> [{numero_registro}] {actual.dato}"
-                print(f"    ║ {linea:<{ANCHO-2}} ║")
-                print(f"    ║ {'(Más reciente)':<{ANCHO-2}} ║")
+                cuadro.fila(f"> [{numero_registro}] {registro}")
+                cuadro.fila("(Más reciente)")
             else:
-                linea = f"  [{numero_registro}] {actual.dato}"
-                print(f"    ║ {linea:<{ANCHO-2}} ║")
-            
-            actual = actual.siguiente
-            numero_registro += 1
+                cuadro.fila(f"  [{numero_registro}] {registro}")
         
-        print(f"    ╚{'═' * ANCHO}╝")
-        print(f"    Total de registros: {self.tamanio}")
+        cuadro.mostrar(f"Total de registros: {self.tamanio}")
+
+
+def filas_sala_espera(mascotas, nivel_de=None):
+    for posicion, mascota in enumerate(mascotas, 1):
+        marca = ">" if posicion == 1 else " "
+        linea = f"{marca} Posición {posicion}: {mascota.nombre} (ID: {mascota.id})"
+        if nivel_de is not None:
+            linea += f" [{nivel_de(mascota)}]"
+        yield fila_cuadro(linea)
+        if posicion == 1:
+            yield fila_cuadro("(Siguiente en ser atendido)")
 
 
 class Cola:
+    # Además de los enlaces, un diccionario ID -> nodo permite rechazar
+    # llegadas repetidas y desenlazar en O(1), y la posición sale del turno:
+    # posición = turno - turno del frente + 1 - cancelados entre ambos.
+    # Los cancelados se cuentan por turno en un árbol de Fenwick, así que
+    # cancelar y consultar la posición cuestan O(log n) y encolar y
+    # desencolar siguen en O(1). Los turnos vuelven a 0 con la sala vacía.
+    
     def __init__(self):
         self.frente = None
         self.final = None
         self.tamanio = 0
+        self.nodos = {}
+        self.siguiente_turno = 0
+        self.cancelados = ArbolFenwick()
     
     def esta_vacia(self):
         return self.frente is None
     
+    def contiene(self, id_mascota):
+        return id_mascota in self.nodos
+    
     def encolar(self, dato):
-        nuevo_nodo = Nodo(dato)
+        if dato.id in self.nodos:
+            return False
+        
+        nuevo_nodo = NodoCola(dato, self.siguiente_turno)
+        self.siguiente_turno += 1
         
         if self.esta_vacia():
             self.frente = nuevo_nodo
             self.final = nuevo_nodo
         else:
+            nuevo_nodo.anterior = self.final
             self.final.siguiente = nuevo_nodo
             self.final = nuevo_nodo
         
+        self.nodos[dato.id] = nuevo_nodo
         self.tamanio += 1
+        return True
     
     def desencolar(self):
         if self.esta_vacia():
             return None
         
-        dato_eliminado = self.frente.dato
-        self.frente = self.frente.siguiente
+        return self._desenlazar(self.frente).dato
+    
+    def retirar(self, id_mascota):
+        nodo = self.nodos.get(id_mascota)
+        if nodo is None:
+            return None
         
-        if self.frente is None:
-            self.final = None
+        if nodo is not self.frente:
+            self.cancelados.sumar(nodo.turno, 1)
+        return self._desenlazar(nodo).dato
+    
+    def _desenlazar(self, nodo):
+        if nodo.anterior is None:
+            self.frente = nodo.siguiente
+        else:
+            nodo.anterior.siguiente = nodo.siguiente
         
+        if nodo.siguiente is None:
+            self.final = nodo.anterior
+        else:
+            nodo.siguiente.anterior = nodo.anterior
+        
+        del self.nodos[nodo.dato.id]
         self.tamanio -= 1
-        return dato_eliminado
+        
+        if self.frente is None:
+            # Sala vacía: turnos y cancelados empiezan de nuevo
+            self.siguiente_turno = 0
+            self.cancelados = ArbolFenwick()
+        
+        return nodo
+    
+    def posicion(self, id_mascota):
+        nodo = self.nodos.get(id_mascota)
+        if nodo is None:
+            return None
+        
+        cancelados = self.cancelados
+        turno_frente = self.frente.turno
+        return nodo.turno - turno_frente + 1 - (cancelados.antes_de(nodo.turno) - cancelados.antes_de(turno_frente))
     
     def ver_frente(self):
         if self.esta_vacia():
             return None
         return self.frente.dato
     
-    def mostrar_sala_espera(self):
+    def __iter__(self):
+        actual = self.frente
+        while actual is not None:
+            yield actual.dato
+            actual = actual.siguiente
+    
+    def mostrar_sala_espera(self, tamanio_pagina=None):
         if self.esta_vacia():
-            print("    La sala de espera está vacía.")
+            escribir("    La sala de espera está vacía.\n")
             return
         
-        actual = self.frente
-        posicion = 1
+        escribir(cabecera_cuadro("SALA DE ESPERA"))
+        mostrar_paginado(filas_sala_espera(self), tamanio_pagina, total=self.tamanio + 1)
+        escribir(pie_cuadro(f"Total de pacientes en espera: {self.tamanio}"))
+
+
+# Niveles de triaje: número menor = se atiende antes
+PRIORIDAD_EMERGENCIA = 1
+PRIORIDAD_URGENTE = 2
+PRIORIDAD_NORMAL = 3
+NOMBRES_PRIORIDAD = {
+    PRIORIDAD_EMERGENCIA: "Emergencia",
+    PRIORIDAD_URGENTE: "Urgente",
+    PRIORIDAD_NORMAL: "Normal",
+}
+
+
+class ArbolFenwick:
+    # Conteos por turno con suma de prefijos en O(log n). Crece duplicando
+    # su capacidad y se reconstruye en O(n) a partir de los valores crudos.
+    __slots__ = ("valores", "arbol")
+    
+    def __init__(self):
+        self.valores = array("i", [0] * 64)
+        self.arbol = array("i", [0] * 65)
+    
+    def _crecer(self, minimo):
+        capacidad = len(self.valores)
+        while capacidad <= minimo:
+            capacidad *= 2
+        self.valores.extend([0] * (capacidad - len(self.valores)))
+        self.arbol = array("i", [0]) + self.valores
+        for i in range(1, capacidad + 1):
+            padre = i + (i & -i)
+            if padre <= capacidad:
+                self.arbol[padre] += self.arbol[i]
+    
+    def sumar(self, indice, valor):
+        if indice >= len(self.valores):
+            self._crecer(indice)
+        self.valores[indice] += valor
+        i = indice + 1
+        arbol = self.arbol
+        while i < len(arbol):
+            arbol[i] += valor
+            i += i & -i
+    
+    def antes_de(self, indice):
+        # Suma de los valores con índice menor que "indice"
+        i = min(indice, len(self.valores))
+        total = 0
+        arbol = self.arbol
+        while i > 0:
+            total += arbol[i]
+            i -= i & -i
+        return total
+
+
+class ColaPrioridad:
+    # Montículo binario mínimo de entradas [prioridad, turno, mascota].
+    # El turno (orden de llegada) desempata, así que dentro de un mismo
+    # nivel se respeta el orden FIFO. Un diccionario ID -> posición en el
+    # montículo permite cambiar la prioridad o retirar a una mascota en O(log n),
+    # y un árbol de Fenwick por nivel responde la posición de cada mascota.
+    
+    def __init__(self):
+        self.monticulo = []
+        self.posiciones = {}
+        self.siguiente_turno = 0
+        self.por_nivel = {}
+        self.cantidad_por_nivel = {}
+    
+    def _contar(self, prioridad, turno, valor):
+        if prioridad not in self.por_nivel:
+            self.por_nivel[prioridad] = ArbolFenwick()
+            self.cantidad_por_nivel[prioridad] = 0
+        self.por_nivel[prioridad].sumar(turno, valor)
+        self.cantidad_por_nivel[prioridad] += valor
+    
+    @property
+    def tamanio(self):
+        return len(self.monticulo)
+    
+    def esta_vacia(self):
+        return not self.monticulo
+    
+    def contiene(self, id_mascota):
+        return id_mascota in self.posiciones
+    
+    def encolar(self, dato, prioridad=PRIORIDAD_NORMAL):
+        if dato.id in self.posiciones:
+            return False
         
-        print(f"    ╔{'═' * ANCHO}╗")
-        print(f"    ║{'SALA DE ESPERA'.center(ANCHO)}║")
-        print(f"    ╠{'═' * ANCHO}╣")
+        self.monticulo.append([prioridad, self.siguiente_turno, dato])
+        self._contar(prioridad, self.siguiente_turno, 1)
+        self.siguiente_turno += 1
+        self.posiciones[dato.id] = len(self.monticulo) - 1
+        self._subir(len(self.monticulo) - 1)
+        return True
+    
+    def desencolar(self):
+        if self.esta_vacia():
+            return None
+        return self._quitar_en(0)[2]
+    
+    def ver_frente(self):
+        if self.esta_vacia():
+            return None
+        return self.monticulo[0][2]
+    
+    def prioridad_de(self, id_mascota):
+        posicion = self.posiciones.get(id_mascota)
+        if posicion is None:
+            return None
+        return self.monticulo[posicion][0]
+    
+    def cambiar_prioridad(self, id_mascota, prioridad):
+        posicion = self.posiciones.get(id_mascota)
+        if posicion is None:
+            return False
         
-        while actual is not None:
-            mascota = actual.dato
-            if posicion == 1:
-                linea = f"> Posición {posicion}: {mascota.nombre} (ID: {mascota.id})"
-                print(f"    ║ {linea:<{ANCHO-2}} ║")
-                print(f"    ║ {'(Siguiente en ser atendido)':<{ANCHO-2}} ║")
-            else:
-                linea = f"  Posición {posicion}: {mascota.nombre} (ID: {mascota.id})"
-                print(f"    ║ {linea:<{ANCHO-2}} ║")
-            
-            actual = actual.siguiente
-            posicion += 1
+        entrada = self.monticulo[posicion]
+        anterior = entrada[0]
+        self._contar(anterior, entrada[1], -1)
+        self._contar(prioridad, entrada[1], 1)
+        entrada[0] = prioridad
+        if prioridad < anterior:
+            self._subir(posicion)
+        else:
+            self._bajar(posicion)
+        return True
+    
+    def retirar(self, id_mascota):
+        posicion = self.posiciones.get(id_mascota)
+        if posicion is None:
+            return None
+        return self._quitar_en(posicion)[2]
+    
+    def posicion(self, id_mascota):
+        # Todos los de niveles más urgentes + los del mismo nivel que llegaron antes
+        posicion = self.posiciones.get(id_mascota)
+        if posicion is None:
+            return None
+        
+        prioridad, turno = self.monticulo[posicion][:2]
+        delante = self.por_nivel[prioridad].antes_de(turno)
+        for nivel, cantidad in self.cantidad_por_nivel.items():
+            if nivel < prioridad:
+                delante += cantidad
+        return delante + 1
+    
+    def en_orden(self):
+        return [entrada[2] for entrada in sorted(self.monticulo, key=lambda entrada: entrada[:2])]
+    
+    def _quitar_en(self, posicion):
+        entrada = self.monticulo[posicion]
+        ultima = self.monticulo.pop()
+        del self.posiciones[entrada[2].id]
+        self._contar(entrada[0], entrada[1], -1)
+        
+        if posicion < len(self.monticulo):
+            self.monticulo[posicion] = ultima
+            self.posiciones[ultima[2].id] = posicion
+            self._subir(posicion)
+            self._bajar(self.posiciones[ultima[2].id])
+        elif not self.monticulo:
+            # Sala vacía: se reinician los turnos para que los contadores no crezcan sin límite
+            self.siguiente_turno = 0
+            self.por_nivel.clear()
+            self.cantidad_por_nivel.clear()
+        
+        return entrada
+    
+    # Subir y bajar mueven el hueco y escriben la entrada una sola vez al final.
+    # Las listas se comparan por (prioridad, turno); el turno es único, así
+    # que nunca se llega a comparar la mascota.
+    
+    def _subir(self, posicion):
+        monticulo = self.monticulo
+        posiciones = self.posiciones
+        entrada = monticulo[posicion]
+        while posicion > 0:
+            padre = (posicion - 1) >> 1
+            entrada_padre = monticulo[padre]
+            if not entrada < entrada_padre:
+                break
+            monticulo[posicion] = entrada_padre
+            posiciones[entrada_padre[2].id] = posicion
+            posicion = padre
+        monticulo[posicion] = entrada
+        posiciones[entrada[2].id] = posicion
+    
+    def _bajar(self, posicion):
+        monticulo = self.monticulo
+        posiciones = self.posiciones
+        cantidad = len(monticulo)
+        entrada = monticulo[posicion]
         
-        print(f"    ╚{'═' * ANCHO}╝")
-        print(f"    Total de pacientes en espera: {self.tamanio}")
+        while True:
+            hijo = 2 * posicion + 1
+            if hijo >= cantidad:
+                break
+            derecho = hijo + 1
+            if derecho < cantidad and monticulo[derecho] < monticulo[hijo]:
+                hijo = derecho
+            entrada_hijo = monticulo[hijo]
+            if not entrada_hijo < entrada:
+                break
+            monticulo[posicion] = entrada_hijo
+            posiciones[entrada_hijo[2].id] = posicion
+            posicion = hijo
+        monticulo[posicion] = entrada
+        posiciones[entrada[2].id] = posicion
+    
+    def mostrar_sala_espera(self, tamanio_pagina=None):
+        if self.esta_vacia():
+            escribir("    La sala de espera está vacía.\n")
+            return
+        
+        escribir(cabecera_cuadro("SALA DE ESPERA (POR PRIORIDAD)"))
+        nivel_de = lambda mascota: NOMBRES_PRIORIDAD.get(self.prioridad_de(mascota.id), "")
+        mostrar_paginado(filas_sala_espera(self.en_orden(), nivel_de), tamanio_pagina, total=self.tamanio + 1)
+        escribir(pie_cuadro(f"Total de pacientes en espera: {self.tamanio}"))
 
 
 class ArbolBinario:
     def __init__(self):
         self.raiz = None
         self.cantidad = 0
+        self.rotaciones = 0
     
     def esta_vacio(self):
         return self.raiz is None
     
     def insertar(self, mascota):
-        nuevo_nodo = Nodo(mascota)
+        nuevo_nodo = NodoArbol(mascota)
         
         if self.esta_vacio():
             self.raiz = nuevo_nodo
@@ -186,57 +801,779 @@ class ArbolBinario:
         
         return None
     
-    def recorrido_inorden(self, nodo=None, primera_llamada=True):
-        if primera_llamada:
-            nodo = self.raiz
-            if self.esta_vacio():
-                print("    La base de datos está vacía.")
+    def eliminar(self, id_mascota):
+        camino = []
+        actual = self.raiz
+        
+        while actual is not None and actual.dato.id != id_mascota:
+            camino.append(actual)
+            if id_mascota < actual.dato.id:
+                actual = actual.izquierdo
+            else:
+                actual = actual.derecho
+        
+        if actual is None:
+            return None
+        
+        mascota_eliminada = actual.dato
+        
+        # Con dos hijos se reemplaza por el sucesor (mínimo del subárbol derecho)
+        if actual.izquierdo is not None and actual.derecho is not None:
+            camino.append(actual)
+            sucesor = actual.derecho
+            while sucesor.izquierdo is not None:
+                camino.append(sucesor)
+                sucesor = sucesor.izquierdo
+            actual.dato = sucesor.dato
+            actual = sucesor
+        
+        hijo = actual.izquierdo if actual.izquierdo is not None else actual.derecho
+        
+        if not camino:
+            self.raiz = hijo
+        else:
+            padre = camino[-1]
+            if padre.izquierdo is actual:
+                padre.izquierdo = hijo
+            else:
+                padre.derecho = hijo
+        
+        self.cantidad -= 1
+        self._rebalancear_camino(camino)
+        return mascota_eliminada
+    
+    def _rebalancear_camino(self, camino):
+        # El árbol simple no se rebalancea
+        pass
+    
+    def _crear_nodo(self, mascota):
+        return NodoArbol(mascota)
+    
+    def _actualizar_altura(self, nodo):
+        # El árbol simple no guarda alturas en los nodos
+        pass
+    
+    def __iter__(self):
+        return self.iter_desde()
+    
+    def iter_desde(self, id_min=None, id_max=None):
+        # Recorrido inorden con pila explícita: no depende de la profundidad
+        # del árbol y entrega las mascotas de una en una.
+        pendientes = []
+        actual = self.raiz
+        
+        while pendientes or actual is not None:
+            while actual is not None:
+                if id_min is not None and actual.dato.id < id_min:
+                    actual = actual.derecho
+                else:
+                    pendientes.append(actual)
+                    actual = actual.izquierdo
+            
+            if not pendientes:
+                return
+            
+            actual = pendientes.pop()
+            if id_max is not None and actual.dato.id > id_max:
                 return
-            print(f"    ╔{'═' * ANCHO}╗")
-            print(f"    ║{'BASE DE DATOS DE MASCOTAS'.center(ANCHO)}║")
-            print(f"    ╠{'═' * ANCHO}╣")
+            
+            yield actual.dato
+            actual = actual.derecho
+    
+    def cargar_masivo(self, registros):
+        # Acepta objetos Mascota o tuplas (id, nombre, raza, alergias, dueño, celular).
+        # Si vienen ordenados por ID la construcción es lineal; si no, se ordenan.
+        nuevas = [r if isinstance(r, Mascota) else Mascota(*r) for r in registros]
+        
+        ordenadas = all(nuevas[i].id <= nuevas[i + 1].id for i in range(len(nuevas) - 1))
+        if not ordenadas:
+            nuevas.sort(key=lambda mascota: mascota.id)
+        
+        # Mezcla con lo que ya hay en el árbol; igual que insertar(),
+        # un ID repetido se rechaza y se conserva el registro existente.
+        existentes = list(self)
+        combinadas = []
+        i = j = 0
+        insertadas = 0
+        
+        while i < len(existentes) or j < len(nuevas):
+            if j == len(nuevas) or (i < len(existentes) and existentes[i].id <= nuevas[j].id):
+                candidata = existentes[i]
+                es_nueva = False
+                i += 1
+            else:
+                candidata = nuevas[j]
+                es_nueva = True
+                j += 1
+            
+            if combinadas and combinadas[-1].id == candidata.id:
+                continue
+            
+            combinadas.append(candidata)
+            if es_nueva:
+                insertadas += 1
+        
+        self.raiz = self._construir_balanceado(combinadas, 0, len(combinadas) - 1)
+        self.cantidad = len(combinadas)
+        return insertadas
+    
+    def _construir_balanceado(self, mascotas, inicio, fin):
+        if inicio > fin:
+            return None
+        
+        medio = (inicio + fin + 1) // 2
+        nodo = self._crear_nodo(mascotas[medio])
+        nodo.izquierdo = self._construir_balanceado(mascotas, inicio, medio - 1)
+        nodo.derecho = self._construir_balanceado(mascotas, medio + 1, fin)
+        self._actualizar_altura(nodo)
+        return nodo
+    
+    def altura(self):
+        if self.esta_vacio():
+            return 0
+        
+        maxima = 0
+        pendientes = [(self.raiz, 1)]
+        
+        while pendientes:
+            nodo, nivel = pendientes.pop()
+            if nivel > maxima:
+                maxima = nivel
+            if nodo.izquierdo is not None:
+                pendientes.append((nodo.izquierdo, nivel + 1))
+            if nodo.derecho is not None:
+                pendientes.append((nodo.derecho, nivel + 1))
+        
+        return maxima
+    
+    def recorrido_inorden(self, tamanio_pagina=None):
+        if self.esta_vacio():
+            escribir("    La base de datos está vacía.\n")
+            return
+        
+        filas = (
+            fila_cuadro(f"ID: {mascota.id} | {mascota.nombre} | Dueño: {mascota.nombre_dueno}")
+            for mascota in self
+        )
+        
+        escribir(cabecera_cuadro("BASE DE DATOS DE MASCOTAS"))
+        mostrar_paginado(filas, tamanio_pagina, total=self.cantidad)
+        escribir(pie_cuadro(f"Total de mascotas registradas: {self.cantidad}"))
+
+
+class ArbolAVL(ArbolBinario):
+    # Mismo API que ArbolBinario, pero se mantiene balanceado con rotaciones
+    # para que los IDs secuenciales no degeneren el árbol en una lista.
+    
+    def insertar(self, mascota):
+        camino = []
+        actual = self.raiz
+        
+        while actual is not None:
+            camino.append(actual)
+            if mascota.id < actual.dato.id:
+                actual = actual.izquierdo
+            elif mascota.id > actual.dato.id:
+                actual = actual.derecho
+            else:
+                return False
         
-        if nodo is not None:
-            self.recorrido_inorden(nodo.izquierdo, False)
-            mascota = nodo.dato
-            linea = f"ID: {mascota.id} | {mascota.nombre} | Dueño: {mascota.nombre_dueno}"
-            print(f"    ║ {linea:<{ANCHO-2}} ║")
-            self.recorrido_inorden(nodo.derecho, False)
+        nuevo_nodo = self._crear_nodo(mascota)
         
-        if primera_llamada:
-            print(f"    ╚{'═' * ANCHO}╝")
-            print(f"    Total de mascotas registradas: {self.cantidad}")
+        if not camino:
+            self.raiz = nuevo_nodo
+        else:
+            padre = camino[-1]
+            if mascota.id < padre.dato.id:
+                padre.izquierdo = nuevo_nodo
+            else:
+                padre.derecho = nuevo_nodo
+        
+        self.cantidad += 1
+        self._rebalancear_camino(camino)
+        return True
+    
+    def _crear_nodo(self, mascota):
+        return NodoAVL(mascota)
+    
+    def altura(self):
+        return self._altura(self.raiz)
+    
+    def _altura(self, nodo):
+        return nodo.altura if nodo is not None else 0
+    
+    def _actualizar_altura(self, nodo):
+        nodo.altura = 1 + max(self._altura(nodo.izquierdo), self._altura(nodo.derecho))
+    
+    def _balance(self, nodo):
+        return self._altura(nodo.izquierdo) - self._altura(nodo.derecho)
+    
+    def _rotar_derecha(self, nodo):
+        nueva_raiz = nodo.izquierdo
+        nodo.izquierdo = nueva_raiz.derecho
+        nueva_raiz.derecho = nodo
+        self._actualizar_altura(nodo)
+        self._actualizar_altura(nueva_raiz)
+        self.rotaciones += 1
+        return nueva_raiz
+    
+    def _rotar_izquierda(self, nodo):
+        nueva_raiz = nodo.derecho
+        nodo.derecho = nueva_raiz.izquierdo
+        nueva_raiz.izquierdo = nodo
+        self._actualizar_altura(nodo)
+        self._actualizar_altura(nueva_raiz)
+        self.rotaciones += 1
+        return nueva_raiz
+    
+    def _rebalancear(self, nodo):
+        # Alturas calculadas en línea: este método se llama en cada nivel del camino
+        izquierdo = nodo.izquierdo
+        derecho = nodo.derecho
+        altura_izquierda = izquierdo.altura if izquierdo is not None else 0
+        altura_derecha = derecho.altura if derecho is not None else 0
+        nodo.altura = 1 + (altura_izquierda if altura_izquierda > altura_derecha else altura_derecha)
+        balance = altura_izquierda - altura_derecha
+        
+        if balance > 1:
+            if self._balance(nodo.izquierdo) < 0:
+                nodo.izquierdo = self._rotar_izquierda(nodo.izquierdo)
+            return self._rotar_derecha(nodo)
+        
+        if balance < -1:
+            if self._balance(nodo.derecho) > 0:
+                nodo.derecho = self._rotar_derecha(nodo.derecho)
+            return self._rotar_izquierda(nodo)
+        
+        return nodo
+    
+    def _rebalancear_camino(self, camino):
+        # Se sube desde el punto modificado hasta la raíz; si un subárbol
+        # conserva su altura, los ancestros ya no cambian y se puede parar.
+        for i in range(len(camino) - 1, -1, -1):
+            nodo = camino[i]
+            altura_previa = nodo.altura
+            nueva_raiz = self._rebalancear(nodo)
+            
+            if nueva_raiz is not nodo:
+                if i == 0:
+                    self.raiz = nueva_raiz
+                else:
+                    padre = camino[i - 1]
+                    if padre.izquierdo is nodo:
+                        padre.izquierdo = nueva_raiz
+                    else:
+                        padre.derecho = nueva_raiz
+            
+            if nueva_raiz.altura == altura_previa:
+                break
+
+
+def normalizar_texto(texto):
+    # Sin tildes, sin mayúsculas y con espacios simples: "José  PÉREZ" -> "jose perez"
+    if texto.isascii():
+        return " ".join(texto.lower().split())
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_tildes.casefold().split())
+
+
+def normalizar_celular(celular):
+    if celular.isdigit():
+        return celular
+    return "".join(c for c in celular if c.isdigit())
+
+
+class IndiceSecundario:
+    # Índice auxiliar sobre un campo de Mascota: diccionario para coincidencia
+    # exacta y lista ordenada de claves para búsqueda por prefijo (bisect).
+    # Las claves nuevas esperan en "pendientes" y se ordenan en la siguiente
+    # búsqueda por prefijo, así una ráfaga de altas no paga un insort cada una.
+    
+    def __init__(self, campo, normalizador, por_palabras=False):
+        self.campo = campo
+        self.normalizador = normalizador
+        self.por_palabras = por_palabras
+        self.exacto = {}
+        self.prefijos = {}
+        self.claves = []
+        self.pendientes = []
+    
+    def _claves_ordenadas(self):
+        if self.pendientes:
+            if len(self.pendientes) < 32:
+                for clave in self.pendientes:
+                    insort(self.claves, clave)
+            else:
+                self.claves.extend(self.pendientes)
+                self.claves.sort()
+            self.pendientes = []
+        return self.claves
+    
+    def _claves_prefijo(self, clave):
+        # Con por_palabras, "carlos perez" también se encuentra escribiendo "per"
+        if not self.por_palabras:
+            return [clave]
+        palabras = clave.split(" ")
+        return [" ".join(palabras[i:]) for i in range(len(palabras))]
+    
+    def clave(self, mascota):
+        return self.normalizador(getattr(mascota, self.campo))
+    
+    def agregar(self, mascota, clave=None):
+        # clave: la ya calculada con self.clave(mascota), si la hay
+        if clave is None:
+            clave = self.clave(mascota)
+        if not clave:
+            return
+        
+        self.exacto.setdefault(clave, []).append(mascota)
+        
+        for clave_prefijo in self._claves_prefijo(clave):
+            grupo = self.prefijos.get(clave_prefijo)
+            if grupo is None:
+                self.prefijos[clave_prefijo] = [mascota]
+                self.pendientes.append(clave_prefijo)
+            else:
+                grupo.append(mascota)
+    
+    def quitar(self, mascota):
+        clave = self.normalizador(getattr(mascota, self.campo))
+        if clave not in self.exacto:
+            return
+        
+        self._quitar_de(self.exacto, clave, mascota)
+        claves = self._claves_ordenadas()
+        
+        for clave_prefijo in self._claves_prefijo(clave):
+            if self._quitar_de(self.prefijos, clave_prefijo, mascota):
+                del claves[bisect_left(claves, clave_prefijo)]
+    
+    def _quitar_de(self, grupos, clave, mascota):
+        grupo = grupos[clave]
+        grupo[:] = [m for m in grupo if m.id != mascota.id]
+        if not grupo:
+            del grupos[clave]
+            return True
+        return False
+    
+    def reconstruir(self, mascotas):
+        # Para cargas masivas: un solo ordenamiento en vez de un insort por mascota
+        self.exacto = {}
+        self.prefijos = {}
+        for mascota in mascotas:
+            clave = self.clave(mascota)
+            if not clave:
+                continue
+            self.exacto.setdefault(clave, []).append(mascota)
+            for clave_prefijo in self._claves_prefijo(clave):
+                self.prefijos.setdefault(clave_prefijo, []).append(mascota)
+        self.claves = sorted(self.prefijos)
+        self.pendientes = []
+    
+    def buscar_exacto(self, valor):
+        return list(self.exacto.get(self.normalizador(valor), []))
+    
+    def buscar_prefijo(self, prefijo, limite=None):
+        prefijo = self.normalizador(prefijo)
+        if not prefijo:
+            return []
+        
+        claves = self._claves_ordenadas()
+        resultados = []
+        vistos = set()
+        posicion = bisect_left(claves, prefijo)
+        
+        while posicion < len(claves) and claves[posicion].startswith(prefijo):
+            for mascota in self.prefijos[claves[posicion]]:
+                if mascota.id not in vistos:
+                    vistos.add(mascota.id)
+                    resultados.append(mascota)
+                    if limite is not None and len(resultados) >= limite:
+                        return resultados
+            posicion += 1
+        
+        return resultados
+
+
+# Búsqueda de texto en los diagnósticos
+PATRON_PALABRA = re.compile(r"[a-z0-9]+")
+PALABRAS_VACIAS = frozenset("a al con de del el en la las lo los para por se sin su sus un una y".split())
+PATRON_OR = re.compile(r"\s+OR\s+|\s*\|\s*")
+
+
+@lru_cache(maxsize=65536)
+def palabras_clave(texto):
+    # Palabras sin tildes ni mayúsculas, sin repetir y sin palabras vacías.
+    # Memorizado: los diagnósticos se repiten mucho ("Control de rutina").
+    palabras = PATRON_PALABRA.findall(normalizar_texto(texto))
+    return tuple(dict.fromkeys(palabra for palabra in palabras if palabra not in PALABRAS_VACIAS))
+
+
+def _interseccion(menor, mayor):
+    # Listas ordenadas de números de registro; si una es mucho más corta se
+    # busca cada elemento con bisect en vez de recorrer la larga. Palabras que
+    # siempre van juntas ("post-operatorio") tienen listas iguales.
+    if menor == mayor:
+        return menor
+    if len(menor) * 16 < len(mayor):
+        resultado = array("I")
+        desde = 0
+        for numero in menor:
+            desde = bisect_left(mayor, numero, desde)
+            if desde == len(mayor):
+                break
+            if mayor[desde] == numero:
+                resultado.append(numero)
+        return resultado
+    return array("I", sorted(set(menor).intersection(mayor)))
+
+
+class IndiceDiagnosticos:
+    # Índice invertido sobre los diagnósticos de todos los historiales. Cada
+    # registro recibe un número global (columnas: ID, posición en su historial
+    # desde el más antiguo, fecha como ordinal) y cada palabra guarda la lista
+    # ordenada de números de registro que la contienen. Los números siguen el
+    # orden de las fechas, así un rango de fechas es un rango de números y
+    # cada lista se recorta con bisect. Si llega un registro con fecha
+    # anterior al último, se renumera todo antes de la siguiente consulta.
+    
+    def __init__(self):
+        self._vaciar()
+    
+    def _vaciar(self):
+        self.ids = array("q")
+        self.posiciones = array("I")
+        self.fechas = array("I")
+        self.listas = {}
+        self._en_orden = True
+    
+    def __len__(self):
+        return len(self.fechas)
+    
+    def agregar(self, id_mascota, posicion, fecha, texto):
+        numero = len(self.fechas)
+        if numero and fecha < self.fechas[-1]:
+            self._en_orden = False
+        
+        self.ids.append(id_mascota)
+        self.posiciones.append(posicion)
+        self.fechas.append(fecha)
+        
+        listas = self.listas
+        for palabra in palabras_clave(texto):
+            lista = listas.get(palabra)
+            if lista is None:
+                listas[palabra] = array("I", (numero,))
+            else:
+                lista.append(numero)
+    
+    def agregar_historial(self, mascota):
+        for posicion, (fecha, texto) in enumerate(mascota.historial_medico.cronologico()):
+            self.agregar(mascota.id, posicion, fecha, texto)
+    
+    def reconstruir(self, mascotas):
+        registros = [
+            (fecha, mascota.id, posicion, texto)
+            for mascota in mascotas
+            for posicion, (fecha, texto) in enumerate(mascota.historial_medico.cronologico())
+        ]
+        registros.sort(key=lambda registro: registro[0])
+        
+        self._vaciar()
+        for fecha, id_mascota, posicion, texto in registros:
+            self.agregar(id_mascota, posicion, fecha, texto)
+    
+    def _renumerar(self):
+        orden = sorted(range(len(self.fechas)), key=self.fechas.__getitem__)
+        nuevo_numero = array("I", [0]) * len(orden)
+        for nuevo, viejo in enumerate(orden):
+            nuevo_numero[viejo] = nuevo
+        
+        self.ids = array("q", (self.ids[viejo] for viejo in orden))
+        self.posiciones = array("I", (self.posiciones[viejo] for viejo in orden))
+        self.fechas = array("I", (self.fechas[viejo] for viejo in orden))
+        for palabra, lista in self.listas.items():
+            self.listas[palabra] = array("I", sorted(nuevo_numero[viejo] for viejo in lista))
+        self._en_orden = True
+    
+    def _grupos(self, consulta):
+        # "penicilina OR post-operatorio": grupos unidos por OR; dentro de cada
+        # grupo todas las palabras deben aparecer en el mismo registro (AND)
+        grupos = []
+        for parte in PATRON_OR.split(consulta):
+            palabras = [palabra for palabra in palabras_clave(parte) if palabra != "and"]
+            if palabras:
+                grupos.append(palabras)
+        return grupos
+    
+    def _coincidencias(self, consulta, desde, hasta):
+        if not self._en_orden:
+            self._renumerar()
+        
+        inicio = bisect_left(self.fechas, desde.toordinal()) if desde else 0
+        fin = bisect_right(self.fechas, hasta.toordinal()) if hasta else len(self.fechas)
+        resultados = []
+        
+        for grupo in self._grupos(consulta):
+            tramos = []
+            for palabra in grupo:
+                lista = self.listas.get(palabra)
+                if lista is None:
+                    tramos = []
+                    break
+                tramos.append(lista[bisect_left(lista, inicio):bisect_left(lista, fin)])
+            if not tramos:
+                continue
+            
+            tramos.sort(key=len)
+            candidatos = tramos[0]
+            for tramo in tramos[1:]:
+                if not candidatos:
+                    break
+                candidatos = _interseccion(candidatos, tramo)
+            resultados.append(candidatos)
+        
+        # Con un solo grupo la lista ya está ordenada y sin repetidos
+        if len(resultados) == 1:
+            return resultados[0]
+        encontrados = set()
+        for candidatos in resultados:
+            encontrados.update(candidatos)
+        return encontrados
+    
+    def buscar(self, consulta, desde=None, hasta=None):
+        # Números de registro que cumplen la consulta entre desde y hasta
+        # (objetos date, ambos incluidos), en orden cronológico
+        return sorted(self._coincidencias(consulta, desde, hasta))
+    
+    def registro(self, numero):
+        # (ID de la mascota, posición desde el más antiguo, ordinal de la fecha)
+        return self.ids[numero], self.posiciones[numero], self.fechas[numero]
+    
+    def mascotas(self, consulta, desde=None, hasta=None):
+        # {ID: cantidad de registros que coinciden}
+        numeros = self._coincidencias(consulta, desde, hasta)
+        return dict(Counter(map(self.ids.__getitem__, numeros)))
+    
+    def entre(self, desde=None, hasta=None):
+        # Números de los registros (de cualquier mascota) con fecha entre desde
+        # y hasta (objetos date, ambos incluidos): las fechas ya están ordenadas
+        if not self._en_orden:
+            self._renumerar()
+        inicio = bisect_left(self.fechas, desde.toordinal()) if desde else 0
+        fin = bisect_right(self.fechas, hasta.toordinal()) if hasta else len(self.fechas)
+        return range(inicio, fin)
+    
+    def visitas_entre(self, desde=None, hasta=None):
+        # {ID: cantidad de visitas} entre desde y hasta
+        numeros = self.entre(desde, hasta)
+        return dict(Counter(self.ids[numeros.start:numeros.stop]))
+
+
+class IndiceUltimaVisita:
+    # Fecha de la última visita de cada mascota, agrupada por día en una lista
+    # ordenada de días: "sin visitas desde X" recorre solo los días anteriores
+    # a X en vez de todos los historiales. Cuando una mascota vuelve, su día
+    # anterior queda con un grupo más chico (o vacío, y se quita al consultar).
+    
+    def __init__(self):
+        self._vaciar()
+    
+    def _vaciar(self):
+        self.ultima = {}
+        self.por_dia = {}
+        self.dias = []
+        self.sin_visitas = set()
+    
+    def registrar_mascota(self, mascota):
+        fecha = mascota.historial_medico.ultima_fecha()
+        if fecha:
+            self.registrar_visita(mascota.id, fecha)
+        elif mascota.id not in self.ultima:
+            self.sin_visitas.add(mascota.id)
+    
+    def registrar_visita(self, id_mascota, fecha):
+        anterior = self.ultima.get(id_mascota, 0)
+        if fecha <= anterior:
+            return
+        if anterior:
+            self.por_dia[anterior].discard(id_mascota)
+        else:
+            self.sin_visitas.discard(id_mascota)
+        
+        self.ultima[id_mascota] = fecha
+        grupo = self.por_dia.get(fecha)
+        if grupo is None:
+            grupo = self.por_dia[fecha] = set()
+            insort(self.dias, fecha)
+        grupo.add(id_mascota)
+    
+    def reconstruir(self, mascotas):
+        self._vaciar()
+        for mascota in mascotas:
+            self.registrar_mascota(mascota)
+    
+    def sin_visita_desde(self, corte, incluir_sin_visitas=False):
+        # IDs cuya última visita es anterior a corte (date), de la más antigua
+        # a la más reciente; opcionalmente también las que nunca vinieron
+        resultado = sorted(self.sin_visitas) if incluir_sin_visitas else []
+        fin = bisect_left(self.dias, corte.toordinal())
+        vacios = []
+        for dia in self.dias[:fin]:
+            grupo = self.por_dia[dia]
+            if grupo:
+                resultado.extend(sorted(grupo))
+            else:
+                vacios.append(dia)
+        
+        for dia in vacios:
+            del self.por_dia[dia]
+            del self.dias[bisect_left(self.dias, dia)]
+        return resultado
+
+
+# Alergias: el texto libre de la ficha ("Alergia a la penicilina") se
+# interpreta una sola vez como un conjunto de alérgenos normalizados
+PALABRAS_ALERGIA = frozenset(
+    "alergia alergias alergico alergica sensibilidad sensible intolerancia reaccion ninguna ninguno "
+    "conocida conocido conocidas ciertos ciertas algunos algunas picadura picaduras no tiene "
+    "posible leve severa".split()
+)
+SINONIMOS_ALERGENOS = {
+    "penicilinas": "penicilina", "amoxicilina": "penicilina", "ampicilina": "penicilina",
+    "cefalexina": "cefalosporina", "cefalosporinas": "cefalosporina",
+    "pulga": "pulgas", "alimento": "alimentos", "vacunas": "vacuna",
+    "antiparasitarios": "antiparasitario", "anestesico": "anestesia", "anestesicos": "anestesia",
+    "yodado": "yodo", "champus": "champu",
+}
+
+
+@lru_cache(maxsize=65536)
+def alergenos_de(texto):
+    # "Alergia a la penicilina y al látex" -> frozenset({"penicilina", "latex"}).
+    # Memorizado: miles de fichas repiten el mismo texto y comparten el conjunto.
+    return frozenset(
+        SINONIMOS_ALERGENOS.get(palabra, palabra)
+        for palabra in palabras_clave(texto)
+        if palabra not in PALABRAS_ALERGIA
+    )
+
+
+@lru_cache(maxsize=65536)
+def conflictos_texto(alergenos, texto):
+    # Alérgenos de la mascota mencionados en un diagnóstico o tratamiento
+    return tuple(sorted(alergenos.intersection(alergenos_de(texto))))
+
+
+class IndiceAlergenos:
+    # Alérgeno -> IDs de las mascotas que lo tienen. Mismo agregar / quitar /
+    # reconstruir que IndiceSecundario, así entra en los índices del sistema.
+    
+    def __init__(self):
+        self.mascotas = {}
+    
+    def clave(self, mascota):
+        return mascota.alergenos
+    
+    def agregar(self, mascota, clave=None):
+        for alergeno in mascota.alergenos if clave is None else clave:
+            self.mascotas.setdefault(alergeno, set()).add(mascota.id)
+    
+    def quitar(self, mascota):
+        for alergeno in mascota.alergenos:
+            grupo = self.mascotas.get(alergeno)
+            if grupo is not None:
+                grupo.discard(mascota.id)
+                if not grupo:
+                    del self.mascotas[alergeno]
+    
+    def reconstruir(self, mascotas):
+        self.mascotas = {}
+        for mascota in mascotas:
+            if mascota.alergenos:
+                self.agregar(mascota)
+    
+    def buscar(self, alergeno):
+        # IDs ordenados de las mascotas alérgicas a alergeno (o a un sinónimo)
+        return sorted(self.mascotas.get(next(iter(alergenos_de(alergeno)), ""), ()))
+    
+    def conteo(self):
+        return {alergeno: len(grupo) for alergeno, grupo in self.mascotas.items()}
 
 
 class Mascota:
+    __slots__ = ("id", "nombre", "raza", "alergias", "alergenos", "nombre_dueno", "celular", "_historial")
+    
     def __init__(self, id, nombre, raza, alergias, nombre_dueno, celular):
         self.id = id
         self.nombre = nombre
         self.raza = raza
         self.alergias = alergias
+        self.alergenos = alergenos_de(alergias)
         self.nombre_dueno = nombre_dueno
         self.celular = celular
-        self.historial_medico = Pila()
+        # None o las filas leídas del disco hasta el primer acceso
+        self._historial = None
+    
+    @property
+    def historial_medico(self):
+        historial = self._historial
+        if historial is None or type(historial) is list:
+            historial = self._historial = HistorialMedico.desde_filas(historial or ())
+        return historial
+    
+    @historial_medico.setter
+    def historial_medico(self, historial):
+        self._historial = historial
+    
+    def cargar_historial(self, filas):
+        # Filas del almacén; el historial se arma recién cuando se consulta
+        self._historial = filas
+    
+    def filas_historial(self):
+        # Para la instantánea: si el historial nunca se abrió, las filas tal cual
+        historial = self._historial
+        if historial is None:
+            return []
+        if type(historial) is list:
+            return historial
+        return historial.registros()
     
     def mostrar_informacion(self):
-        print(f"    ╔{'═' * ANCHO}╗")
-        print(f"    ║{'FICHA DE LA MASCOTA'.center(ANCHO)}║")
-        print(f"    ╠{'═' * ANCHO}╣")
-        print(f"    ║ {'ID:':<18} {str(self.id):<{ANCHO-21}} ║")
-        print(f"    ║ {'Nombre:':<18} {self.nombre:<{ANCHO-21}} ║")
-        print(f"    ║ {'Raza:':<18} {self.raza:<{ANCHO-21}} ║")
-        print(f"    ║ {'Alergias:':<18} {self.alergias:<{ANCHO-21}} ║")
-        print(f"    ║ {'Dueño:':<18} {self.nombre_dueno:<{ANCHO-21}} ║")
-        print(f"    ║ {'Celular:':<18} {self.celular:<{ANCHO-21}} ║")
-        print(f"    ║ {'Registros:':<18} {str(self.historial_medico.tamanio) + ' diagnósticos':<{ANCHO-21}} ║")
-        print(f"    ╚{'═' * ANCHO}╝")
+        cuadro = Cuadro("FICHA DE LA MASCOTA")
+        cuadro.campo("ID:", str(self.id))
+        cuadro.campo("Nombre:", self.nombre)
+        cuadro.campo("Raza:", self.raza)
+        cuadro.campo("Alergias:", self.alergias)
+        cuadro.campo("Dueño:", self.nombre_dueno)
+        cuadro.campo("Celular:", self.celular)
+        cuadro.campo("Registros:", str(self.historial_medico.tamanio) + " diagnósticos")
+        cuadro.mostrar()
     
     def agregar_diagnostico(self, diagnostico):
         self.historial_medico.apilar(diagnostico)
     
-    def ver_historial(self):
-        print(f"\n    Historial Médico de {self.nombre} (ID: {self.id}):")
-        self.historial_medico.mostrar_historial()
+    def ver_historial(self, tamanio_pagina=TAMANIO_PAGINA):
+        escribir(f"\n    Historial Médico de {self.nombre} (ID: {self.id}):\n")
+        
+        pagina = 1
+        total_paginas = self.historial_medico.total_paginas(tamanio_pagina)
+        
+        while True:
+            self.historial_medico.mostrar_historial(pagina, tamanio_pagina)
+            if total_paginas == 1:
+                return
+            
+            respuesta = input("    [s] siguiente, [a] anterior, número de página o ENTER para salir: ").strip().lower()
+            if respuesta == "s" and pagina < total_paginas:
+                pagina += 1
+            elif respuesta == "a" and pagina > 1:
+                pagina -= 1
+            elif respuesta.isdigit() and 1 <= int(respuesta) <= total_paginas:
+                pagina = int(respuesta)
+            elif respuesta == "":
+                return
 
 
 # Catálogo de servicios
@@ -253,15 +1590,12 @@ CATALOGO_SERVICIOS = [
 
 
 def mostrar_catalogo_servicios():
-    print(f"\n    ╔{'═' * ANCHO}╗")
-    print(f"    ║{'CATÁLOGO DE SERVICIOS'.center(ANCHO)}║")
-    print(f"    ╠{'═' * ANCHO}╣")
+    cuadro = Cuadro("CATÁLOGO DE SERVICIOS", separado=True)
     
     for i, servicio in enumerate(CATALOGO_SERVICIOS, 1):
-        linea = f"{i}. [{servicio['codigo']}] {servicio['nombre']:<20} S/{servicio['precio']:.2f}"
-        print(f"    ║ {linea:<{ANCHO-2}} ║")
+        cuadro.fila(f"{i}. [{servicio['codigo']}] {servicio['nombre']:<20} S/{servicio['precio']:.2f}")
     
-    print(f"    ╚{'═' * ANCHO}╝")
+    cuadro.mostrar()
 
 
 def obtener_servicio(indice):
@@ -270,10 +1604,825 @@ def obtener_servicio(indice):
     return None
 
 
-class SistemaVeterinaria:
+def obtener_servicio_por_codigo(codigo):
+    return _INDICE_CATALOGO.get(codigo)
+
+
+# Índice código -> servicio para buscar en O(1). Si se edita CATALOGO_SERVICIOS
+# directamente hay que llamar a catalogo_modificado(); las funciones de abajo
+# ya lo hacen.
+_INDICE_CATALOGO = {}
+
+SEPARADOR_SERVICIOS = re.compile(r"[+,\s]+")
+
+# Alérgenos a los que expone cada servicio (productos, fármacos o materiales
+# habituales); un servicio sin entrada no genera alertas
+ALERGENOS_SERVICIO = {
+    "VAC": frozenset({"vacuna"}),
+    "BAN": frozenset({"champu", "perfume"}),
+    "DES": frozenset({"antiparasitario", "ivermectina"}),
+    "CIR": frozenset({"anestesia", "latex", "penicilina", "cefalosporina"}),
+    "RAY": frozenset({"contraste", "yodo"}),
+    "EME": frozenset({"anestesia", "penicilina"}),
+    "HOS": frozenset({"penicilina", "latex"}),
+}
+
+
+def catalogo_modificado():
+    # Rehace el índice y descarta los precios memorizados
+    _INDICE_CATALOGO.clear()
+    for servicio in CATALOGO_SERVICIOS:
+        _INDICE_CATALOGO[servicio["codigo"]] = servicio
+    cotizar.cache_clear()
+    precio_paquete.cache_clear()
+    conflictos_servicios.cache_clear()
+
+
+def agregar_servicio(codigo, nombre, precio):
+    if codigo in _INDICE_CATALOGO:
+        raise ErrorVeterinaria(f"Ya existe un servicio con el código {codigo}.")
+    CATALOGO_SERVICIOS.append({"nombre": nombre, "precio": precio, "codigo": codigo})
+    catalogo_modificado()
+
+
+def cambiar_precio(codigo, precio):
+    servicio = _INDICE_CATALOGO.get(codigo)
+    if servicio is None:
+        raise ErrorVeterinaria(f"Servicio no encontrado: {codigo}")
+    servicio["precio"] = precio
+    catalogo_modificado()
+
+
+def quitar_servicio(codigo):
+    servicio = _INDICE_CATALOGO.get(codigo)
+    if servicio is None:
+        raise ErrorVeterinaria(f"Servicio no encontrado: {codigo}")
+    CATALOGO_SERVICIOS.remove(servicio)
+    catalogo_modificado()
+
+
+@lru_cache(maxsize=4096)
+def cotizar(seleccion):
+    # "CON + VAC + DES", "con,vac" o "1+2+4" -> (servicios, total).
+    # Memorizado por texto: una visita repetida no vuelve a interpretar nada.
+    servicios = []
+    for parte in SEPARADOR_SERVICIOS.split(seleccion.strip()):
+        if not parte:
+            continue
+        if parte.isdigit():
+            servicio = obtener_servicio(int(parte))
+        else:
+            servicio = obtener_servicio_por_codigo(parte.upper())
+        if servicio is None:
+            raise ErrorVeterinaria(f"Servicio no encontrado: {parte}")
+        servicios.append(servicio)
+    
+    if not servicios:
+        raise ErrorVeterinaria("No se indicó ningún servicio.")
+    return tuple(servicios), precio_paquete(tuple(sorted(servicio["codigo"] for servicio in servicios)))
+
+
+@lru_cache(maxsize=4096)
+def precio_paquete(codigos):
+    # Total de un paquete (códigos ordenados, con repetidos); en céntimos
+    # para que sumar precios no acumule error de coma flotante
+    return sum(round(_INDICE_CATALOGO[codigo]["precio"] * 100) for codigo in codigos) / 100
+
+
+@lru_cache(maxsize=65536)
+def conflictos_servicios(alergenos, codigos):
+    # ((alérgeno, código), ...) entre las alergias de una mascota y los
+    # servicios elegidos. La clave es el conjunto de alérgenos, no la mascota:
+    # todas las fichas con las mismas alergias comparten el resultado.
+    return tuple(
+        (alergeno, codigo)
+        for codigo in codigos
+        for alergeno in sorted(alergenos.intersection(ALERGENOS_SERVICIO.get(codigo, ())))
+    )
+
+
+catalogo_modificado()
+
+
+class LibroFacturacion:
+    # Libro de cobros en columnas (arreglos compactos): marca de tiempo, ID de
+    # la mascota, servicio (índice en una tabla de códigos) y precio en
+    # céntimos. Los totales por día, mes, servicio y mascota se actualizan al
+    # anotar, así los reportes no recorren las filas; un rango de días se
+    # responde con sumas acumuladas por día y bisect, en O(log días).
+    
+    def __init__(self):
+        self.marcas = array("q")
+        self.ids = array("q")
+        self.servicios = array("B")
+        self.precios = array("q")
+        self.codigos = []
+        self._indice_codigo = {}
+        self.por_dia = {}
+        self.por_mes = {}
+        self.por_servicio = {}
+        self.por_mascota = {}
+        # dias[i] = ordinal de un día con cobros; acumulado[i] = total hasta ese día
+        self.dias = array("l")
+        self.acumulado = array("q")
+        self._acumulado_al_dia = True
+        # Límites [inicio, fin) del último día visto, para no convertir cada marca
+        self._dia_vigente = (0, 0, 0, None)
+    
+    def __len__(self):
+        return len(self.marcas)
+    
+    def _dia_de(self, marca):
+        inicio, fin, ordinal, mes = self._dia_vigente
+        if inicio <= marca < fin:
+            return ordinal, mes
+        
+        dia = datetime.fromtimestamp(marca).date()
+        inicio = int(datetime.combine(dia, datetime.min.time()).timestamp())
+        fin = int(datetime.combine(dia + timedelta(days=1), datetime.min.time()).timestamp())
+        self._dia_vigente = (inicio, fin, dia.toordinal(), (dia.year, dia.month))
+        return self._dia_vigente[2], self._dia_vigente[3]
+    
+    def registrar(self, id_mascota, codigo, precio, marca=None):
+        marca = int(time.time() if marca is None else marca)
+        centimos = round(precio * 100)
+        
+        indice = self._indice_codigo.get(codigo)
+        if indice is None:
+            indice = self._indice_codigo[codigo] = len(self.codigos)
+            self.codigos.append(codigo)
+            self.por_servicio[codigo] = [0, 0]
+        
+        self.marcas.append(marca)
+        self.ids.append(id_mascota)
+        self.servicios.append(indice)
+        self.precios.append(centimos)
+        
+        ordinal, mes = self._dia_de(marca)
+        self.por_dia[ordinal] = self.por_dia.get(ordinal, 0) + centimos
+        self.por_mes[mes] = self.por_mes.get(mes, 0) + centimos
+        self.por_mascota[id_mascota] = self.por_mascota.get(id_mascota, 0) + centimos
+        por_servicio = self.por_servicio[codigo]
+        por_servicio[0] += 1
+        por_servicio[1] += centimos
+        
+        # Lo normal es anotar en orden de llegada: basta tocar el último día.
+        # Un cobro con fecha anterior obliga a rehacer los acumulados (perezosamente).
+        if self.dias and ordinal == self.dias[-1]:
+            self.acumulado[-1] += centimos
+        elif not self.dias or ordinal > self.dias[-1]:
+            self.dias.append(ordinal)
+            self.acumulado.append((self.acumulado[-1] if self.acumulado else 0) + centimos)
+        else:
+            self._acumulado_al_dia = False
+    
+    def _rehacer_acumulado(self):
+        self.dias = array("l", sorted(self.por_dia))
+        self.acumulado = array("q")
+        total = 0
+        for ordinal in self.dias:
+            total += self.por_dia[ordinal]
+            self.acumulado.append(total)
+        self._acumulado_al_dia = True
+    
+    # Consultas: montos en soles
+    
+    def total(self):
+        if not self._acumulado_al_dia:
+            self._rehacer_acumulado()
+        return (self.acumulado[-1] if self.acumulado else 0) / 100
+    
+    def total_dia(self, dia):
+        return self.por_dia.get(dia.toordinal(), 0) / 100
+    
+    def total_entre(self, desde, hasta):
+        # Ambos días incluidos
+        if not self._acumulado_al_dia:
+            self._rehacer_acumulado()
+        inicio = bisect_left(self.dias, desde.toordinal())
+        fin = bisect_right(self.dias, hasta.toordinal())
+        if fin <= inicio:
+            return 0.0
+        antes = self.acumulado[inicio - 1] if inicio else 0
+        return (self.acumulado[fin - 1] - antes) / 100
+    
+    def total_mes(self, anio, mes):
+        return self.por_mes.get((anio, mes), 0) / 100
+    
+    def total_servicio(self, codigo):
+        # Devuelve (cantidad de cobros, total)
+        cantidad, centimos = self.por_servicio.get(codigo, (0, 0))
+        return cantidad, centimos / 100
+    
+    def total_mascota(self, id_mascota):
+        return self.por_mascota.get(id_mascota, 0) / 100
+    
+    def mostrar_resumen(self, hoy=None):
+        hoy = hoy or date.today()
+        cuadro = Cuadro("RESUMEN DE FACTURACIÓN", separado=True)
+        cuadro.campo("Hoy:", f"S/{self.total_dia(hoy):.2f}")
+        cuadro.campo("Últimos 7 días:", f"S/{self.total_entre(hoy - timedelta(days=6), hoy):.2f}")
+        cuadro.campo("Este mes:", f"S/{self.total_mes(hoy.year, hoy.month):.2f}")
+        cuadro.campo("Total acumulado:", f"S/{self.total():.2f}")
+        cuadro.separador()
+        
+        if not self.codigos:
+            cuadro.fila("Todavía no hay cobros registrados.")
+        for codigo in self.codigos:
+            cantidad, total = self.total_servicio(codigo)
+            cuadro.fila(f"[{codigo}] {cantidad:>6} atención(es)   S/{total:>12.2f}")
+        
+        cuadro.mostrar(f"Cobros registrados: {len(self)}")
+
+
+def leer_fecha(texto):
+    # "dd/mm/aaaa" -> date; vacío -> None; lanza ValueError si no es válida
+    texto = texto.strip()
+    if not texto:
+        return None
+    return datetime.strptime(texto, "%d/%m/%Y").date()
+
+
+def id_valido(valor):
+    # Enteros o texto con un entero; True/1.5/"" no son IDs (un ID de otro tipo
+    # en el árbol rompería todas las comparaciones siguientes)
+    if type(valor) is int:
+        return valor
+    if type(valor) is str:
+        return int(valor)
+    raise ValueError(f"ID no válido: {valor!r}")
+
+
+def texto_valido(valor, campo):
+    # Los campos de texto llegan de JSON: un número acá fallaría recién al
+    # normalizarlo, con la mascota o el registro ya guardados a medias
+    if type(valor) is not str:
+        raise ValueError(f"{campo} tiene que ser texto: {valor!r}")
+    return valor
+
+
+def prioridad_valida(prioridad):
+    # True == 1 y 3.0 == 3 están en NOMBRES_PRIORIDAD; solo valen enteros
+    return type(prioridad) is int and prioridad in NOMBRES_PRIORIDAD
+
+
+@contextmanager
+def sin_recolector():
+    # Para cargas masivas: el recolector de ciclos se dispararía una y otra vez
+    # con millones de objetos nuevos para no encontrar nada (no se forman
+    # ciclos) y se lleva la mayor parte del tiempo. Al terminar se congela lo
+    # creado, que vive hasta salir, para que no lo vuelva a recorrer.
+    activo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.freeze()
+        if activo:
+            gc.enable()
+
+
+def _ignorar(*argumentos):
+    return None
+
+
+class IndiceDiferido:
+    # Ocupa el lugar de un índice todavía sin construir (inicio rápido). Las
+    # altas y diagnósticos nuevos no hacen nada mientras tanto, porque la
+    # reconstrucción recorre el árbol y ya los incluye; la primera consulta lo
+    # construye y lo deja en el sistema en lugar de este objeto. "clave" va con
+    # las actualizaciones: la calcula el alta y no debe construir el índice.
+    ACTUALIZACIONES = frozenset({"agregar", "agregar_historial", "clave", "quitar", "registrar_mascota",
+                                 "registrar_visita"})
+    
+    def __init__(self, sistema, atributo):
+        self._sistema = sistema
+        self._atributo = atributo
+        self._indice = getattr(sistema, atributo)
+        self._construido = False
+    
+    def __getattr__(self, nombre):
+        if not self._construido and nombre in self.ACTUALIZACIONES:
+            return _ignorar
+        return getattr(self.construir(), nombre)
+    
+    def construir(self):
+        if not self._construido:
+            with sin_recolector():
+                self._indice.reconstruir(self._sistema.base_datos)
+            self._construido = True
+            setattr(self._sistema, self._atributo, self._indice)
+        return self._indice
+
+
+class ErrorVeterinaria(Exception):
+    # Errores de negocio de la API sin interacción; el mensaje se muestra tal cual
+    pass
+
+
+# Agenda de citas: cada día se divide en turnos fijos. Por veterinario y por
+# día, los turnos ocupados son los bits de un entero, así que ver si una cita
+# choca con otra es un AND y buscar un hueco de k turnos seguidos son k - 1
+# desplazamientos; solo se recorren los días con reservas, en orden.
+APERTURA = 8 * 60
+CIERRE = 18 * 60
+DURACION_TURNO = 30
+TURNOS_POR_DIA = (CIERRE - APERTURA) // DURACION_TURNO
+MASCARA_DIA = (1 << TURNOS_POR_DIA) - 1
+# date.weekday(): 0 = lunes ... 6 = domingo
+DIAS_LABORABLES = frozenset(range(6))
+NOMBRES_DIAS = ("Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom")
+# Hasta dónde buscar un turno libre
+DIAS_BUSQUEDA = 366
+
+
+def dia_semana(dia):
+    # Ordinal 1 (01/01/0001) fue lunes
+    return (dia - 1) % 7
+
+
+def hora_turno(turno):
+    minutos = APERTURA + turno * DURACION_TURNO
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def turno_de(momento):
+    # datetime -> (día ordinal, turno); la hora tiene que caer justo en un turno
+    minutos = momento.hour * 60 + momento.minute - APERTURA
+    if momento.second or momento.microsecond or minutos % DURACION_TURNO:
+        raise ErrorVeterinaria(f"Los turnos empiezan cada {DURACION_TURNO} minutos desde las {hora_turno(0)}.")
+    if not 0 <= minutos < CIERRE - APERTURA:
+        raise ErrorVeterinaria(f"Fuera del horario de atención ({hora_turno(0)} a {hora_turno(TURNOS_POR_DIA)}).")
+    return momento.toordinal(), minutos // DURACION_TURNO
+
+
+def momento_de(dia, turno):
+    minutos = APERTURA + turno * DURACION_TURNO
+    return datetime.combine(date.fromordinal(dia), datetime.min.time()) + timedelta(minutes=minutos)
+
+
+def _racha_maxima(ocupados):
+    # Turnos libres seguidos más largos del día
+    libres = ~ocupados & MASCARA_DIA
+    racha = 0
+    while libres:
+        libres &= libres >> 1
+        racha += 1
+    return racha
+
+
+def _primer_hueco(ocupados, turnos, desde_turno=0):
+    # Primer turno >= desde_turno donde empiezan `turnos` turnos libres; None si no hay.
+    # Tras k - 1 pasadas de "libres &= libres >> 1" queda encendido el bit i
+    # solo si i, i+1, ..., i+k-1 estaban libres (los bits fuera del día son 0).
+    libres = ~ocupados & MASCARA_DIA & ~((1 << desde_turno) - 1)
+    for _ in range(turnos - 1):
+        libres &= libres >> 1
+    if not libres:
+        return None
+    return (libres & -libres).bit_length() - 1
+
+
+class Cita:
+    __slots__ = ("numero", "veterinario", "mascota", "dia", "turno", "turnos", "motivo", "prioridad", "estado")
+    
+    def __init__(self, numero, veterinario, mascota, dia, turno, turnos, motivo, prioridad):
+        self.numero = numero
+        self.veterinario = veterinario
+        self.mascota = mascota
+        self.dia = dia
+        self.turno = turno
+        self.turnos = turnos
+        self.motivo = motivo
+        self.prioridad = prioridad
+        # "reservada" -> "en_sala" al llegar la hora, o "cancelada"
+        self.estado = "reservada"
+    
+    @property
+    def inicio(self):
+        return momento_de(self.dia, self.turno)
+    
+    def mascara(self):
+        return ((1 << self.turnos) - 1) << self.turno
+    
+    def descripcion(self):
+        return (f"#{self.numero} {texto_fecha(self.dia)} {hora_turno(self.turno)}-{hora_turno(self.turno + self.turnos)} "
+                f"{self.veterinario}: {self.mascota.nombre} (ID {self.mascota.id})")
+
+
+class AgendaVeterinario:
+    # Calendario de un veterinario: día -> turnos ocupados (bits), día -> racha
+    # libre más larga (para saltar días sin lugar sin mirar sus bits) y la
+    # lista ordenada de días con reservas
+    
+    def __init__(self, nombre, dias_laborables=DIAS_LABORABLES):
+        self.nombre = nombre
+        self.dias_laborables = frozenset(dias_laborables)
+        self.ocupados = {}
+        self.racha_libre = {}
+        self.citas = {}
+        self.dias = array("I")
+    
+    def trabaja(self, dia):
+        return dia_semana(dia) in self.dias_laborables
+    
+    def libre(self, dia, turno, turnos):
+        return not self.ocupados.get(dia, 0) & (((1 << turnos) - 1) << turno)
+    
+    def reservar(self, cita):
+        ocupados = self.ocupados.get(cita.dia)
+        if ocupados is None:
+            ocupados = 0
+            insort(self.dias, cita.dia)
+            self.citas[cita.dia] = {}
+        ocupados |= cita.mascara()
+        self.ocupados[cita.dia] = ocupados
+        self.racha_libre[cita.dia] = _racha_maxima(ocupados)
+        self.citas[cita.dia][cita.turno] = cita
+    
+    def liberar(self, cita):
+        ocupados = self.ocupados[cita.dia] & ~cita.mascara()
+        del self.citas[cita.dia][cita.turno]
+        if ocupados:
+            self.ocupados[cita.dia] = ocupados
+            self.racha_libre[cita.dia] = _racha_maxima(ocupados)
+            return
+        del self.ocupados[cita.dia], self.racha_libre[cita.dia], self.citas[cita.dia]
+        del self.dias[bisect_left(self.dias, cita.dia)]
+    
+    def primer_hueco(self, dia, desde_turno, turnos, ultimo_dia):
+        # (día, turno) del primer hueco de `turnos` turnos desde (dia, desde_turno)
+        # hasta ultimo_dia inclusive, o None. Un día laborable sin reservas
+        # resuelve al instante; los días con reservas se descartan por su
+        # racha libre y solo se miran los bits si alcanza.
+        racha_libre = self.racha_libre
+        while dia <= ultimo_dia:
+            if dia_semana(dia) in self.dias_laborables:
+                racha = racha_libre.get(dia, TURNOS_POR_DIA)
+                if racha >= turnos:
+                    turno = _primer_hueco(self.ocupados.get(dia, 0), turnos, desde_turno)
+                    if turno is not None:
+                        return dia, turno
+            dia += 1
+            desde_turno = 0
+        return None
+    
+    def citas_entre(self, desde, hasta):
+        # Citas de los días desde..hasta (ordinales, incluidos) en orden
+        for dia in self.dias[bisect_left(self.dias, desde):bisect_right(self.dias, hasta)]:
+            citas = self.citas[dia]
+            for turno in sorted(citas):
+                yield citas[turno]
+
+
+class Agenda:
+    # Veterinarios con su calendario y un montículo de citas por hora de
+    # inicio, de donde salen las que pasan a la sala de espera al llegar su
+    # hora (las canceladas se descartan al salir).
+    
     def __init__(self):
-        self.base_datos = ArbolBinario()
-        self.sala_espera = Cola()
+        self.veterinarios = {}
+        self.citas = {}
+        self.proximas = []
+        self.siguiente_numero = 1
+    
+    def agregar_veterinario(self, nombre, dias_laborables=DIAS_LABORABLES):
+        nombre = nombre.strip()
+        if not nombre:
+            raise ErrorVeterinaria("Falta el nombre del veterinario.")
+        if nombre in self.veterinarios:
+            raise ErrorVeterinaria(f"Ya existe el veterinario {nombre}.")
+        self.veterinarios[nombre] = AgendaVeterinario(nombre, dias_laborables)
+        return self.veterinarios[nombre]
+    
+    def veterinario(self, nombre):
+        agenda = self.veterinarios.get(nombre)
+        if agenda is None:
+            raise ErrorVeterinaria(f"No hay un veterinario llamado {nombre}.")
+        return agenda
+    
+    def reservar(self, nombre, mascota, dia, turno, turnos=1, motivo="", prioridad=PRIORIDAD_NORMAL):
+        # Sin nombre: el primer veterinario que tenga ese horario libre
+        if turnos < 1 or turno + turnos > TURNOS_POR_DIA:
+            raise ErrorVeterinaria(f"La cita termina después del cierre ({hora_turno(TURNOS_POR_DIA)}).")
+        if nombre is None:
+            nombre = next((agenda.nombre for agenda in self.veterinarios.values()
+                           if agenda.trabaja(dia) and agenda.libre(dia, turno, turnos)), None)
+            if nombre is None:
+                raise ErrorVeterinaria("Ningún veterinario tiene ese horario libre.")
+        agenda = self.veterinario(nombre)
+        if not agenda.trabaja(dia):
+            raise ErrorVeterinaria(f"{nombre} no atiende los {NOMBRES_DIAS[dia_semana(dia)]}.")
+        if not agenda.libre(dia, turno, turnos):
+            ocupada = next(cita for cita in agenda.citas[dia].values()
+                           if cita.turno < turno + turnos and turno < cita.turno + cita.turnos)
+            raise ErrorVeterinaria(f"Ese horario se superpone con la cita {ocupada.descripcion()}.")
+        
+        cita = Cita(self.siguiente_numero, nombre, mascota, dia, turno, turnos, motivo, prioridad)
+        self.siguiente_numero += 1
+        agenda.reservar(cita)
+        self.citas[cita.numero] = cita
+        heappush(self.proximas, (dia, turno, cita.numero))
+        return cita
+    
+    def cancelar(self, numero):
+        cita = self.citas.get(numero)
+        if cita is None or cita.estado != "reservada":
+            raise ErrorVeterinaria("No hay una cita reservada con ese número.")
+        self.veterinarios[cita.veterinario].liberar(cita)
+        cita.estado = "cancelada"
+        del self.citas[numero]
+        return cita
+    
+    def primer_libre(self, turnos=1, dia=None, desde_turno=0, nombre=None):
+        # (veterinario, día, turno) más temprano; entre veterinarios gana el
+        # primero registrado. Cada agenda busca como mucho hasta el mejor
+        # resultado encontrado hasta ahí.
+        if not 1 <= turnos <= TURNOS_POR_DIA:
+            raise ErrorVeterinaria(f"Una cita ocupa de 1 a {TURNOS_POR_DIA} turnos.")
+        agendas = [self.veterinario(nombre)] if nombre else list(self.veterinarios.values())
+        if not agendas:
+            raise ErrorVeterinaria("No hay veterinarios en la agenda.")
+        
+        dia = dia or dia_actual()
+        mejor = None
+        ultimo_dia = dia + DIAS_BUSQUEDA
+        for agenda in agendas:
+            hueco = agenda.primer_hueco(dia, desde_turno, turnos, ultimo_dia)
+            if hueco is not None and (mejor is None or hueco < mejor[1:]):
+                mejor = (agenda.nombre, *hueco)
+                ultimo_dia = hueco[0]
+                if hueco == (dia, desde_turno):
+                    # Nadie puede empezar antes
+                    break
+        if mejor is None:
+            raise ErrorVeterinaria(f"No hay turnos libres en los próximos {DIAS_BUSQUEDA} días.")
+        return mejor
+    
+    def vencidas(self, dia, turno):
+        # Saca las citas reservadas que empiezan hasta (dia, turno) inclusive
+        vencidas = []
+        proximas = self.proximas
+        while proximas and proximas[0][:2] <= (dia, turno):
+            cita = self.citas.get(heappop(proximas)[2])
+            if cita is not None and cita.estado == "reservada":
+                vencidas.append(cita)
+        return vencidas
+
+
+class SistemaVeterinaria:
+    def __init__(self, balanceado=True, almacen=None, politica_espera="prioridad"):
+        self.base_datos = ArbolAVL() if balanceado else ArbolBinario()
+        self.sala_espera = ColaPrioridad() if politica_espera == "prioridad" else Cola()
+        self.almacen = almacen
+        self.indice_dueno = IndiceSecundario("nombre_dueno", normalizar_texto, por_palabras=True)
+        self.indice_celular = IndiceSecundario("celular", normalizar_celular)
+        self.indice_raza = IndiceSecundario("raza", normalizar_texto, por_palabras=True)
+        self.indice_alergenos = IndiceAlergenos()
+        self.indice_diagnosticos = IndiceDiagnosticos()
+        self.ultima_visita = IndiceUltimaVisita()
+        self.facturacion = LibroFacturacion()
+        self.agenda = Agenda()
+    
+    # Todo lo que se reconstruye a partir del árbol después de una carga
+    NOMBRES_INDICES = ("indice_dueno", "indice_celular", "indice_raza", "indice_alergenos",
+                       "indice_diagnosticos", "ultima_visita")
+    
+    def _indices(self):
+        return (self.indice_dueno, self.indice_celular, self.indice_raza, self.indice_alergenos)
+    
+    def agregar_mascota(self, mascota):
+        # Único punto de alta: mantiene el árbol, los índices secundarios
+        # y el almacenamiento en disco sincronizados. Las claves se calculan
+        # antes de insertar: si un campo no sirve, el árbol queda como estaba.
+        indices = self._indices()
+        claves = [indice.clave(mascota) for indice in indices]
+        if not self.base_datos.insertar(mascota):
+            return False
+        for indice, clave in zip(indices, claves):
+            indice.agregar(mascota, clave)
+        if not mascota.historial_medico.esta_vacia():
+            self.indice_diagnosticos.agregar_historial(mascota)
+        self.ultima_visita.registrar_mascota(mascota)
+        if self.almacen is not None:
+            self.almacen.registrar_mascota(mascota.id, mascota.nombre, mascota.raza, mascota.alergias,
+                                           mascota.nombre_dueno, mascota.celular)
+            self._compactar_si_corresponde()
+        return True
+    
+    def registrar_diagnostico(self, mascota, texto, fecha, servicio=""):
+        # fecha: ordinal del día (date.toordinal); servicio: códigos unidos con "+".
+        # Se valida antes de tocar el historial para no dejar un registro a medias.
+        texto_valido(texto, "diagnostico")
+        texto_valido(servicio, "servicio")
+        historial = mascota.historial_medico
+        historial.agregar(fecha, texto, servicio)
+        self.indice_diagnosticos.agregar(mascota.id, historial.tamanio - 1, fecha, texto)
+        self.ultima_visita.registrar_visita(mascota.id, fecha)
+        if self.almacen is not None:
+            self.almacen.registrar_diagnostico(mascota.id, [fecha, texto, servicio])
+            self._compactar_si_corresponde()
+    
+    def cargar_mascotas(self, registros, diferido=False):
+        insertadas = self._cargar_en_memoria(registros, diferido)
+        if self.almacen is not None:
+            self.guardar_instantanea()
+        return insertadas
+    
+    def _cargar_en_memoria(self, registros, diferido=False):
+        insertadas = self.base_datos.cargar_masivo(registros)
+        if diferido:
+            for atributo in self.NOMBRES_INDICES:
+                setattr(self, atributo, IndiceDiferido(self, atributo))
+            return insertadas
+        
+        for indice in self._indices():
+            indice.reconstruir(self.base_datos)
+        self.indice_diagnosticos.reconstruir(self.base_datos)
+        self.ultima_visita.reconstruir(self.base_datos)
+        return insertadas
+    
+    def cargar_desde_almacen(self, diferido=False):
+        # diferido: solo el árbol; historiales e índices se arman al usarlos
+        with sin_recolector():
+            mascotas = []
+            for fila in self.almacen.cargar():
+                mascota = Mascota(*fila[:6])
+                if fila[6]:
+                    mascota.cargar_historial(fila[6])
+                mascotas.append(mascota)
+            return self._cargar_en_memoria(mascotas, diferido)
+    
+    def guardar_instantanea(self):
+        filas = (
+            [m.id, m.nombre, m.raza, m.alergias, m.nombre_dueno, m.celular, m.filas_historial()]
+            for m in self.base_datos
+        )
+        self.almacen.escribir_instantanea(filas)
+    
+    def _compactar_si_corresponde(self):
+        # La compactación normal no lee la memoria: sella el registro y otro
+        # proceso lo funde con la instantánea; esta escritura no la espera
+        if self.almacen.necesita_instantanea():
+            if self.almacen.compactar_aparte:
+                self.almacen.compactar_en_segundo_plano()
+            else:
+                self.guardar_instantanea()
+    
+    # API sin interacción: no usa input() ni imprime; devuelve resultados o
+    # lanza ErrorVeterinaria. Los métodos del menú y el modo por lotes la usan.
+    
+    def alta_mascota(self, id_mascota, nombre, raza, alergias, nombre_dueno, celular):
+        for valor, campo in ((nombre, "nombre"), (raza, "raza"), (alergias, "alergias"),
+                             (nombre_dueno, "nombre_dueno"), (celular, "celular")):
+            texto_valido(valor, campo)
+        mascota = Mascota(id_mascota, nombre, raza, alergias, nombre_dueno, celular)
+        if not self.agregar_mascota(mascota):
+            raise ErrorVeterinaria("Ya existe una mascota con ese ID.")
+        return mascota
+    
+    def obtener_mascota(self, id_mascota):
+        mascota = self.base_datos.buscar(id_mascota)
+        if mascota is None:
+            raise ErrorVeterinaria("No se encontró una mascota con ese ID.")
+        return mascota
+    
+    def registrar_llegada(self, id_mascota, prioridad=PRIORIDAD_NORMAL):
+        mascota = self.obtener_mascota(id_mascota)
+        
+        if isinstance(self.sala_espera, ColaPrioridad):
+            if not prioridad_valida(prioridad):
+                raise ErrorVeterinaria("Prioridad no válida.")
+            agregada = self.sala_espera.encolar(mascota, prioridad)
+        else:
+            agregada = self.sala_espera.encolar(mascota)
+        
+        if not agregada:
+            raise ErrorVeterinaria(f"{mascota.nombre} ya está en la sala de espera "
+                                   f"(posición {self.sala_espera.posicion(mascota.id)}).")
+        
+        return self.sala_espera.posicion(mascota.id)
+    
+    def llamar_siguiente(self):
+        # Saca al siguiente paciente; devuelve (mascota, prioridad o None si la cola es FIFO)
+        if self.sala_espera.esta_vacia():
+            raise ErrorVeterinaria("No hay pacientes en la sala de espera.")
+        
+        prioridad = None
+        if isinstance(self.sala_espera, ColaPrioridad):
+            prioridad = self.sala_espera.prioridad_de(self.sala_espera.ver_frente().id)
+        
+        return self.sala_espera.desencolar(), prioridad
+    
+    def registrar_atencion(self, mascota, diagnostico, servicios=()):
+        # Diagnóstico con la fecha de hoy; devuelve el registro como se muestra
+        fecha = dia_actual()
+        self.registrar_diagnostico(mascota, diagnostico, fecha,
+                                   "+".join(servicio["codigo"] for servicio in servicios))
+        return f"{texto_fecha(fecha)} - {diagnostico}"
+    
+    def resolver_servicios(self, seleccion, prioridad=None):
+        # Números del menú o códigos, varios unidos con "+" ("CON+VAC+DES").
+        # Vacío = EME si es emergencia. Devuelve (servicios, total).
+        if seleccion is None or str(seleccion).strip() == "":
+            if prioridad == PRIORIDAD_EMERGENCIA:
+                return cotizar("EME")
+            return (), 0.0
+        return cotizar(str(seleccion))
+    
+    def alertas_alergia(self, mascota, servicios=(), diagnostico=""):
+        # [(alérgeno, origen)]: origen es el código del servicio o "diagnostico".
+        # Sin alergias no hay nada que revisar; con alergias, las dos consultas
+        # están memorizadas por conjunto de alérgenos.
+        alergenos = mascota.alergenos
+        if not alergenos:
+            return []
+        alertas = list(conflictos_servicios(alergenos, tuple(servicio["codigo"] for servicio in servicios)))
+        if diagnostico:
+            alertas.extend((alergeno, "diagnostico") for alergeno in conflictos_texto(alergenos, diagnostico))
+        return alertas
+    
+    def facturar(self, mascota, servicios):
+        for servicio in servicios:
+            self.facturacion.registrar(mascota.id, servicio["codigo"], servicio["precio"])
+    
+    def atender_siguiente(self, diagnostico, servicio=None):
+        # Antes de sacarlo de la sala: con un diagnóstico inválido se perdería el turno
+        texto_valido(diagnostico, "diagnostico")
+        mascota, prioridad = self.llamar_siguiente()
+        try:
+            servicios, total = self.resolver_servicios(servicio, prioridad)
+        except ErrorVeterinaria:
+            servicios, total = (), 0.0
+        registro = self.registrar_atencion(mascota, diagnostico, servicios)
+        self.facturar(mascota, servicios)
+        
+        return {
+            "mascota": mascota,
+            "prioridad": prioridad,
+            "registro": registro,
+            "servicios": servicios,
+            "total": total,
+            "alertas": self.alertas_alergia(mascota, servicios, diagnostico),
+        }
+    
+    def consultar_historial(self, id_mascota, pagina=1, tamanio_pagina=TAMANIO_PAGINA):
+        if type(pagina) is not int or type(tamanio_pagina) is not int or pagina < 1 or tamanio_pagina < 1:
+            raise ErrorVeterinaria("La página y su tamaño tienen que ser enteros desde 1.")
+        mascota = self.obtener_mascota(id_mascota)
+        return mascota, mascota.historial_medico.pagina(pagina, tamanio_pagina)
+    
+    def visitas_entre(self, desde=None, hasta=None):
+        # {ID: cantidad de visitas} con fecha entre desde y hasta (date, incluidos)
+        return self.indice_diagnosticos.visitas_entre(desde, hasta)
+    
+    def pendientes_de_control(self, meses=12, hoy=None, incluir_sin_visitas=False):
+        # Mascotas sin visitas en los últimos meses (recordatorio de vacunas)
+        hoy = hoy or date.fromordinal(dia_actual())
+        anio, mes = divmod(hoy.year * 12 + hoy.month - 1 - meses, 12)
+        ultimo_dia = (date(anio + (mes + 1) // 12, (mes + 1) % 12 + 1, 1) - timedelta(days=1)).day
+        corte = date(anio, mes + 1, min(hoy.day, ultimo_dia))
+        ids = self.ultima_visita.sin_visita_desde(corte, incluir_sin_visitas)
+        return [self.base_datos.buscar(id_mascota) for id_mascota in ids]
+    
+    def agregar_veterinario(self, nombre, dias_laborables=DIAS_LABORABLES):
+        return self.agenda.agregar_veterinario(nombre, dias_laborables)
+    
+    def reservar_cita(self, id_mascota, veterinario, inicio, turnos=1, motivo="", prioridad=PRIORIDAD_NORMAL):
+        # inicio: datetime justo en un turno; veterinario None = cualquiera libre a esa hora
+        mascota = self.obtener_mascota(id_mascota)
+        if not prioridad_valida(prioridad):
+            raise ErrorVeterinaria("Prioridad no válida.")
+        dia, turno = turno_de(inicio)
+        return self.agenda.reservar(veterinario, mascota, dia, turno, turnos, motivo, prioridad)
+    
+    def cancelar_cita(self, numero):
+        return self.agenda.cancelar(numero)
+    
+    def proximo_turno_libre(self, turnos=1, veterinario=None, desde=None):
+        # (veterinario, datetime) del primer hueco de `turnos` turnos a partir
+        # de desde (por defecto, ahora); un turno ya empezado no cuenta
+        desde = desde or datetime.now()
+        minutos = desde.hour * 60 + desde.minute - APERTURA + bool(desde.second or desde.microsecond)
+        turno = max(0, -(-minutos // DURACION_TURNO))
+        dia = desde.toordinal()
+        if turno >= TURNOS_POR_DIA:
+            dia, turno = dia + 1, 0
+        nombre, dia, turno = self.agenda.primer_libre(turnos, dia, turno, veterinario)
+        return nombre, momento_de(dia, turno)
+    
+    def encolar_citas(self, ahora=None):
+        # Pasa a la sala de espera las citas cuya hora llegó; devuelve esas citas
+        ahora = ahora or datetime.now()
+        citas = self.agenda.vencidas(ahora.toordinal(), (ahora.hour * 60 + ahora.minute - APERTURA) // DURACION_TURNO)
+        for cita in citas:
+            cita.estado = "en_sala"
+            try:
+                self.registrar_llegada(cita.mascota.id, cita.prioridad)
+            except ErrorVeterinaria:
+                # Ya estaba en la sala: llegó antes y se anotó en recepción
+                pass
+        return citas
     
     def inicializar_datos_prueba(self):
         print("\n    Cargando datos de prueba...")
@@ -339,11 +2488,11 @@ class SistemaVeterinaria:
         mascota4.agregar_diagnostico("18/11/2024 - Refuerzo de vacunas")
         
         # Insertar en el árbol
-        self.base_datos.insertar(mascota1)
-        self.base_datos.insertar(mascota2)
-        self.base_datos.insertar(mascota3)
-        self.base_datos.insertar(mascota4)
-        self.base_datos.insertar(mascota5)
+        self.agregar_mascota(mascota1)
+        self.agregar_mascota(mascota2)
+        self.agregar_mascota(mascota3)
+        self.agregar_mascota(mascota4)
+        self.agregar_mascota(mascota5)
         
         print("    5 mascotas cargadas en la base de datos")
         print("    Historiales médicos cargados")
@@ -354,33 +2503,42 @@ class SistemaVeterinaria:
         self.sala_espera.encolar(mascota4)
         
         print("    3 pacientes en sala de espera")
+        
+        # Agenda: dos veterinarios y un control ya reservado
+        self.agregar_veterinario("Dra. Rojas")
+        self.agregar_veterinario("Dr. Salas", dias_laborables=range(5))
+        veterinario, inicio = self.proximo_turno_libre(desde=datetime.now() + timedelta(days=1))
+        self.reservar_cita(200, veterinario, inicio, motivo="Control anual")
+        print("    2 veterinarios en la agenda, 1 cita reservada")
         print("    " + "="*ANCHO)
         print("    Sistema listo!")
     
     def mostrar_menu_principal(self):
-        print("\n")
-        print(f"    ╔{'═' * ANCHO}╗")
-        print(f"    ║{' ' * ANCHO}║")
-        print(f"    ║{'CLÍNICA VETERINARIA'.center(ANCHO)}║")
-        print(f"    ║{'PET MARKET'.center(ANCHO)}║")
-        print(f"    ║{' ' * ANCHO}║")
-        print(f"    ╠{'═' * ANCHO}╣")
-        print(f"    ║{' ' * ANCHO}║")
-        print(f"    ║ {'1. Registrar Nueva Mascota':<{ANCHO-2}} ║")
-        print(f"    ║ {'2. Recepción (Agregar a Sala de Espera)':<{ANCHO-2}} ║")
-        print(f"    ║ {'3. Atender Siguiente Paciente':<{ANCHO-2}} ║")
-        print(f"    ║ {'4. Ver Historial Médico':<{ANCHO-2}} ║")
-        print(f"    ║ {'5. Ver Base de Datos (Todas las Mascotas)':<{ANCHO-2}} ║")
-        print(f"    ║ {'6. Ver Sala de Espera':<{ANCHO-2}} ║")
-        print(f"    ║ {'7. Ver Catálogo de Servicios':<{ANCHO-2}} ║")
-        print(f"    ║ {'8. Salir del Sistema':<{ANCHO-2}} ║")
-        print(f"    ║{' ' * ANCHO}║")
-        print(f"    ╚{'═' * ANCHO}╝")
+        cuadro = Cuadro()
+        cuadro.vacia()
+        cuadro.centrado("CLÍNICA VETERINARIA")
+        cuadro.centrado("PET MARKET")
+        cuadro.vacia()
+        cuadro.separador()
+        cuadro.vacia()
+        cuadro.fila("1. Registrar Nueva Mascota")
+        cuadro.fila("2. Recepción (Agregar a Sala de Espera)")
+        cuadro.fila("3. Atender Siguiente Paciente")
+        cuadro.fila("4. Ver Historial Médico")
+        cuadro.fila("5. Ver Base de Datos (Todas las Mascotas)")
+        cuadro.fila("6. Ver Sala de Espera")
+        cuadro.fila("7. Ver Catálogo de Servicios")
+        cuadro.fila("8. Buscar Mascota (Dueño/Celular/Raza)")
+        cuadro.fila("9. Consultar Turno / Cancelar Espera")
+        cuadro.fila("10. Resumen de Facturación")
+        cuadro.fila("11. Métricas de Rendimiento")
+        cuadro.fila("12. Agenda de Citas")
+        cuadro.fila("13. Salir del Sistema")
+        cuadro.vacia()
+        escribir("\n\n" + cuadro.texto())
     
     def registrar_mascota(self):
-        print("\n    " + "═"*ANCHO)
-        print(f"{'REGISTRO DE NUEVA MASCOTA'.center(ANCHO + 4)}")
-        print("    " + "═"*ANCHO)
+        mostrar_encabezado("REGISTRO DE NUEVA MASCOTA")
         
         try:
             id_mascota = int(input("    Ingrese ID único de la mascota: "))
@@ -397,21 +2555,18 @@ class SistemaVeterinaria:
             nombre_dueno = input("    Nombre del dueño: ")
             celular = input("    Celular de contacto: ")
             
-            nueva_mascota = Mascota(id_mascota, nombre, raza, alergias, nombre_dueno, celular)
+            nueva_mascota = self.alta_mascota(id_mascota, nombre, raza, alergias, nombre_dueno, celular)
+            
+            print("\n    Mascota registrada correctamente!")
+            nueva_mascota.mostrar_informacion()
             
-            if self.base_datos.insertar(nueva_mascota):
-                print("\n    Mascota registrada correctamente!")
-                nueva_mascota.mostrar_informacion()
-            else:
-                print("\n    No se pudo registrar la mascota.")
-                
         except ValueError:
             print("\n    El ID debe ser un número entero.")
+        except ErrorVeterinaria as error:
+            print(f"\n    {error}")
     
     def recepcion_llegada(self):
-        print("\n    " + "═"*ANCHO)
-        print(f"{'RECEPCIÓN - LLEGADA DE PACIENTE'.center(ANCHO + 4)}")
-        print("    " + "═"*ANCHO)
+        mostrar_encabezado("RECEPCIÓN - LLEGADA DE PACIENTE")
         
         try:
             id_buscar = int(input("    Ingrese el ID de la mascota que llega: "))
@@ -423,30 +2578,43 @@ class SistemaVeterinaria:
                 print("    Primero registre la mascota (Opción 1).")
                 return
             
-            self.sala_espera.encolar(mascota)
+            prioridad = PRIORIDAD_NORMAL
+            if isinstance(self.sala_espera, ColaPrioridad):
+                print("    Prioridad: 1. Emergencia  2. Urgente  3. Normal")
+                texto_prioridad = input("    Seleccione la prioridad (ENTER = Normal): ").strip()
+                if texto_prioridad:
+                    try:
+                        prioridad = int(texto_prioridad)
+                    except ValueError:
+                        print("\n    La prioridad debe ser 1, 2 o 3.")
+                        return
+            
+            posicion = self.registrar_llegada(id_buscar, prioridad)
             
             print(f"\n    {mascota.nombre} agregado(a) a la sala de espera!")
-            print(f"    Posición en la cola: {self.sala_espera.tamanio}")
+            print(f"    Posición en la cola: {posicion}")
             
-            if mascota.alergias.lower() != "ninguna" and mascota.alergias.lower() != "ninguna conocida":
+            if mascota.alergenos:
                 print(f"    Alergias: {mascota.alergias}")
                 
         except ValueError:
             print("\n    El ID debe ser un número entero.")
+        except ErrorVeterinaria as error:
+            print(f"\n    {error}")
     
     def atender_paciente(self):
-        print("\n    " + "═"*ANCHO)
-        print(f"{'ATENCIÓN DE PACIENTE'.center(ANCHO + 4)}")
-        print("    " + "═"*ANCHO)
+        mostrar_encabezado("ATENCIÓN DE PACIENTE")
         
         if self.sala_espera.esta_vacia():
             print("\n    No hay pacientes en la sala de espera.")
             print("    Use la opción 2 para registrar llegadas.")
             return
         
-        mascota = self.sala_espera.desencolar()
+        mascota, prioridad = self.llamar_siguiente()
         
         print(f"\n    Llamando a: {mascota.nombre}")
+        if prioridad is not None:
+            print(f"    Prioridad: {NOMBRES_PRIORIDAD[prioridad]}")
         print("    " + "-"*50)
         mascota.mostrar_informacion()
         
@@ -457,42 +2625,44 @@ class SistemaVeterinaria:
         print("\n    " + "-"*50)
         diagnostico = input("    Ingrese el diagnóstico de hoy: ")
         
-        from datetime import datetime
-        fecha_actual = datetime.now().strftime("%d/%m/%Y")
-        registro_completo = f"{fecha_actual} - {diagnostico}"
-        
-        mascota.agregar_diagnostico(registro_completo)
-        
-        print(f"\n    Diagnóstico registrado en el historial de {mascota.nombre}")
-        
-        print("\n    Seleccione el servicio prestado:")
+        print("\n    Seleccione el/los servicio(s) prestado(s):")
         mostrar_catalogo_servicios()
         
+        if prioridad == PRIORIDAD_EMERGENCIA:
+            texto_servicio = input("    Números o códigos, unidos con + (ENTER = Emergencia 24h): ").strip()
+        else:
+            texto_servicio = input("    Números o códigos, unidos con + (ej. 1+2 o CON+VAC): ").strip()
+        
+        # El diagnóstico se guarda aunque el servicio no sea válido
         try:
-            opcion_servicio = int(input("    Ingrese el número del servicio: "))
-            servicio = obtener_servicio(opcion_servicio)
+            if texto_servicio == "" and prioridad != PRIORIDAD_EMERGENCIA:
+                raise ErrorVeterinaria("No se indicó ningún servicio.")
+            servicios, total = self.resolver_servicios(texto_servicio, prioridad)
+        except ErrorVeterinaria as error:
+            self.registrar_atencion(mascota, diagnostico)
+            print(f"    {error}")
+            print(f"    El diagnóstico fue guardado en el historial de {mascota.nombre}.")
+            for alergeno, _ in self.alertas_alergia(mascota, (), diagnostico):
+                print(f"    ALERTA: {mascota.nombre} es alérgico(a) a {alergeno} (mencionado en el diagnóstico)")
+        else:
+            self.registrar_atencion(mascota, diagnostico, servicios)
+            self.facturar(mascota, servicios)
+            print(f"\n    Diagnóstico registrado en el historial de {mascota.nombre}")
             
-            if servicio:
-                print(f"\n    ╔{'═' * ANCHO}╗")
-                print(f"    ║{'RESUMEN DE ATENCIÓN'.center(ANCHO)}║")
-                print(f"    ╠{'═' * ANCHO}╣")
-                print(f"    ║ {'Paciente:':<15} {mascota.nombre:<{ANCHO-18}} ║")
-                print(f"    ║ {'Servicio:':<15} {servicio['nombre']:<{ANCHO-18}} ║")
-                print(f"    ║ {'Total:':<15} {'S/' + str(servicio['precio']):<{ANCHO-18}} ║")
-                print(f"    ╚{'═' * ANCHO}╝")
-            else:
-                print("    Servicio no encontrado, pero el diagnóstico fue guardado.")
-                
-        except ValueError:
-            print("    Opción inválida, pero el diagnóstico fue guardado.")
+            cuadro = Cuadro("RESUMEN DE ATENCIÓN", separado=True)
+            cuadro.campo("Paciente:", mascota.nombre, 15)
+            for servicio in servicios:
+                cuadro.campo("Servicio:", f"{servicio['nombre']:<24} S/{servicio['precio']:.2f}", 15)
+            cuadro.campo("Total:", f"S/{total:.2f}", 15)
+            for alergeno, origen in self.alertas_alergia(mascota, servicios, diagnostico):
+                cuadro.campo("ALERTA:", f"alergia a {alergeno} ({origen})", 15)
+            cuadro.mostrar()
         
         if not self.sala_espera.esta_vacia():
             print(f"\n    Quedan {self.sala_espera.tamanio} paciente(s) en espera.")
     
     def ver_historial(self):
-        print("\n    " + "═"*ANCHO)
-        print(f"{'CONSULTA DE HISTORIAL MÉDICO'.center(ANCHO + 4)}")
-        print("    " + "═"*ANCHO)
+        mostrar_encabezado("CONSULTA DE HISTORIAL MÉDICO")
         
         try:
             id_buscar = int(input("    Ingrese el ID de la mascota: "))
@@ -510,39 +2680,263 @@ class SistemaVeterinaria:
             print("\n    El ID debe ser un número entero.")
     
     def ver_base_datos(self):
-        print("\n    " + "═"*ANCHO)
-        print(f"{'MASCOTAS REGISTRADAS EN EL SISTEMA'.center(ANCHO + 4)}")
-        print("    " + "═"*ANCHO)
+        mostrar_encabezado("MASCOTAS REGISTRADAS EN EL SISTEMA")
         
-        self.base_datos.recorrido_inorden()
+        self.base_datos.recorrido_inorden(TAMANIO_PAGINA)
     
     def ver_sala_espera(self):
-        print("\n    " + "═"*ANCHO)
-        print(f"{'SALA DE ESPERA ACTUAL'.center(ANCHO + 4)}")
-        print("    " + "═"*ANCHO)
-        
-        self.sala_espera.mostrar_sala_espera()
-    
-    def ejecutar(self):
-        print("\n")
-        print(f"    ╔{'═' * ANCHO}╗")
-        print(f"    ║{' ' * ANCHO}║")
-        print(f"    ║{'BIENVENIDO AL SISTEMA DE GESTIÓN VETERINARIA'.center(ANCHO)}║")
-        print(f"    ║{'PET MARKET'.center(ANCHO)}║")
-        print(f"    ║{' ' * ANCHO}║")
-        print(f"    ║{'Sistema de Estructuras de Datos'.center(ANCHO)}║")
-        print(f"    ║{'Proyecto Final Universitario'.center(ANCHO)}║")
-        print(f"    ║{' ' * ANCHO}║")
-        print(f"    ╚{'═' * ANCHO}╝")
-        
-        self.inicializar_datos_prueba()
+        mostrar_encabezado("SALA DE ESPERA ACTUAL")
+        
+        self.sala_espera.mostrar_sala_espera(TAMANIO_PAGINA)
+    
+    def buscar_mascota(self):
+        mostrar_encabezado("BÚSQUEDA DE MASCOTAS")
+        print("    1. Por nombre del dueño")
+        print("    2. Por celular")
+        print("    3. Por raza")
+        print("    4. Por diagnóstico (historial médico)")
+        print("    5. Sin visitas en los últimos 12 meses (recordatorio)")
+        
+        criterio = input("    Seleccione el criterio: ").strip()
+        if criterio == "4":
+            self.buscar_por_diagnostico()
+            return
+        if criterio == "5":
+            self.buscar_sin_visitas()
+            return
+        
+        indices = {"1": self.indice_dueno, "2": self.indice_celular, "3": self.indice_raza}
+        
+        if criterio not in indices:
+            print("\n    Criterio no válido.")
+            return
+        
+        texto = input("    Texto a buscar (o inicio del texto): ")
+        indice = indices[criterio]
+        
+        # Primero coincidencias exactas; si no hay, por prefijo
+        resultados = indice.buscar_exacto(texto)
+        if not resultados:
+            resultados = indice.buscar_prefijo(texto, limite=TAMANIO_PAGINA + 1)
+        
+        if not resultados:
+            print("\n    No se encontraron mascotas.")
+            return
+        
+        cuadro = Cuadro("RESULTADOS DE LA BÚSQUEDA")
+        
+        for mascota in resultados[:TAMANIO_PAGINA]:
+            cuadro.fila(f"ID: {mascota.id} | {mascota.nombre} | {mascota.nombre_dueno} | {mascota.celular}")
+        
+        if len(resultados) > TAMANIO_PAGINA:
+            cuadro.mostrar(f"Se muestran los primeros {TAMANIO_PAGINA}; refine la búsqueda.")
+        else:
+            cuadro.mostrar(f"Mascotas encontradas: {len(resultados)}")
+    
+    def buscar_por_diagnostico(self):
+        print("\n    Palabras del diagnóstico; varias alternativas con OR")
+        print("    (ej.: penicilina OR post-operatorio)")
+        consulta = input("    Buscar: ")
+        try:
+            desde = leer_fecha(input("    Desde (dd/mm/aaaa, ENTER = sin límite): "))
+            hasta = leer_fecha(input("    Hasta (dd/mm/aaaa, ENTER = sin límite): "))
+        except ValueError:
+            print("\n    Fecha no válida.")
+            return
+        
+        conteo = self.indice_diagnosticos.mascotas(consulta, desde, hasta)
+        if not conteo:
+            print("\n    Ningún diagnóstico coincide con la búsqueda.")
+            return
+        
+        cuadro = Cuadro("DIAGNÓSTICOS ENCONTRADOS")
+        ids = sorted(conteo, key=lambda id_mascota: (-conteo[id_mascota], id_mascota))
+        
+        for id_mascota in ids[:TAMANIO_PAGINA]:
+            mascota = self.base_datos.buscar(id_mascota)
+            nombre = mascota.nombre if mascota is not None else "?"
+            cuadro.fila(f"ID: {id_mascota} | {nombre} | {conteo[id_mascota]} registro(s)")
+        
+        if len(ids) > TAMANIO_PAGINA:
+            cuadro.mostrar(f"Se muestran {TAMANIO_PAGINA} de {len(ids)} mascotas; refine la búsqueda.")
+        else:
+            cuadro.mostrar(f"Mascotas encontradas: {len(ids)} (use la opción 4 para ver cada historial)")
+    
+    def buscar_sin_visitas(self):
+        pendientes = self.pendientes_de_control(12)
+        if not pendientes:
+            print("\n    Todas las mascotas tuvieron una visita en los últimos 12 meses.")
+            return
+        
+        cuadro = Cuadro("SIN VISITAS EN LOS ÚLTIMOS 12 MESES")
+        
+        for mascota in pendientes[:TAMANIO_PAGINA]:
+            ultima = texto_fecha(mascota.historial_medico.ultima_fecha())
+            cuadro.fila(f"ID: {mascota.id} | {mascota.nombre} | última: {ultima} | {mascota.celular}")
+        
+        if len(pendientes) > TAMANIO_PAGINA:
+            cuadro.mostrar(f"Se muestran las {TAMANIO_PAGINA} más atrasadas de {len(pendientes)}.")
+        else:
+            cuadro.mostrar(f"Mascotas para recordar: {len(pendientes)}")
+    
+    def consultar_turno(self):
+        mostrar_encabezado("CONSULTA DE TURNO")
+        
+        try:
+            id_buscar = int(input("    Ingrese el ID de la mascota: "))
+        except ValueError:
+            print("\n    El ID debe ser un número entero.")
+            return
+        
+        posicion = self.sala_espera.posicion(id_buscar)
+        
+        if posicion is None:
+            print("\n    Esa mascota no está en la sala de espera.")
+            return
+        
+        print(f"\n    Posición en la cola: {posicion} de {self.sala_espera.tamanio}")
+        
+        respuesta = input("    ¿Cancelar su turno? (s/n): ").strip().lower()
+        if respuesta == "s":
+            mascota = self.sala_espera.retirar(id_buscar)
+            print(f"\n    {mascota.nombre} fue retirado(a) de la sala de espera.")
+    
+    def ver_metricas(self):
+        # metricas importa este módulo: se carga recién al entrar a la opción
+        import metricas
+        
+        escribir(metricas.texto(self))
+        estado = "Desactivar" if metricas.METRICAS.activas else "Activar"
+        print(f"    1. {estado} la medición")
+        print("    2. Exportar (.json o texto)")
+        print("    3. Reiniciar las mediciones")
+        print("    ENTER. Volver")
+        
+        opcion = input("    Seleccione: ").strip()
+        if opcion == "1":
+            if metricas.METRICAS.activas:
+                metricas.desactivar()
+                print("\n    Medición desactivada (se conservan los datos tomados).")
+            else:
+                metricas.activar()
+                print("\n    Medición activada.")
+        elif opcion == "2":
+            ruta = input("    Archivo (ej.: metricas.json o metricas.txt): ").strip()
+            if not ruta:
+                return
+            try:
+                metricas.exportar(ruta, self)
+            except OSError as error:
+                print(f"\n    No se pudo escribir el archivo: {error}")
+                return
+            print(f"\n    Métricas exportadas a {ruta}")
+        elif opcion == "3":
+            metricas.reiniciar()
+            print("\n    Mediciones reiniciadas.")
+    
+    def gestionar_agenda(self):
+        mostrar_encabezado("AGENDA DE CITAS")
+        print("    1. Reservar una cita")
+        print("    2. Ver la agenda de un día")
+        print("    3. Próximo turno libre")
+        print("    4. Cancelar una cita")
+        print("    5. Agregar un veterinario")
+        print("    ENTER. Volver")
+        
+        opcion = input("    Seleccione: ").strip()
+        try:
+            if opcion == "1":
+                self.reservar_desde_menu()
+            elif opcion == "2":
+                self.ver_agenda_dia()
+            elif opcion == "3":
+                turnos = int(input(f"    Turnos de {DURACION_TURNO} minutos (ENTER = 1): ").strip() or 1)
+                veterinario = input("    Veterinario (ENTER = cualquiera): ").strip() or None
+                veterinario, inicio = self.proximo_turno_libre(turnos, veterinario)
+                print(f"\n    Primer turno libre: {inicio:%d/%m/%Y %H:%M} con {veterinario}")
+            elif opcion == "4":
+                cita = self.cancelar_cita(int(input("    Número de cita: ")))
+                print(f"\n    Cita cancelada: {cita.descripcion()}")
+            elif opcion == "5":
+                nombre = input("    Nombre del veterinario: ")
+                print("    Días de atención (0 = lunes ... 6 = domingo, ej.: 0 1 2 3 4)")
+                dias = input("    Días (ENTER = lunes a sábado): ").split()
+                agenda = self.agregar_veterinario(nombre, [int(dia) % 7 for dia in dias] or DIAS_LABORABLES)
+                print(f"\n    {agenda.nombre} agregado(a) a la agenda.")
+        except ValueError:
+            print("\n    Dato no válido.")
+        except ErrorVeterinaria as error:
+            print(f"\n    {error}")
+    
+    def reservar_desde_menu(self):
+        if not self.agenda.veterinarios:
+            print("\n    No hay veterinarios en la agenda (opción 5).")
+            return
+        
+        mascota = self.obtener_mascota(int(input("    ID de la mascota: ")))
+        turnos = int(input(f"    Turnos de {DURACION_TURNO} minutos (ENTER = 1): ").strip() or 1)
+        veterinario = input(f"    Veterinario ({', '.join(self.agenda.veterinarios)}; ENTER = cualquiera): ").strip() or None
+        texto = input("    Fecha y hora (dd/mm/aaaa hh:mm, ENTER = primer turno libre): ").strip()
+        if texto:
+            inicio = datetime.strptime(texto, "%d/%m/%Y %H:%M")
+            if inicio < datetime.now():
+                print("\n    Esa fecha y hora ya pasó.")
+                return
+        else:
+            veterinario, inicio = self.proximo_turno_libre(turnos, veterinario)
+        motivo = input("    Motivo: ").strip()
+        
+        cita = self.reservar_cita(mascota.id, veterinario, inicio, turnos, motivo)
+        print(f"\n    Cita reservada: {cita.descripcion()}")
+    
+    def ver_agenda_dia(self):
+        dia = leer_fecha(input("    Fecha (dd/mm/aaaa, ENTER = hoy): "))
+        dia = dia.toordinal() if dia else dia_actual()
+        
+        cuadro = Cuadro(f"AGENDA DEL {texto_fecha(dia)} ({NOMBRES_DIAS[dia_semana(dia)]})")
+        for agenda in self.agenda.veterinarios.values():
+            if not agenda.trabaja(dia):
+                cuadro.fila(f"{agenda.nombre}: no atiende")
+                continue
+            cuadro.fila(f"{agenda.nombre}:")
+            citas = list(agenda.citas_entre(dia, dia))
+            for cita in citas:
+                estado = "" if cita.estado == "reservada" else " (en sala)"
+                cuadro.fila(f"  {hora_turno(cita.turno)}-{hora_turno(cita.turno + cita.turnos)} #{cita.numero} "
+                            f"{cita.mascota.nombre} (ID {cita.mascota.id}){estado} {cita.motivo}")
+            if not citas:
+                cuadro.fila("  sin citas")
+        cuadro.mostrar(f"Horario: {hora_turno(0)} a {hora_turno(TURNOS_POR_DIA)}, turnos de {DURACION_TURNO} minutos")
+    
+    def ejecutar(self, inicio_rapido=False):
+        cuadro = Cuadro()
+        cuadro.vacia()
+        cuadro.centrado("BIENVENIDO AL SISTEMA DE GESTIÓN VETERINARIA")
+        cuadro.centrado("PET MARKET")
+        cuadro.vacia()
+        cuadro.centrado("Sistema de Estructuras de Datos")
+        cuadro.centrado("Proyecto Final Universitario")
+        cuadro.vacia()
+        escribir("\n\n" + cuadro.texto())
+        
+        if self.almacen is not None and self.cargar_desde_almacen(diferido=inicio_rapido) > 0:
+            print(f"\n    Base de datos cargada desde disco: {self.base_datos.cantidad} mascotas")
+        elif not inicio_rapido:
+            self.inicializar_datos_prueba()
+            if self.almacen is not None:
+                self.guardar_instantanea()
         
         # Bucle principal
         while True:
+            # Las citas cuya hora llegó pasan solas a la sala de espera
+            for cita in self.encolar_citas():
+                print(f"\n    Cita de las {hora_turno(cita.turno)} ({cita.veterinario}): "
+                      f"{cita.mascota.nombre} pasó a la sala de espera")
+            
             self.mostrar_menu_principal()
             
             try:
-                opcion = input("\n    Seleccione una opción (1-8): ").strip()
+                opcion = input("\n    Seleccione una opción (1-13): ").strip()
                 
                 if opcion == "1":
                     self.registrar_mascota()
@@ -566,6 +2960,24 @@ class SistemaVeterinaria:
                     mostrar_catalogo_servicios()
                     
                 elif opcion == "8":
+                    self.buscar_mascota()
+                    
+                elif opcion == "9":
+                    self.consultar_turno()
+                    
+                elif opcion == "10":
+                    self.facturacion.mostrar_resumen()
+                    
+                elif opcion == "11":
+                    self.ver_metricas()
+                    
+                elif opcion == "12":
+                    self.gestionar_agenda()
+                    
+                elif opcion == "13":
+                    if self.almacen is not None:
+                        self.guardar_instantanea()
+                        self.almacen.cerrar()
                     print("\n    " + "="*ANCHO)
                     print("    Gracias por usar PET MARKET!")
                     print("    Hasta pronto.")
@@ -573,7 +2985,7 @@ class SistemaVeterinaria:
                     break
                     
                 else:
-                    print("\n    Opción no válida. Seleccione del 1 al 8.")
+                    print("\n    Opción no válida. Seleccione del 1 al 13.")
                     
             except Exception as e:
                 print(f"\n    Error: {e}")
@@ -582,5 +2994,34 @@ class SistemaVeterinaria:
 
 
 if __name__ == "__main__":
-    sistema = SistemaVeterinaria()
-    sistema.ejecutar()
+    # Como script este módulo es __main__: se registra también con su nombre
+    # para que metricas (que lo importa) instrumente estas mismas clases y no
+    # una segunda copia
+    sys.modules.setdefault("veterinaria_pet_market", sys.modules[__name__])
+    
+    # Importaciones que solo usa la línea de comandos, fuera del arranque de
+    # quien importa este módulo
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Sistema de Gestión - Clínica Veterinaria Pet Market")
+    parser.add_argument("--datos", help="carpeta donde se guarda la base de datos (sin ella no se persiste nada)")
+    parser.add_argument("--espera", choices=["prioridad", "fifo"], default="prioridad",
+                        help="política de la sala de espera (por defecto: prioridad)")
+    parser.add_argument("--inicio-rapido", action="store_true",
+                        help="sin datos de prueba; historiales e índices se cargan al primer uso")
+    parser.add_argument("--metricas", action="store_true", help="medir desde el arranque (opción 11 del menú)")
+    parser.add_argument("--compactar-cada", type=int, default=10000, metavar="N",
+                        help="operaciones del registro entre compactaciones (en otro proceso)")
+    argumentos = parser.parse_args()
+    
+    if argumentos.metricas:
+        import metricas
+        metricas.activar()
+    
+    almacen = None
+    if argumentos.datos:
+        # Solo con persistencia (trae json, pickle y zlib)
+        from almacenamiento import AlmacenPacientes
+        almacen = AlmacenPacientes(argumentos.datos, registros_por_instantanea=argumentos.compactar_cada)
+    sistema = SistemaVeterinaria(almacen=almacen, politica_espera=argumentos.espera)
+    sistema.ejecutar(argumentos.inicio_rapido)